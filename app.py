@@ -1,14 +1,21 @@
 import streamlit as st
 import pyaudio
-import wave
 import google.generativeai as genai
 import pandas as pd
 import os
 import json
 import threading
 import time
+import sys
 from streamlit.runtime.scriptrunner import add_script_run_ctx
-from unidecode import unidecode
+
+# Módulos compartilhados com o app Flet (src/): catálogo e gravação
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+import catalog_cache
+import catalog_index
+import wav_writer
+import audio_prep
+import segmented
 
 # --- Configuração da Página ---
 st.set_page_config(page_title="Assistente Médico - Gemini", page_icon="🩺", layout="wide")
@@ -96,8 +103,8 @@ if 'recording' not in st.session_state:
     st.session_state.recording = False
 if 'processing' not in st.session_state:
     st.session_state.processing = False
-if 'audio_frames' not in st.session_state:
-    st.session_state.audio_frames = []
+if 'audio_seconds' not in st.session_state:
+    st.session_state.audio_seconds = 0
 if 'analysis_result' not in st.session_state:
     st.session_state.analysis_result = None
 
@@ -109,124 +116,81 @@ OUTPUT_FILENAME = "consulta_temp.wav"
 
 # --- Funções Auxiliares ---
 
-def load_remume_names():
-    try:
-        path = os.path.join("data", "db_remume.json")
-        if not os.path.exists(path): return []
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            names = []
-            if isinstance(data, list):
-                for item in data:
-                    if isinstance(item, dict):
-                        names.append(item.get('nome_completo', item.get('nome', '')))
-                    elif isinstance(item, str):
-                        names.append(item)
-            elif isinstance(data, dict):
-                names.append(data.get('nome_completo', ''))
-            return [n for n in names if n]
-    except Exception as e:
-        st.error(f"Erro ao ler db_remume.json: {e}")
-        return []
+def parse_remume(data):
+    names = []
+    if isinstance(data, list):
+        for item in data:
+            if isinstance(item, dict):
+                names.append(item.get('nome_completo', item.get('nome', '')))
+            elif isinstance(item, str):
+                names.append(item)
+    elif isinstance(data, dict):
+        names.append(data.get('nome_completo', ''))
+    return [n for n in names if n]
 
-def load_alto_custo_names():
-    try:
-        path = os.path.join("data", "db_alto_custo.json")
-        if not os.path.exists(path): return []
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            names = []
-            if isinstance(data, list):
-                for item in data:
-                    if isinstance(item, dict):
-                        names.append(item.get('nome', ''))
-                    elif isinstance(item, str):
-                        names.append(item)
-            elif isinstance(data, dict):
-                names.append(data.get('nome', ''))
-            return [n for n in names if n]
-    except Exception as e:
-        st.error(f"Erro ao ler db_alto_custo.json: {e}")
-        return []
+def parse_alto_custo(data):
+    names = []
+    if isinstance(data, list):
+        for item in data:
+            if isinstance(item, dict):
+                names.append(item.get('nome', ''))
+            elif isinstance(item, str):
+                names.append(item)
+    elif isinstance(data, dict):
+        names.append(data.get('nome', ''))
+    return [n for n in names if n]
 
-def load_rename_names():
-    try:
-        path = os.path.join("data", "db_rename.json")
-        if not os.path.exists(path): return []
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            names = []
-            if isinstance(data, list):
-                for item in data:
-                    if isinstance(item, str): # Suporte a lista simples
-                        names.append(item)
-                    elif isinstance(item, dict):
-                        # Tenta estrutura complexa (Group -> itens)
-                        if 'itens' in item and isinstance(item['itens'], list):
-                            for sub in item['itens']:
-                                if isinstance(sub, dict):
-                                    names.append(sub.get('nome', ''))
-                                elif isinstance(sub, str):
-                                    names.append(sub)
-                        # Tenta estrutura direta
-                        elif 'nome' in item:
-                            names.append(item['nome'])
-            return [n for n in names if n]
-    except Exception as e:
-        st.error(f"Erro ao ler db_rename.json: {e}")
-        return []
+def parse_rename(data):
+    entries = []
+    if isinstance(data, list):
+        for item in data:
+            if isinstance(item, str): # Suporte a lista simples
+                entries.append(item)
+            elif isinstance(item, dict):
+                # Tenta estrutura complexa (Group -> itens)
+                if 'itens' in item and isinstance(item['itens'], list):
+                    for sub in item['itens']:
+                        if isinstance(sub, dict) and sub.get('nome'):
+                            # detalhes (dose/forma) alimentam o índice estruturado
+                            entries.append({"nome": sub['nome'], "detalhes": sub.get('detalhes', '')})
+                        elif isinstance(sub, str):
+                            entries.append(sub)
+                # Tenta estrutura direta
+                elif 'nome' in item:
+                    entries.append(item['nome'])
+    return [e for e in entries if e]
+
+@st.cache_resource
+def get_catalog_cache():
+    """Um cache por processo, compartilhado por todas as sessões (Streamlit reexecuta o script a cada clique)."""
+    return catalog_cache.CatalogCache(
+        files={
+            "remume": os.path.join("data", "db_remume.json"),
+            "alto_custo": os.path.join("data", "db_alto_custo.json"),
+            "rename": os.path.join("data", "db_rename.json"),
+        },
+        parsers={"remume": parse_remume, "alto_custo": parse_alto_custo, "rename": parse_rename}
+    )
 
-def check_medication_availability(medication_list, remume_names, alto_custo_names, rename_names):
+def get_catalog():
+    """Snapshot atual: só relê/reindexa uma lista se o arquivo mudou (mtime + sha256)."""
+    return get_catalog_cache().get()
+
+def check_medication_availability(medication_list):
     checked_meds = []
     
-    # Função auxiliar de normalização
-    def normalize(text):
-        return unidecode(str(text)).lower().strip()
-
-    # Prepara tuplas (normalizado, original) para poder retornar o original
-    remume_db = [(normalize(m), m) for m in remume_names if m]
-    alto_custo_db = [(normalize(m), m) for m in alto_custo_names if m]
-    rename_db = [(normalize(m), m) for m in rename_names if m]
+    # Índice pré-construído (Aho-Corasick + trigramas + chaves), reaproveitado entre reruns
+    index = get_catalog().index
     
-    for med in medication_list:
-        med_clean = med.strip()
-        med_norm = normalize(med_clean)
-        
+    # Receita inteira numa passada (similaridade de trigramas vetorizada)
+    meds_clean = [med.strip() for med in medication_list]
+    for med_clean, checks in zip(meds_clean, index.check_batch(meds_clean)):
         status = {
             "name": med_clean,
-            "remume": {"found": False, "match": None},
-            "alto_custo": {"found": False, "match": None},
-            "rename": {"found": False, "match": None}
+            "remume": checks["remume"],        # Municipal
+            "alto_custo": checks["alto_custo"], # Estadual
+            "rename": checks["rename"]         # Nacional
         }
-        
-        # Helper de busca
-        def find_match(term_norm, db_list):
-            # Procura item do banco (db_norm) dentro do termo (term_norm) OU termo dentro do item do banco
-            # Retorna o Original
-            for db_norm, db_original in db_list:
-                # IGNORA entradas muito curtas (ex: "a", "b", "ou") para evitar falso positivo
-                if len(db_norm) < 3:
-                    continue
-                    
-                if term_norm in db_norm or db_norm in term_norm:
-                    return db_original
-            return None
-
-        # Check Municipal (REMUME)
-        match_remume = find_match(med_norm, remume_db)
-        if match_remume:
-            status["remume"] = {"found": True, "match": match_remume}
-            
-        # Check Estadual (Alto Custo)
-        match_estadual = find_match(med_norm, alto_custo_db)
-        if match_estadual:
-            status["alto_custo"] = {"found": True, "match": match_estadual}
-            
-        # Check Nacional (RENAME)
-        match_rename = find_match(med_norm, rename_db)
-        if match_rename:
-            status["rename"] = {"found": True, "match": match_rename}
-            
         checked_meds.append(status)
     
     return checked_meds
@@ -239,29 +203,65 @@ def record_audio():
                     input=True,
                     frames_per_buffer=CHUNK)
 
-    st.session_state.audio_frames = []
+    # Frames vão direto para o disco (fila limitada + thread de escrita), não para o session_state
+    writer = wav_writer.StreamingWavWriter(OUTPUT_FILENAME, CHANNELS, p.get_sample_size(FORMAT), RATE)
+    try:
+        while st.session_state.recording:
+            writer.write(stream.read(CHUNK))
+    finally:
+        stream.stop_stream()
+        stream.close()
+        p.terminate()
+        writer.close()
+        st.session_state.audio_seconds = round(writer.frames_written / RATE, 1)
+
+ANALYSIS_PROMPT = """
+    Você é um assistente médico experiente e preciso. Ouça o áudio desta consulta médica com atenção.
     
-    while st.session_state.recording:
-        data = stream.read(CHUNK)
-        st.session_state.audio_frames.append(data)
+    1. Identifique a "Principal Hipótese Diagnóstica" (Doença/Condição).
+    2. Considere os Protocolos Clínicos e Diretrizes Terapêuticas (PCDT) vigentes.
+    3. Elabore um resumo SOAP estruturado (Subjetivo, Objetivo, Avaliação, Plano).
+    4. Sugira medicamentos alinhados com o PCDT e as melhores práticas. PREFIRA SEMPRE NOMES GENÉRICOS SIMPLES (ex: "Dipirona" em vez de "Dipirona Sódica").
     
-    stream.stop_stream()
-    stream.close()
-    p.terminate()
-
-    waveFile = wave.open(OUTPUT_FILENAME, 'wb')
-    waveFile.setnchannels(CHANNELS)
-    waveFile.setsampwidth(p.get_sample_size(FORMAT))
-    waveFile.setframerate(RATE)
-    waveFile.writeframes(b''.join(st.session_state.audio_frames))
-    waveFile.close()
+    Sua tarefa é extrair as informações e retornar APENAS um objeto JSON válido com a seguinte estrutura:
+    {
+        "soap": {
+            "s": "Texto do Subjetivo.",
+            "o": "Texto do Objetivo.",
+            "a": "Texto da Avaliação.",
+            "p": "Texto do Plano."
+        },
+        "principal_hipotese_diagnostica": "Texto com o diagnóstico principal.",
+        "medicamentos_sugeridos": ["Lista de strings", "Use nomes genéricos", "Evite nomes comerciais"]
+    }
+    
+    Seja preciso. Retorne apenas JSON.
+    """
 
 def process_with_gemini(api_key):
     try:
         genai.configure(api_key=api_key)
         
+        # Mono 16kHz sem pausas longas: menos bytes no upload e menos tokens de áudio
+        prep = audio_prep.preprocess(OUTPUT_FILENAME)
+        if not prep["skipped"]:
+            st.caption(f"Áudio otimizado: {prep['in_bytes'] / 1e6:.1f} MB → {prep['out_bytes'] / 1e6:.1f} MB "
+                       f"({prep['ratio']}x, {prep['in_seconds']}s → {prep['out_seconds']}s)")
+
+        # Consulta longa: trechos transcritos em paralelo + merge num JSON só
+        if not prep["skipped"] and prep.get("out_seconds", 0) > segmented.LONG_AUDIO_S:
+            bar = st.progress(0.0, text="Dividindo áudio em trechos...")
+            data = segmented.analyze_long(
+                api_key, prep["path"], ANALYSIS_PROMPT,
+                on_progress=lambda done, total, msg: bar.progress(done / max(total, 1), text=msg)
+            )
+            if "error" in data:
+                st.error(data["error"])
+                return None
+            return data
+
         # Upload do arquivo
-        audio_file = genai.upload_file(path=OUTPUT_FILENAME)
+        audio_file = genai.upload_file(path=prep["path"])
         
         # Aguarda processamento se necessário (embora upload seja rápido para arquivos pequenos)
         while audio_file.state.name == "PROCESSING":
@@ -270,30 +270,8 @@ def process_with_gemini(api_key):
 
         model = genai.GenerativeModel('gemini-2.5-flash')
         
-        prompt = """
-        Você é um assistente médico experiente e preciso. Ouça o áudio desta consulta médica com atenção.
         
-        1. Identifique a "Principal Hipótese Diagnóstica" (Doença/Condição).
-        2. Considere os Protocolos Clínicos e Diretrizes Terapêuticas (PCDT) vigentes.
-        3. Elabore um resumo SOAP estruturado (Subjetivo, Objetivo, Avaliação, Plano).
-        4. Sugira medicamentos alinhados com o PCDT e as melhores práticas. PREFIRA SEMPRE NOMES GENÉRICOS SIMPLES (ex: "Dipirona" em vez de "Dipirona Sódica").
-        
-        Sua tarefa é extrair as informações e retornar APENAS um objeto JSON válido com a seguinte estrutura:
-        {
-            "soap": {
-                "s": "Texto do Subjetivo.",
-                "o": "Texto do Objetivo.",
-                "a": "Texto da Avaliação.",
-                "p": "Texto do Plano."
-            },
-            "principal_hipotese_diagnostica": "Texto com o diagnóstico principal.",
-            "medicamentos_sugeridos": ["Lista de strings", "Use nomes genéricos", "Evite nomes comerciais"]
-        }
-        
-        Seja preciso. Retorne apenas JSON.
-        """
-        
-        response = model.generate_content([prompt, audio_file])
+        response = model.generate_content([ANALYSIS_PROMPT, audio_file])
         
         # Tenta extrair o JSON
         try:
@@ -328,14 +306,14 @@ with st.sidebar:
     st.markdown("---")
     st.markdown("**Status dos Bancos de Dados:**")
     
-    # Carrega dados específicos
-    remume_names = load_remume_names()
-    alto_custo_names = load_alto_custo_names()
-    rename_names = load_rename_names()
+    # Carrega dados específicos (cacheados; só relê se o arquivo mudou)
+    catalog = get_catalog()
+    for lista, erro in catalog.errors.items():
+        st.error(f"Erro ao ler db_{lista}.json: {erro}")
     
-    st.success(f"REMUME: {len(remume_names)} itens")
-    st.info(f"Alto Custo: {len(alto_custo_names)} itens")
-    st.warning(f"RENAME: {len(rename_names)} itens")
+    st.success(f"REMUME: {len(catalog.names['remume'])} itens")
+    st.info(f"Alto Custo: {len(catalog.names['alto_custo'])} itens")
+    st.warning(f"RENAME: {len(catalog.names['rename'])} itens")
 
 col1, col2 = st.columns(2)
 
@@ -353,6 +331,7 @@ with col1:
             rec_thread = threading.Thread(target=record_audio)
             add_script_run_ctx(rec_thread)
             rec_thread.start()
+            st.session_state.rec_thread = rec_thread
             st.rerun()
 
     # Botão Parar
@@ -370,8 +349,10 @@ with col1:
                 st.error("Por favor, insira sua API Key na barra lateral.")
                 st.session_state.processing = False
             else:
-                # Aguarda um momento para garantir que a thread de gravação fechou o arquivo
-                time.sleep(0.5) 
+                # Aguarda a thread de gravação fechar o arquivo (cabeçalho WAV finalizado)
+                rec_thread = st.session_state.get("rec_thread")
+                if rec_thread is not None:
+                    rec_thread.join(timeout=10)
                 
                 result = process_with_gemini(st.session_state.api_key)
                 if result:
@@ -426,7 +407,7 @@ if st.session_state.analysis_result:
         meds = result.get("medicamentos_sugeridos", [])
         
         if meds:
-            checked_meds_status = check_medication_availability(meds, remume_names, alto_custo_names, rename_names)
+            checked_meds_status = check_medication_availability(meds)
             
             st.markdown("### Receita Sugerida")
             
@@ -437,9 +418,18 @@ if st.session_state.analysis_result:
                 is_rename = item['rename']['found']
                 
                 # Badges HTML
-                badge_remume = '<span class="badge badge-success">REMUME</span>' if is_remume else '<span class="badge badge-secondary">REMUME</span>'
-                badge_rename = '<span class="badge badge-success">RENAME</span>' if is_rename else '<span class="badge badge-secondary">RENAME</span>'
-                badge_estadual = '<span class="badge badge-success">ESTADUAL</span>' if is_alto_custo else '<span class="badge badge-secondary">ESTADUAL</span>'
+                # Consta, mas em outra dose/forma: a ressalva vai no badge
+                def rotulo(label, res):
+                    ressalva = catalog_index.NAO_EXATO.get(res.get('tipo'))
+                    return f"{label} ({ressalva})" if ressalva else label
+
+                badge_remume = f'<span class="badge badge-success">{rotulo("REMUME", item["remume"])}</span>' if is_remume else '<span class="badge badge-secondary">REMUME</span>'
+                badge_rename = f'<span class="badge badge-success">{rotulo("RENAME", item["rename"])}</span>' if is_rename else '<span class="badge badge-secondary">RENAME</span>'
+                badge_estadual = f'<span class="badge badge-success">{rotulo("ESTADUAL", item["alto_custo"])}</span>' if is_alto_custo else '<span class="badge badge-secondary">ESTADUAL</span>'
+                # Nome parecido (possível erro de digitação): aviso à parte, o badge continua cinza
+                sugestoes = [f"{db.upper().replace('_', ' ')}: {item[db]['sugestao']['match']}"
+                             for db in ['remume', 'rename', 'alto_custo'] if item[db].get('sugestao')]
+                aviso = f'<div><small>Você quis dizer? {" | ".join(sugestoes)}</small></div>' if sugestoes else ""
                 
                 st.markdown(f"""
                 <div class="med-container">
@@ -449,6 +439,7 @@ if st.session_state.analysis_result:
                         {badge_rename}
                         {badge_estadual}
                     </div>
+                    {aviso}
                 </div>
                 """, unsafe_allow_html=True)
             
@@ -466,6 +457,8 @@ if st.session_state.analysis_result:
                     # REMUME Match
                     if item['remume']['found']:
                         audit_data.append({"Origem": "IA", "Medicamento": med_ia, "Banco": "REMUME", "Match no Banco": item['remume']['match']})
+                    elif item['remume'].get('sugestao'):
+                         audit_data.append({"Origem": "IA", "Medicamento": med_ia, "Banco": "REMUME", "Match no Banco": f"❓ Parecido: {item['remume']['sugestao']['match']}"})
                     else:
                          audit_data.append({"Origem": "IA", "Medicamento": med_ia, "Banco": "REMUME", "Match no Banco": "❌ Não encontrado"})
 
@@ -487,7 +480,9 @@ if st.session_state.analysis_result:
 # --- Debug Section ---
 with st.expander("🛠️ Debug Information"):
     st.write("### Session State")
-    st.json(st.session_state)
+    # Só valores serializáveis (a thread de gravação também fica no session_state)
+    st.json({k: v for k, v in st.session_state.items()
+             if isinstance(v, (str, int, float, bool, list, dict, type(None)))})
     
     if st.session_state.analysis_result:
         st.write("### Raw Gemini Response")
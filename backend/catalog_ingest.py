@@ -0,0 +1,269 @@
+import os
+import re
+import json
+import hashlib
+from datetime import datetime, timezone
+
+import db_manager
+import parser_core
+from catalog_snapshot import catalog_paths, load_list, normalize
+
+# Ingestão única do catálogo oficial (data/*.json) para o sus_medicamentos.db.
+# Roda no startup: só recarrega a lista cujo arquivo mudou (sha256).
+# catalogo_itens guarda o detalhe (grupo, ATC, CIDs); cada item também entra em
+# `medicamentos` com a flag da lista, então sai no mesmo delta de /medicamentos/changes.
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _row(lista, nome, texto_original, concentracao="", forma="", grupo="", componente="", atc="", extra=None):
+    return (
+        lista, nome, normalize(nome), concentracao, forma, grupo, componente, atc,
+        texto_original, json.dumps(extra, ensure_ascii=False) if extra else None
+    )
+
+
+def rows_remume(data):
+    for item in data:
+        if isinstance(item, dict):
+            texto = item.get("nome_completo", item.get("nome", ""))
+            extra = {k: item[k] for k in ("id", "disponibilidade", "notas") if item.get(k)}
+        else:
+            texto, extra = item, None
+        if not texto:
+            continue
+        parts = parser_core.split_remume_nome(texto)
+        yield _row("remume", parts["nome"] or texto, texto, parts["concentracao"], parts["forma"], extra=extra)
+
+
+def rows_rename(data):
+    for grupo in data:
+        if isinstance(grupo, dict) and isinstance(grupo.get("itens"), list):
+            nome_grupo = grupo.get("grupo", "")
+            itens = grupo["itens"]
+        else:
+            # Lista plana (formato antigo)
+            nome_grupo, itens = "", [grupo]
+
+        for sub in itens:
+            if isinstance(sub, str):
+                sub = {"nome": sub}
+            if not isinstance(sub, dict) or not sub.get("nome"):
+                continue
+            detalhes = sub.get("detalhes", "")
+            parts = parser_core.split_rename_detalhes(detalhes)
+            componente = parts["componente"] or nome_grupo.replace("Componente", "").strip()
+            yield _row(
+                "rename", sub["nome"], f"{sub['nome']} {detalhes}".strip(),
+                parts["concentracao"], parts["forma"], nome_grupo, componente, parts["atc"],
+                extra={"tags": sub["tags"]} if sub.get("tags") else None
+            )
+
+
+def rows_alto_custo(data):
+    for item in data:
+        if isinstance(item, str):
+            item = {"nome": item}
+        if not isinstance(item, dict) or not item.get("nome"):
+            continue
+        yield _row(
+            "alto_custo", item["nome"], f"{item['nome']} {item.get('dose', '')}".strip(),
+            concentracao=item.get("dose", ""),
+            extra={k: item[k] for k in ("cids_autorizados", "origem") if item.get(k)}
+        )
+
+
+ROW_BUILDERS = {
+    "remume": rows_remume,
+    "rename": rows_rename,
+    "alto_custo": rows_alto_custo,
+}
+
+# Lista do catálogo -> flag em medicamentos (Alto Custo é dispensado pelo estado)
+TIPO_LISTA = {"remume": "remume", "rename": "rename", "alto_custo": "estadual"}
+
+
+def _merge_medicamentos(c, lista, arquivo, rows):
+    """
+    Itens da lista em medicamentos (mesmo upsert das importações: merge de flag, versão só se mudar).
+    Quem saiu da lista perde a flag dela, com versão nova: o delta avisa os clientes.
+    """
+    chaves = set()
+    for r in rows:
+        chave = (r[1], r[3] or "", r[4] or "")
+        chaves.add(chave)
+        db_manager._upsert(c, *chave, arquivo, TIPO_LISTA[lista])
+
+    flag = f"disp_{TIPO_LISTA[lista]}"
+    for row in c.execute(f"SELECT id, nome, concentracao, forma FROM medicamentos WHERE {flag} = 1").fetchall():
+        if (row["nome"], row["concentracao"], row["forma"]) not in chaves:
+            c.execute(f"UPDATE medicamentos SET {flag} = 0, versao = ? WHERE id = ?", (db_manager._next_version(c), row["id"]))
+
+
+def _merge_missing(c, arquivo) -> bool:
+    # Bancos carregados antes do merge: a lista não aparece em medicamentos ainda
+    return not c.execute("SELECT 1 FROM medicamentos WHERE origem_arquivo = ? LIMIT 1", (arquivo,)).fetchone()
+
+
+def _index_cids(c):
+    """Reconstrói o índice CID -> item a partir do texto concatenado de cids_autorizados."""
+    c.execute("DELETE FROM catalogo_cids")
+    pares = []
+    for r in c.execute("SELECT id, extra FROM catalogo_itens WHERE lista = 'alto_custo'").fetchall():
+        extra = json.loads(r["extra"]) if r["extra"] else {}
+        for cid, descricao in parser_core.split_cids(extra.get("cids_autorizados", "")):
+            pares.append((cid, descricao, r["id"]))
+    c.executemany("INSERT INTO catalogo_cids (cid, descricao, item_id) VALUES (?, ?, ?)", pares)
+
+
+def _cids_missing(c, lista) -> bool:
+    # Bancos carregados antes do índice de CIDs existir precisam de uma recarga do Alto Custo
+    return lista == "alto_custo" and not c.execute("SELECT 1 FROM catalogo_cids LIMIT 1").fetchone()
+
+
+def ingest_all(data_dir: str = None, force: bool = False) -> dict:
+    """
+    Carrega as três listas em catalogo_itens.
+    Retorna {lista: "loaded" | "unchanged" | "missing"}.
+    """
+    result = {}
+    conn = db_manager.get_connection()
+    try:
+        c = conn.cursor()
+        known = {r["lista"]: r["sha256"] for r in c.execute("SELECT lista, sha256 FROM catalogo_fontes")}
+
+        for lista, path in catalog_paths(data_dir).items():
+            if not os.path.exists(path):
+                result[lista] = "missing"
+                continue
+
+            digest = file_sha256(path)
+            arquivo = os.path.basename(path)
+            if not force and known.get(lista) == digest and not _cids_missing(c, lista) and not _merge_missing(c, arquivo):
+                result[lista] = "unchanged"
+                continue
+
+            rows = list(ROW_BUILDERS[lista](load_list(path)))
+
+            # Substitui a lista inteira numa transação só (leitores nunca veem meia carga)
+            c.execute("DELETE FROM catalogo_itens WHERE lista = ?", (lista,))
+            c.executemany('''
+                INSERT INTO catalogo_itens
+                    (lista, nome, nome_norm, concentracao, forma, grupo, componente, atc, texto_original, extra)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            if lista == "alto_custo":
+                _index_cids(c)
+            _merge_medicamentos(c, lista, arquivo, rows)
+            c.execute('''
+                INSERT OR REPLACE INTO catalogo_fontes (lista, arquivo, sha256, itens, carregado_em)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (lista, arquivo, digest, len(rows), datetime.now(timezone.utc).isoformat()))
+            conn.commit()
+            result[lista] = "loaded"
+    finally:
+        conn.close()
+    return result
+
+
+def buscar(nome: str, lista: str = None, limit: int = 20):
+    """Lookup no catálogo ingerido: match exato no nome normalizado, depois prefixo (usa índice)."""
+    termo = normalize(nome)
+    if not termo:
+        return []
+
+    conn = db_manager.get_connection()
+    try:
+        filtro = "AND lista = ?" if lista else ""
+        params = [lista] if lista else []
+        rows = conn.execute(f'''
+            SELECT lista, nome, concentracao, forma, grupo, componente, atc, texto_original,
+                   CASE WHEN nome_norm = ? THEN 0 ELSE 1 END AS rank
+            FROM catalogo_itens
+            WHERE nome_norm >= ? AND nome_norm < ? {filtro}
+            ORDER BY rank, nome_norm
+            LIMIT ?
+        ''', [termo, termo, termo + "\uffff", *params, limit]).fetchall()
+        return [{k: r[k] for k in r.keys() if k != "rank"} for r in rows]
+    finally:
+        conn.close()
+
+
+def alto_custo_por_cid(cid: str, prefixo: bool = False, limit: int = 100):
+    """
+    Medicamentos do Alto Custo autorizados (LME) para um CID.
+    prefixo=True: "M05" pega M050, M051, ... (busca por faixa, usa índice).
+    """
+    codigo = parser_core.normalize_cid(cid)
+    if not codigo:
+        return []
+
+    conn = db_manager.get_connection()
+    try:
+        if prefixo:
+            where, params = "cc.cid >= ? AND cc.cid < ?", [codigo, codigo + "\uffff"]
+        else:
+            where, params = "cc.cid = ?", [codigo]
+        rows = conn.execute(f'''
+            SELECT ci.id, ci.nome, ci.concentracao, ci.extra, cc.cid, cc.descricao
+            FROM catalogo_cids cc JOIN catalogo_itens ci ON ci.id = cc.item_id
+            WHERE {where}
+            ORDER BY ci.nome_norm, ci.id, cc.cid
+        ''', params).fetchall()
+    finally:
+        conn.close()
+
+    # Agrupa por medicamento: [{"nome", "dose", "origem", "cids": [{"cid", "descricao"}]}]
+    itens = {}
+    for r in rows:
+        item = itens.get(r["id"])
+        if item is None:
+            if len(itens) >= limit:
+                continue
+            extra = json.loads(r["extra"]) if r["extra"] else {}
+            item = itens[r["id"]] = {
+                "nome": r["nome"], "dose": r["concentracao"], "origem": extra.get("origem", ""), "cids": []
+            }
+        item["cids"].append({"cid": r["cid"], "descricao": r["descricao"]})
+    return list(itens.values())
+
+
+def checar_lme(cids: list, medicamentos: list) -> dict:
+    """
+    Elegibilidade LME sem chamada extra à IA:
+    - elegiveis: Alto Custo autorizados para os CIDs do diagnóstico, um por nome
+      (apresentações e CIDs de todas as linhas do mesmo medicamento juntos)
+    - medicamentos: para cada prescrito que é Alto Custo, se algum CID do diagnóstico o autoriza
+    """
+    codigos = [c for c in dict.fromkeys(parser_core.normalize_cid(c) for c in cids or []) if c]
+    elegiveis = {}
+    for codigo in codigos:
+        # CID de categoria ("M05") cobre todas as subcategorias
+        for item in alto_custo_por_cid(codigo, prefixo=len(codigo) == 3):
+            grupo = elegiveis.setdefault(item["nome"], {"nome": item["nome"], "doses": [], "origem": item["origem"], "cids": []})
+            if item["dose"] and item["dose"] not in grupo["doses"]:
+                grupo["doses"].append(item["dose"])
+            vistos = {c["cid"] for c in grupo["cids"]}
+            grupo["cids"] += [c for c in item["cids"] if c["cid"] not in vistos]
+
+    checados = []
+    for med in medicamentos or []:
+        nome = re.split(r'\d', str(med), 1)[0].strip()
+        achados = buscar(nome, "alto_custo", limit=1) if len(nome) >= 2 else []
+        if not achados:
+            continue
+        nome_ac = achados[0]["nome"]
+        autorizado = nome_ac in elegiveis
+        checados.append({
+            "medicamento": med,
+            "alto_custo": nome_ac,
+            "autorizado": autorizado,
+            "cids": [c["cid"] for c in elegiveis[nome_ac]["cids"]] if autorizado else []
+        })
+    return {"cids": codigos, "elegiveis": list(elegiveis.values()), "medicamentos": checados}
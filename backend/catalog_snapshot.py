@@ -0,0 +1,215 @@
+import os
+import sys
+import json
+import gzip
+import shutil
+import sqlite3
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timezone
+from unidecode import unidecode
+
+import metrics
+
+# Snapshot compacto do catálogo para clientes offline (Flet/Flutter).
+# Em vez de cada app fazer json.load de ~300KB no startup, o backend gera um
+# SQLite já indexado por nome normalizado e entrega comprimido (gzip).
+# A fonte é o catalogo_itens (catalog_ingest), a mesma de /catalogo/buscar e do delta.
+# O cliente descompacta uma vez e abre o arquivo direto.
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.environ.get("MEDUBS_DATA_DIR", os.path.join(BACKEND_DIR, "..", "data"))
+SNAPSHOT_DIR = os.path.join(BACKEND_DIR, "snapshots")
+
+CATALOG_FILES = {
+    "remume": "db_remume.json",
+    "rename": "db_rename.json",
+    "alto_custo": "db_alto_custo.json",
+}
+
+SCHEMA_VERSION = 2   # 2: colunas do catalogo_itens (concentracao, forma, atc...)
+
+# Evita dois requests gerando o mesmo snapshot ao mesmo tempo
+_build_lock = threading.Lock()
+
+
+def normalize(text) -> str:
+    # Mesma normalização usada nos clientes (unidecode + lower)
+    return unidecode(str(text)).lower().strip()
+
+
+def catalog_paths(data_dir: str = None) -> dict:
+    data_dir = data_dir or DATA_DIR
+    return {lista: os.path.join(data_dir, fname) for lista, fname in CATALOG_FILES.items()}
+
+
+def load_list(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data if isinstance(data, list) else [data]
+
+
+def ingested_hash() -> str:
+    """Hash das listas carregadas em catalogo_itens (sha256 de cada arquivo ingerido)."""
+    import db_manager
+    conn = db_manager.get_connection()
+    try:
+        fontes = conn.execute("SELECT lista, sha256 FROM catalogo_fontes ORDER BY lista").fetchall()
+    finally:
+        conn.close()
+    h = hashlib.sha256(str(SCHEMA_VERSION).encode())
+    for lista, digest in fontes:
+        h.update(f"{lista}:{digest}".encode())
+    return h.hexdigest()
+
+
+def iter_catalog_rows():
+    """Linhas do catálogo já ingerido (catalog_ingest): a mesma fonte de /catalogo/buscar e do delta."""
+    import db_manager
+    conn = db_manager.get_connection()
+    try:
+        rows = conn.execute('''
+            SELECT lista, nome, nome_norm, concentracao, forma, grupo, componente, atc, texto_original, extra
+            FROM catalogo_itens ORDER BY id
+        ''').fetchall()
+    finally:
+        conn.close()
+    for r in rows:
+        extra = json.loads(r["extra"]) if r["extra"] else {}
+        yield (r["lista"], r["nome"], r["nome_norm"], r["concentracao"], r["forma"], r["grupo"],
+               r["componente"], r["atc"], r["texto_original"], extra.get("cids_autorizados", ""))
+
+
+def build_sqlite(out_path: str) -> dict:
+    """
+    Gera o SQLite do catálogo em `out_path` a partir de catalogo_itens (escrita atômica
+    via arquivo temporário). Retorna metadados (hash de origem, contagem por lista).
+    """
+    source_hash = ingested_hash()
+    tmp_path = out_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        c = conn.cursor()
+        # Build único, sem concorrência: desliga journal para gerar rápido
+        c.execute("PRAGMA journal_mode = OFF")
+        c.execute("PRAGMA synchronous = OFF")
+        c.execute('''
+            CREATE TABLE catalogo (
+                id INTEGER PRIMARY KEY,
+                lista TEXT NOT NULL,
+                nome TEXT NOT NULL,
+                nome_norm TEXT NOT NULL,
+                concentracao TEXT,
+                forma TEXT,
+                grupo TEXT,
+                componente TEXT,
+                atc TEXT,
+                texto_original TEXT,
+                cids TEXT
+            )
+        ''')
+        c.execute('CREATE TABLE meta (chave TEXT PRIMARY KEY, valor TEXT)')
+
+        rows = list(iter_catalog_rows())
+        c.executemany('''
+            INSERT INTO catalogo (lista, nome, nome_norm, concentracao, forma, grupo, componente, atc, texto_original, cids)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+
+        # Índices criados depois do bulk insert (mais rápido que manter durante)
+        c.execute('CREATE INDEX idx_catalogo_norm ON catalogo (nome_norm)')
+        c.execute('CREATE INDEX idx_catalogo_lista_norm ON catalogo (lista, nome_norm)')
+
+        counts = {}
+        for lista, *_ in rows:
+            counts[lista] = counts.get(lista, 0) + 1
+
+        meta = {
+            "schema_version": str(SCHEMA_VERSION),
+            "source_hash": source_hash,
+            "gerado_em": datetime.now(timezone.utc).isoformat(),
+            "contagem": json.dumps(counts),
+        }
+        c.executemany('INSERT INTO meta (chave, valor) VALUES (?, ?)', meta.items())
+        conn.commit()
+        c.execute("VACUUM")
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, out_path)
+    return {"source_hash": source_hash, "contagem": counts, "path": out_path}
+
+
+def gzip_file(src_path: str, out_path: str):
+    tmp_path = out_path + ".tmp"
+    with open(src_path, "rb") as src, gzip.open(tmp_path, "wb", compresslevel=9) as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(tmp_path, out_path)
+
+
+def get_or_build_snapshot(data_dir: str = None, snapshot_dir: str = None):
+    """
+    Retorna (caminho_gz, hash). Só reconstrói se o hash das listas ingeridas mudou,
+    então chamadas repetidas ao endpoint custam apenas o hash dos arquivos.
+    """
+    import catalog_ingest
+    snapshot_dir = snapshot_dir or SNAPSHOT_DIR
+    os.makedirs(snapshot_dir, exist_ok=True)
+
+    # Garante que catalogo_itens reflete os arquivos (pula o que não mudou) e gera dele
+    catalog_ingest.ingest_all(data_dir)
+    source_hash = ingested_hash()
+    gz_path = os.path.join(snapshot_dir, f"catalogo-{source_hash[:16]}.sqlite.gz")
+    if os.path.exists(gz_path):
+        metrics.cache_result("snapshot_build", True)
+        return gz_path, source_hash
+    metrics.cache_result("snapshot_build", False)
+
+    with _build_lock:
+        if os.path.exists(gz_path):
+            return gz_path, source_hash
+
+        db_path = os.path.join(snapshot_dir, f"catalogo-{source_hash[:16]}.sqlite")
+        build_sqlite(db_path)
+        gzip_file(db_path, gz_path)
+        os.remove(db_path)
+
+        # Remove snapshots antigos (hash diferente)
+        for fname in os.listdir(snapshot_dir):
+            if fname.startswith("catalogo-") and os.path.join(snapshot_dir, fname) != gz_path:
+                try:
+                    os.remove(os.path.join(snapshot_dir, fname))
+                except OSError:
+                    pass
+    return gz_path, source_hash
+
+
+def main(argv=None):
+    # Uso (build): python catalog_snapshot.py --out ../src/assets/catalogo.sqlite [--gzip]
+    ap = argparse.ArgumentParser(description="Exporta o catálogo (data/*.json) como SQLite indexado.")
+    ap.add_argument("--out", required=True, help="Arquivo .sqlite de saída")
+    ap.add_argument("--data-dir", default=None, help="Diretório com os JSONs (padrão: ../data)")
+    ap.add_argument("--gzip", action="store_true", help="Gera também <out>.gz")
+    args = ap.parse_args(argv)
+
+    import db_manager
+    import catalog_ingest
+    db_manager.init_db()
+    catalog_ingest.ingest_all(args.data_dir)
+    info = build_sqlite(args.out)
+    size = os.path.getsize(args.out)
+    print(f"✅ Snapshot gerado: {args.out} ({size / 1024:.1f} KB) {info['contagem']}")
+    if args.gzip:
+        gzip_file(args.out, args.out + ".gz")
+        print(f"📦 Comprimido: {args.out}.gz ({os.path.getsize(args.out + '.gz') / 1024:.1f} KB)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
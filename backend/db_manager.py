@@ -1,6 +1,8 @@
 import sqlite3
 import os
 
+import metrics
+
 # Caminho do Banco (o mesmo usado pelo Flutter? Não, o Backend roda no servidor Render)
 # O Flutter tem seu proprio banco SQLite local (sqflite).
 # O Backend terá o SEU banco para "aprender" ou para manter cache.
@@ -26,7 +28,8 @@ def init_db():
             origem_arquivo TEXT,
             disp_rename INTEGER DEFAULT 0,
             disp_estadual INTEGER DEFAULT 0,
-            disp_remume INTEGER DEFAULT 0
+            disp_remume INTEGER DEFAULT 0,
+            versao INTEGER DEFAULT 0
         )
     ''')
     
@@ -35,45 +38,181 @@ def init_db():
         c.execute('CREATE UNIQUE INDEX idx_med_unique ON medicamentos (nome, concentracao, forma)')
     except sqlite3.OperationalError:
         pass # Já existe
-        
+
+    # Migração: bancos antigos não tinham a coluna de versão (Delta Sync)
+    try:
+        c.execute('ALTER TABLE medicamentos ADD COLUMN versao INTEGER DEFAULT 0')
+    except sqlite3.OperationalError:
+        pass # Já existe
+
+    c.execute('CREATE INDEX IF NOT EXISTS idx_med_versao ON medicamentos (versao)')
+
+    # Contador global de alterações (monotônico, nunca reutiliza número)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS sync_meta (
+            chave TEXT PRIMARY KEY,
+            valor INTEGER NOT NULL
+        )
+    ''')
+    c.execute("INSERT OR IGNORE INTO sync_meta (chave, valor) VALUES ('versao_medicamentos', 0)")
+
+    # Linhas de antes da migração ficaram com versao 0 e nunca sairiam no delta (since=0):
+    # ganham versão real, na ordem de id
+    for (row_id,) in c.execute('SELECT id FROM medicamentos WHERE versao = 0 OR versao IS NULL ORDER BY id').fetchall():
+        c.execute('UPDATE medicamentos SET versao = ? WHERE id = ?', (_next_version(c), row_id))
+
+    # Catálogo oficial (data/*.json) normalizado em colunas: uma linha por item da lista
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS catalogo_itens (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            lista TEXT NOT NULL,
+            nome TEXT NOT NULL,
+            nome_norm TEXT NOT NULL,
+            concentracao TEXT,
+            forma TEXT,
+            grupo TEXT,
+            componente TEXT,
+            atc TEXT,
+            texto_original TEXT,
+            extra TEXT
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_catalogo_lista_norm ON catalogo_itens (lista, nome_norm)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_catalogo_norm ON catalogo_itens (nome_norm)')
+
+    # Hash de cada arquivo carregado (pula a ingestão se nada mudou)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS catalogo_fontes (
+            lista TEXT PRIMARY KEY,
+            arquivo TEXT,
+            sha256 TEXT,
+            itens INTEGER,
+            carregado_em TEXT
+        )
+    ''')
+
+    # Índice invertido CID -> medicamento do Alto Custo (autorização LME)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS catalogo_cids (
+            cid TEXT NOT NULL,
+            descricao TEXT,
+            item_id INTEGER NOT NULL
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_catalogo_cids_cid ON catalogo_cids (cid)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_catalogo_cids_item ON catalogo_cids (item_id)')
+
+    # Importações de lista (import_jobs.py): job, checkpoint por trecho e log de eventos
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS import_jobs (
+            id TEXT PRIMARY KEY,
+            nome_lista TEXT NOT NULL,
+            modelo TEXT,
+            force_ai INTEGER DEFAULT 0,
+            api_key TEXT,
+            pdf BLOB,
+            texto TEXT,
+            total_trechos INTEGER,
+            status TEXT NOT NULL,
+            tentativas INTEGER DEFAULT 0,
+            erro TEXT,
+            resultado TEXT,
+            request_id TEXT,
+            criado_em REAL NOT NULL,
+            atualizado_em REAL NOT NULL
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_import_jobs_status ON import_jobs (status, criado_em)')
+    # A api_key fica só em memória (import_jobs._keys): apaga as gravadas por versões antigas
+    c.execute('UPDATE import_jobs SET api_key = NULL WHERE api_key IS NOT NULL')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS import_trechos (
+            job_id TEXT NOT NULL,
+            idx INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            itens TEXT,
+            erro TEXT,
+            PRIMARY KEY (job_id, idx)
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS import_eventos (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id TEXT NOT NULL,
+            evento TEXT NOT NULL
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_import_eventos_job ON import_eventos (job_id, seq)')
+
     conn.commit()
     conn.close()
 
+def _next_version(c) -> int:
+    """Incrementa o contador de sync dentro da transação corrente e retorna o novo valor."""
+    c.execute("UPDATE sync_meta SET valor = valor + 1 WHERE chave = 'versao_medicamentos'")
+    row = c.execute("SELECT valor FROM sync_meta WHERE chave = 'versao_medicamentos'").fetchone()
+    return row[0]
+
+@metrics.timed("db_query")
+def get_changes_since(since: int, limit: int = 500):
+    """
+    Retorna (versao_atual, linhas) com os medicamentos alterados depois de `since`,
+    ordenados por versão. O cliente guarda a maior versão recebida e pede de novo a partir dela.
+    Item que saiu de uma lista volta com a flag zerada e versão nova; sem nenhuma flag,
+    vem com removido=True (tombstone: o cliente tira do catálogo offline).
+    """
+    conn = get_connection()
+    try:
+        row = conn.execute("SELECT valor FROM sync_meta WHERE chave = 'versao_medicamentos'").fetchone()
+        current = row[0] if row else 0
+        rows = conn.execute('''
+            SELECT id, nome, concentracao, forma, origem_arquivo,
+                   disp_rename, disp_estadual, disp_remume, versao
+            FROM medicamentos
+            WHERE versao > ?
+            ORDER BY versao
+            LIMIT ?
+        ''', (since, limit)).fetchall()
+        return current, [{**dict(r), "removido": not (r["disp_rename"] or r["disp_estadual"] or r["disp_remume"])}
+                         for r in rows]
+    finally:
+        conn.close()
+
+FLAGS_LISTA = ("disp_remume", "disp_rename", "disp_estadual")
+
+def _upsert(c, nome, concentracao, forma, origem_arquivo, tipo_lista):
+    """Upsert na transação corrente (sem commit). Só gera versão nova se alguma flag mudar."""
+    tipo = tipo_lista.lower()
+    flags = [f for f in FLAGS_LISTA if f.split("_", 1)[1] in tipo]
+
+    row = c.execute('''
+        SELECT id, disp_remume, disp_rename, disp_estadual FROM medicamentos
+        WHERE nome IS ? AND concentracao IS ? AND forma IS ?
+    ''', (nome, concentracao, forma)).fetchone()
+    if row is None:
+        c.execute('''
+            INSERT INTO medicamentos (nome, concentracao, forma, origem_arquivo, disp_remume, disp_rename, disp_estadual, versao)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (nome, concentracao, forma, origem_arquivo, *(int(f in flags) for f in FLAGS_LISTA), _next_version(c)))
+        return "INSERT"
+
+    # Já existe -> Merge flags (sem mudança real não gera sync vazio nos clientes)
+    novas = [f for f in flags if not row[FLAGS_LISTA.index(f) + 1]]
+    if not novas:
+        return "SKIP"
+    sets = ", ".join(f"{f} = 1" for f in novas)
+    c.execute(f"UPDATE medicamentos SET {sets}, versao = ? WHERE id = ?", (_next_version(c), row[0]))
+    return "UPDATE"
+
+@metrics.timed("db_query")
 def upsert_medicamento(nome: str, concentracao: str, forma: str, origem_arquivo: str, tipo_lista: str):
     """
     Inserts or Updates a medication.
     tipo_lista: 'remume', 'rename', 'estadual'
     """
     conn = get_connection()
-    c = conn.cursor()
-    
-    # Sanitiza flags
-    is_remume = 1 if 'remume' in tipo_lista.lower() else 0
-    is_rename = 1 if 'rename' in tipo_lista.lower() else 0
-    is_estadual = 1 if 'estadual' in tipo_lista.lower() else 0
-    
     try:
-        # Tenta Inserir
-        c.execute('''
-            INSERT INTO medicamentos (nome, concentracao, forma, origem_arquivo, disp_remume, disp_rename, disp_estadual)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (nome, concentracao, forma, origem_arquivo, is_remume, is_rename, is_estadual))
-        return "INSERT"
-        
-    except sqlite3.IntegrityError:
-        # Já existe -> Update (Merge flags)
-        # Monta query dinâmica para atualizar apenas as flags que são 1
-        updates = []
-        if is_remume: updates.append("disp_remume = 1")
-        if is_rename: updates.append("disp_rename = 1")
-        if is_estadual: updates.append("disp_estadual = 1")
-        
-        if updates:
-            sql = f"UPDATE medicamentos SET {', '.join(updates)} WHERE nome=? AND concentracao=? AND forma=?"
-            c.execute(sql, (nome, concentracao, forma))
-            return "UPDATE"
-            
+        with conn:
+            return _upsert(conn.cursor(), nome, concentracao, forma, origem_arquivo, tipo_lista)
     finally:
-        conn.commit()
         conn.close()
-    return "SKIP"
@@ -0,0 +1,339 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import db_manager
+
+# Importação de lista de medicamentos como job durável (tabelas em db_manager.init_db):
+#   import_jobs    um job por PDF enviado; o PDF fica só até o job terminar
+#   import_trechos resultado de cada trecho enviado à IA (checkpoint)
+#   import_eventos log NDJSON do job: o que o stream de /upload-medicamento mostra
+# O job roda num pool de threads, fora dos workers da API. A api_key NÃO vai para o
+# banco: fica só na memória do processo que recebeu o job. Se o processo cair, o job
+# fica com o heartbeat (atualizado_em) parado e, depois de LEASE_SECONDS, vira
+# "sem_chave" ("reenvie a chave"); com a chave reenviada (resend_key) ele retoma a
+# partir do primeiro trecho sem checkpoint: o que já foi pago à IA não é reenviado.
+# Até lá o PDF/texto extraído continua guardado (apagado quando o job termina).
+
+PENDENTE, EXECUTANDO, CONCLUIDO, FALHOU = "pendente", "executando", "concluido", "falhou"
+SEM_CHAVE = "sem_chave"   # interrompido sem a chave em memória: espera o usuário reenviar
+TERMINAIS = (CONCLUIDO, FALHOU, SEM_CHAVE)   # o stream de eventos termina nesses
+MSG_SEM_CHAVE = "Importação interrompida (servidor reiniciou) e a chave da API não fica salva: reenvie a chave para continuar."
+
+WORKERS = int(os.environ.get("MEDUBS_IMPORT_WORKERS", "2"))
+LEASE_SECONDS = 300      # sem heartbeat por esse tempo = processo morreu, outro retoma
+MAX_ATTEMPTS = 3         # job que derruba o processo não fica em loop
+POLL_SECONDS = 2.0
+STOP_TIMEOUT = 60        # shutdown: espera o trecho em andamento terminar
+
+_keys = {}               # job_id -> api_key (só em memória, deste processo)
+_keys_lock = threading.Lock()
+
+
+@contextmanager
+def _connect():
+    conn = sqlite3.connect(db_manager.DB_PATH, timeout=10)
+    conn.row_factory = sqlite3.Row
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def create(pdf, nome_lista, api_key, model, force_ai=False, request_id=None) -> str:
+    job_id = uuid.uuid4().hex[:16]
+    now = time.time()
+    with _keys_lock:
+        _keys[job_id] = api_key
+    with _connect() as conn:
+        conn.execute('''
+            INSERT INTO import_jobs (id, nome_lista, modelo, force_ai, pdf, status, request_id, criado_em, atualizado_em)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (job_id, nome_lista, model, int(bool(force_ai)), pdf, PENDENTE, request_id, now, now))
+    if _pool:
+        _pool.wake()
+    return job_id
+
+
+def resend_key(job_id, api_key) -> bool:
+    """Chave reenviada para um job "sem_chave": volta à fila e retoma do checkpoint."""
+    with _keys_lock:
+        anterior = _keys.get(job_id)
+        _keys[job_id] = api_key   # antes do UPDATE: um claim no meio já acha a chave
+    with _connect() as conn:
+        cur = conn.execute("UPDATE import_jobs SET status = ?, erro = NULL, atualizado_em = ? WHERE id = ? AND status = ?",
+                           (PENDENTE, time.time(), job_id, SEM_CHAVE))
+        if cur.rowcount:
+            conn.execute("INSERT INTO import_eventos (job_id, evento) VALUES (?, ?)",
+                         (job_id, json.dumps({"status": "progress", "msg": "Chave recebida. Retomando importação..."}, ensure_ascii=False)))
+    if not cur.rowcount:
+        with _keys_lock:
+            if anterior is None:
+                _keys.pop(job_id, None)
+            else:
+                _keys[job_id] = anterior   # job já em andamento com a chave original
+        return False
+    if _pool:
+        _pool.wake()
+    return True
+
+
+def _forget(job_id):
+    with _keys_lock:
+        _keys.pop(job_id, None)
+
+
+def _touch_pending(conn):
+    # Heartbeat dos pendentes com chave aqui: outro processo não os toma por abandonados
+    with _keys_lock:
+        mine = list(_keys)
+    if mine:
+        conn.execute(f"UPDATE import_jobs SET atualizado_em = ? WHERE status = ? AND id IN ({','.join('?' * len(mine))})",
+                     (time.time(), PENDENTE, *mine))
+
+
+def _interrupt(conn, job_id, status_atual):
+    """Job sem chave em memória (processo caiu ou está parando) -> "sem_chave", com evento final."""
+    cur = conn.execute("UPDATE import_jobs SET status = ?, erro = ?, atualizado_em = ? WHERE id = ? AND status = ?",
+                       (SEM_CHAVE, MSG_SEM_CHAVE, time.time(), job_id, status_atual))
+    if cur.rowcount:
+        conn.execute("INSERT INTO import_eventos (job_id, evento) VALUES (?, ?)",
+                     (job_id, json.dumps({"status": SEM_CHAVE, "job_id": job_id, "detail": MSG_SEM_CHAVE}, ensure_ascii=False)))
+    _forget(job_id)
+
+
+def claim():
+    """
+    Próximo job deste processo (pendente, com a chave em memória) ou abandonado por um
+    processo morto, já marcado como executando. Abandonado sem chave aqui vira "sem_chave".
+    """
+    while True:
+        with _connect() as conn:
+            _touch_pending(conn)
+            with _keys_lock:
+                mine = list(_keys)
+            row = conn.execute(f'''
+                SELECT * FROM import_jobs
+                WHERE (status = ? AND id IN ({','.join('?' * len(mine))}))
+                   OR (status IN (?, ?) AND atualizado_em < ?)
+                ORDER BY criado_em LIMIT 1
+            ''', (PENDENTE, *mine, PENDENTE, EXECUTANDO, time.time() - LEASE_SECONDS)).fetchone()
+            if row is None:
+                return None
+            if row["tentativas"] >= MAX_ATTEMPTS:
+                _finish(conn, row["id"], FALHOU, {"status": "error", "detail": f"Importação interrompida {row['tentativas']} vezes."})
+                continue
+            api_key = _keys.get(row["id"])
+            if api_key is None:
+                _interrupt(conn, row["id"], row["status"])
+                continue
+            # Troca condicional: se outro processo pegou o mesmo job antes, tenta o próximo
+            cur = conn.execute('''
+                UPDATE import_jobs SET status = ?, tentativas = tentativas + 1, atualizado_em = ?
+                WHERE id = ? AND status = ? AND atualizado_em = ?
+            ''', (EXECUTANDO, time.time(), row["id"], row["status"], row["atualizado_em"]))
+            if cur.rowcount:
+                job = dict(row)
+                job["tentativas"] += 1
+                job["api_key"] = api_key
+                return job
+
+
+def save_text(job_id, texto, total_trechos):
+    """Checkpoint da extração: retomadas pulam o parse do PDF."""
+    with _connect() as conn:
+        conn.execute("UPDATE import_jobs SET texto = ?, total_trechos = ?, atualizado_em = ? WHERE id = ?",
+                     (texto, total_trechos, time.time(), job_id))
+
+
+def save_chunk(job_id, idx, itens=None, erro=None):
+    with _connect() as conn:
+        conn.execute("INSERT OR REPLACE INTO import_trechos (job_id, idx, status, itens, erro) VALUES (?, ?, ?, ?, ?)",
+                     (job_id, idx, "erro" if erro else "ok", json.dumps(itens or [], ensure_ascii=False), erro))
+        conn.execute("UPDATE import_jobs SET atualizado_em = ? WHERE id = ?", (time.time(), job_id))
+
+
+def done_chunks(job_id) -> dict:
+    """{idx: itens} dos trechos que a IA já processou com sucesso."""
+    with _connect() as conn:
+        rows = conn.execute("SELECT idx, itens FROM import_trechos WHERE job_id = ? AND status = 'ok'", (job_id,)).fetchall()
+    return {r["idx"]: json.loads(r["itens"]) for r in rows}
+
+
+def add_event(job_id, event):
+    """Grava um evento do job (e serve de heartbeat, dele e dos pendentes deste processo)."""
+    with _connect() as conn:
+        conn.execute("INSERT INTO import_eventos (job_id, evento) VALUES (?, ?)",
+                     (job_id, json.dumps(event, ensure_ascii=False)))
+        conn.execute("UPDATE import_jobs SET atualizado_em = ? WHERE id = ?", (time.time(), job_id))
+        _touch_pending(conn)
+
+
+def events(job_id, after=0, limit=500):
+    """[(seq, evento)] do job depois de `after`, em ordem."""
+    with _connect() as conn:
+        rows = conn.execute("SELECT seq, evento FROM import_eventos WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                            (job_id, after, limit)).fetchall()
+    return [(r["seq"], json.loads(r["evento"])) for r in rows]
+
+
+def tail(job_id, count=20):
+    with _connect() as conn:
+        rows = conn.execute("SELECT seq, evento FROM import_eventos WHERE job_id = ? ORDER BY seq DESC LIMIT ?",
+                            (job_id, count)).fetchall()
+    return [(r["seq"], json.loads(r["evento"])) for r in reversed(rows)]
+
+
+def _finish(conn, job_id, status, final_event):
+    conn.execute("INSERT INTO import_eventos (job_id, evento) VALUES (?, ?)",
+                 (job_id, json.dumps(final_event, ensure_ascii=False)))
+    conn.execute('''
+        UPDATE import_jobs SET status = ?, resultado = ?, erro = ?, api_key = NULL, pdf = NULL, atualizado_em = ?
+        WHERE id = ?
+    ''', (status, json.dumps(final_event, ensure_ascii=False),
+          (final_event.get("detail") or final_event.get("msg")) if status == FALHOU else None, time.time(), job_id))
+
+
+def finish(job_id, final_event):
+    """Evento final + status na mesma transação (quem acompanha o stream nunca perde o fim)."""
+    status = CONCLUIDO if final_event.get("status") == "success" else FALHOU
+    with _connect() as conn:
+        _finish(conn, job_id, status, final_event)
+    _forget(job_id)
+    return status
+
+
+def release(job_ids):
+    """
+    Shutdown: jobs deste processo (já parados) e os pendentes com chave aqui viram "sem_chave"
+    na hora, em vez de esperar o lease. A chave morre com o processo.
+    """
+    with _keys_lock:
+        pendentes = list(_keys)
+    with _connect() as conn:
+        conn.executemany("UPDATE import_jobs SET tentativas = MAX(tentativas - 1, 0) WHERE id = ? AND status = ?",
+                         [(job_id, EXECUTANDO) for job_id in job_ids])
+        for job_id in job_ids:
+            _interrupt(conn, job_id, EXECUTANDO)
+        for job_id in pendentes:
+            _interrupt(conn, job_id, PENDENTE)
+
+
+def get(job_id):
+    """Status e progresso do job (sem PDF nem api_key)."""
+    with _connect() as conn:
+        row = conn.execute('''
+            SELECT id, nome_lista, modelo, status, tentativas, total_trechos, erro, resultado, criado_em, atualizado_em
+            FROM import_jobs WHERE id = ?
+        ''', (job_id,)).fetchone()
+        if row is None:
+            return None
+        trechos = dict(conn.execute("SELECT status, COUNT(*) FROM import_trechos WHERE job_id = ? GROUP BY status",
+                                    (job_id,)).fetchall())
+    job = dict(row)
+    job["resultado"] = json.loads(job["resultado"]) if job["resultado"] else None
+    job["trechos_ok"] = trechos.get("ok", 0)
+    job["trechos_erro"] = trechos.get("erro", 0)
+    return job
+
+
+class WorkerPool:
+    """
+    Threads que consomem import_jobs. `process(job)` executa (ou retoma) o job gravando
+    eventos e devolve o evento final; exceção vira evento de erro. job["parar"] é um
+    threading.Event: `process` deve checar entre trechos e sair cedo quando setado.
+    """
+
+    def __init__(self, process, workers=WORKERS, poll=POLL_SECONDS):
+        self.process = process
+        self.workers = workers
+        self.poll = poll
+        self.running = set()     # ids em execução neste processo
+        self.interrupted = []    # ids que pararam no meio por causa do stop()
+        self._cond = threading.Condition()
+        self._stop = False
+        self.stopping = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._loop, name=f"import-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """Sinaliza os workers, espera o trecho em andamento terminar e só então libera os jobs."""
+        self._stop = True
+        self.stopping.set()
+        self.wake()
+        deadline = time.monotonic() + timeout
+        for t in self._threads:
+            t.join(max(0.0, deadline - time.monotonic()))
+        # Thread que não parou a tempo: o job fica "executando" e o lease cuida dele
+        # quando o processo morrer (liberar agora = dois processos no mesmo job)
+        try:
+            release(self.interrupted)
+        except sqlite3.Error as e:
+            print(f"Erro liberando jobs no shutdown: {e}")
+
+    def _loop(self):
+        while not self._stop:
+            try:
+                job = claim()
+            except sqlite3.Error as e:
+                print(f"Erro lendo import_jobs: {e}")
+                job = None
+            if job is None:
+                with self._cond:
+                    if not self._stop:
+                        self._cond.wait(self.poll)
+                continue
+            self._run(job)
+
+    def _run(self, job):
+        self.running.add(job["id"])
+        job["parar"] = self.stopping
+        try:
+            final = self.process(job)
+        except Exception as e:
+            final = {"status": "error", "detail": str(e)}
+        finally:
+            self.running.discard(job["id"])
+        if self.stopping.is_set() and final.get("status") == "interrompido":
+            self.interrupted.append(job["id"])  # stop() libera depois que esta thread sair
+            return
+        try:
+            finish(job["id"], {**final, "job_id": job["id"]})
+        except sqlite3.Error as e:
+            print(f"Erro finalizando job {job['id']}: {e}")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def start_workers(process, workers=WORKERS):
+    """Sobe o pool uma vez por processo (startup ou primeira importação)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool(process, workers).start()
+    return _pool
+
+
+def stop_workers():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.stop()
+            _pool = None
@@ -3,8 +3,9 @@ import io
 import json
 import shutil
 from typing import List, Optional
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
 import pdfplumber
 import google.generativeai as genai
@@ -13,6 +14,12 @@ from unidecode import unidecode
 # Novos Módulos
 import db_manager
 import parser_core
+import catalog_snapshot
+import catalog_ingest
+import metrics
+import tracing
+import import_jobs
+import rate_limit
 
 # --- CONFIGURAÇÃO ---
 app = FastAPI(title="MedUBS Backend API v4.0 (Hybrid)")
@@ -24,47 +31,93 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Respostas JSON grandes (catálogo, SOAP) vão comprimidas para os clientes móveis
+app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=5)
+# Por último = mais externo: X-Request-ID + Server-Timing em toda resposta, log JSON por request
+app.add_middleware(tracing.TracingMiddleware)
 
 # Inicializa Banco
 @app.on_event("startup")
 def on_startup():
     db_manager.init_db()
+    # Carrega data/*.json no banco (pula listas cujo hash não mudou)
+    try:
+        print(f"Catálogo: {catalog_ingest.ingest_all()}")
+    except Exception as e:
+        print(f"Erro na ingestão do catálogo: {e}")
+    # Importações pendentes (ou interrompidas por um restart) voltam a rodar
+    import_jobs.start_workers(process_import_job)
+
+@app.on_event("shutdown")
+def on_shutdown():
+    # Para os jobs entre trechos; sem a chave (só em memória), ficam esperando o reenvio
+    import_jobs.stop_workers()
 
 # Diretório para salvar os TXTs processados (RAG)
 KNOWLEDGE_BASE_DIR = "knowledge_base"
 os.makedirs(KNOWLEDGE_BASE_DIR, exist_ok=True)
 
+# Lote de consultas (/consultar-ia/batch)
+BATCH_MAX_ITEMS = 100
+BATCH_CONCURRENCY = int(os.environ.get("MEDUBS_BATCH_CONCURRENCY", "4"))
+
 # --- MODELOS ---
 class ConsultaRequest(BaseModel):
     transcricao: str
     api_key: str
     model: Optional[str] = "gemini-1.5-flash"
 
+class ConsultaLoteRequest(BaseModel):
+    transcricoes: List[str]
+    api_key: str
+    model: Optional[str] = "gemini-1.5-flash"
+    concorrencia: Optional[int] = None
+
 class ConsultaResponse(BaseModel):
     soap: dict
     medicamentos: List[str]
     missoes: List[dict]
     paciente: dict
     keywords: List[str] # Novo
+    cids: List[str] = []
+    lme: Optional[dict] = None
     debug_rag: Optional[str] = None
 import time
+import threading
 from google.api_core import exceptions as google_exceptions
 
 # --- FUNÇÕES AUXILIARES ---
 
+# Endpoint alternativo do Gemini (ex.: benchmarks/mock_gemini.py para teste de carga)
+GEMINI_API_BASE = os.environ.get("GEMINI_API_BASE")
+
+def configure_genai(api_key):
+    """genai.configure; com GEMINI_API_BASE o SDK usa transporte REST apontado para esse endpoint."""
+    if GEMINI_API_BASE:
+        genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": GEMINI_API_BASE})
+    else:
+        genai.configure(api_key=api_key)
+
 def generate_with_retry(model, prompt, retries=3, response_mime_type="application/json"):
     """
     Wrapper para chamar model.generate_content com Retry Strategy (Backoff Exponencial).
-    Trata erros 429 (ResourceExhausted) aguardando antes de tentar de novo.
+    Trata erros 429 aguardando antes de tentar de novo (ResourceExhausted no gRPC,
+    TooManyRequests no transporte REST - o primeiro é subclasse do segundo).
     """
     base_delay = 5
     for attempt in range(retries):
+        if attempt:
+            metrics.LLM_RETRIES.inc()
         try:
-            return model.generate_content(prompt, generation_config={"response_mime_type": response_mime_type})
-        except google_exceptions.ResourceExhausted as e:
+            with metrics.stage("llm_call"):
+                return model.generate_content(prompt, generation_config={"response_mime_type": response_mime_type})
+        except google_exceptions.TooManyRequests as e:
+            metrics.LLM_429.inc()
             wait_time = base_delay * (2 ** attempt) # 5s, 10s, 20s...
             print(f"⚠️ Quota Exceeded (429). Retrying in {wait_time}s... (Attempt {attempt+1}/{retries})")
-            time.sleep(wait_time)
+            tracing.log_event("llm_429", attempt=attempt + 1, wait_s=wait_time)
+            with metrics.stage("llm_backoff"):
+                time.sleep(wait_time)
         except Exception as e:
             # Outros erros (400, 500, etc) não adianta tentar de novo imediatamente
             print(f"❌ Erro API Gemini: {e}")
@@ -76,7 +129,7 @@ def extract_text_from_bytes(file_bytes: bytes) -> str:
     """Extrai texto de PDF direto da memória RAM."""
     text = ""
     try:
-        with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
+        with metrics.stage("pdf_parse"), pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
             for page in pdf.pages:
                 extracted = page.extract_text(layout=True)
                 if extracted:
@@ -88,15 +141,20 @@ def extract_text_from_bytes(file_bytes: bytes) -> str:
 
 def simple_rag_search(query: str, kb_dir: str) -> str:
     """Busca contexto nos arquivos TXT salvos."""
-    if not os.path.exists(kb_dir) or not os.listdir(kb_dir):
-        return ""
+    with metrics.stage("rag_search"):
+        return _rag_search_batch([query], kb_dir)[0]
+
+def rag_search_batch(queries: List[str], kb_dir: str) -> List[str]:
+    """simple_rag_search de várias transcrições numa passada só pela base (cada arquivo lido uma vez)."""
+    with metrics.stage("rag_search"):
+        return _rag_search_batch(queries, kb_dir)
 
-    best_match_content = ""
-    max_score = 0
-    best_file = ""
+def _rag_search_batch(queries, kb_dir):
+    if not os.path.exists(kb_dir) or not os.listdir(kb_dir):
+        return ["" for _ in queries]
 
-    query_norm = unidecode(query.lower())
-    keywords = [w for w in query_norm.split() if len(w) > 4]
+    keywords = [[w for w in unidecode(q.lower()).split() if len(w) > 4] for q in queries]
+    best = [(0, "", "") for _ in queries]   # (score, arquivo, conteúdo) por consulta
 
     for filename in os.listdir(kb_dir):
         if filename.endswith(".txt"):
@@ -104,182 +162,333 @@ def simple_rag_search(query: str, kb_dir: str) -> str:
             try:
                 with open(path, 'r', encoding='utf-8') as f:
                     content = f.read()
-                    content_norm = unidecode(content.lower())
-                    score = sum(content_norm.count(k) for k in keywords)
-                    
-                    if score > max_score:
-                        max_score = score
-                        best_match_content = content
-                        best_file = filename
             except Exception:
                 continue
-    
-    if max_score > 0:
-        return f"--- INÍCIO PROTOCOLO ({best_file}) ---\n{best_match_content[:5000]}\n--- FIM PROTOCOLO ---"
-    return ""
+            content_norm = unidecode(content.lower())
+            counts = {}   # palavra -> ocorrências neste arquivo (compartilhado entre as consultas)
+            for i, words in enumerate(keywords):
+                score = 0
+                for k in words:
+                    if k not in counts:
+                        counts[k] = content_norm.count(k)
+                    score += counts[k]
+                if score > best[i][0]:
+                    best[i] = (score, filename, content)
+
+    return [f"--- INÍCIO PROTOCOLO ({name}) ---\n{content[:5000]}\n--- FIM PROTOCOLO ---" if score > 0 else ""
+            for score, name, content in best]
 
 # --- ENDPOINTS ---
 
+@app.get("/metrics")
+def get_metrics():
+    """Histogramas por etapa e contadores (429, cache, chunks) no formato texto do Prometheus."""
+    from fastapi.responses import PlainTextResponse
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 def read_root():
     return {"status": "online", "version": "4.1 Retry-Enabled", "rag_files": len(os.listdir(KNOWLEDGE_BASE_DIR))}
 
-@app.post("/upload-medicamento")
-async def upload_medicamento(
-    file: UploadFile = File(...), 
-    nome_lista: str = Form(...),
-    api_key: str = Form(...),
-    model: str = Form(...),
-    force_ai: str = Form("false")
+@app.get("/medicamentos/changes")
+def medicamentos_changes(
+    request: Request,
+    response: Response,
+    since: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=5000)
 ):
-    from fastapi.responses import StreamingResponse
-    import json
-    import time
-    import asyncio
+    """
+    Delta Sync para clientes offline: devolve só as linhas com versão > since.
+    O cliente reenvia o ETag em If-None-Match e recebe 304 se nada mudou.
+    Saída de lista chega como flag zerada; "removido": true = não está em lista nenhuma.
+    """
+    current, items = db_manager.get_changes_since(since, limit)
+    etag = f'"med-{since}-{limit}-{current}"'
 
-    async def process_stream():
-        try:
-            content = await file.read()
-            yield json.dumps({"status": "progress", "msg": "Arquivo recebido. Analisando estrutura..."}) + "\n"
-            
-            # 0. Instancia Parser
-            parser = parser_core.HeuristicParser()
-            
-            # 1. Extração Otimizada (Python)
-            opt_text = parser.extract_optimized_context(content)
-            
-            # 2. Validação: É imagem?
-            if len(opt_text) < 100 and force_ai.lower() != "true":
-                yield json.dumps({
-                    "status": "heuristic_failed",
-                    "debug": {"msg": "Pouco texto encontrado (vazio ou imagem). Requer OCR/Vision."}
-                }) + "\n"
-                return
+    hit = request.headers.get("if-none-match") == etag
+    metrics.cache_result("changes_etag", hit)
+    if hit:
+        return Response(status_code=304, headers={"ETag": etag})
 
-            # 3. Preparação IA
-            if not opt_text and force_ai.lower() == "true":
-                 try:
-                    opt_text = extract_text_from_bytes(content)
-                 except: 
-                    pass
-                 if not opt_text: 
-                     yield json.dumps({"status": "error", "msg": "PDF totalmente ilegível."}) + "\n"
-                     return
-
-            genai.configure(api_key=api_key)
-            model_name = model if model else "gemini-1.5-flash"
-            ai_model = genai.GenerativeModel(model_name)
-            
-            aggregated_meds = []
-            
-            # 4. Lógica Dinâmica
-            SAFE_LIMIT = 30000 
-            
-            if len(opt_text) <= SAFE_LIMIT:
-                # --- SINGLE SHOT ---
-                yield json.dumps({"status": "progress", "msg": "Envio único (Texto curto). Processando com IA..."}) + "\n"
-                
-                prompt = f"""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return {
+        "since": since,
+        "versao_atual": current,
+        # Próximo `since` a pedir (última versão entregue nesta página)
+        "proximo_since": items[-1]["versao"] if items else since,
+        "has_more": bool(items) and items[-1]["versao"] < current,
+        "items": items
+    }
+
+@app.get("/catalogo/snapshot")
+def catalogo_snapshot(request: Request):
+    """
+    Catálogo completo (REMUME/RENAME/Alto Custo) como SQLite indexado + gzip.
+    O ETag é o hash das listas de origem: cliente atualizado recebe 304.
+    """
+    from fastapi.responses import FileResponse
+
+    gz_path, source_hash = catalog_snapshot.get_or_build_snapshot()
+    etag = f'"{source_hash[:32]}"'
+    hit = request.headers.get("if-none-match") == etag
+    metrics.cache_result("snapshot_etag", hit)
+    if hit:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    return FileResponse(
+        gz_path,
+        media_type="application/gzip",
+        filename="catalogo.sqlite.gz",
+        headers={"ETag": etag, "Cache-Control": "no-cache"}
+    )
+
+@app.get("/catalogo/buscar")
+def catalogo_buscar(
+    nome: str = Query(..., min_length=2),
+    lista: Optional[str] = Query(None, pattern="^(remume|rename|alto_custo)$"),
+    limit: int = Query(20, ge=1, le=200)
+):
+    """Consulta o catálogo oficial já normalizado (exato primeiro, depois prefixo)."""
+    return {"items": catalog_ingest.buscar(nome, lista, limit)}
+
+@app.get("/catalogo/cid/{cid}")
+def catalogo_por_cid(
+    cid: str,
+    prefixo: bool = Query(False),
+    limit: int = Query(100, ge=1, le=500)
+):
+    """Medicamentos do Alto Custo autorizados (LME) para um CID ou prefixo de CID."""
+    return {"cid": parser_core.normalize_cid(cid), "items": catalog_ingest.alto_custo_por_cid(cid, prefixo, limit)}
+
+# --- IMPORTAÇÃO DE LISTAS (job durável, ver import_jobs.py) ---
+
+IMPORT_SAFE_LIMIT = 30000    # até aqui vai num envio só
+IMPORT_CHUNK_SIZE = 25000
+IMPORT_MAX_CHUNKS = 6
+IMPORT_CHUNK_WAIT = 25       # s entre trechos (rate limit do Gemini)
+
+def import_prompts(opt_text: str, nome_lista: str) -> List[str]:
+    """Prompts da importação. Determinísticos: na retomada são remontados a partir do texto salvo."""
+    if len(opt_text) <= IMPORT_SAFE_LIMIT:
+        return [f"""
                 Analise o contexto abaixo (Tabelas e Texto extraídos de "{nome_lista}").
                 Identifique todos os medicamentos.
                 Retorne JSON ARRAY puro: [{{ "nome": "MEDICAMENTO", "concentracao": "500MG", "forma": "CP", "lista_origem": "{nome_lista}", "data_importacao": "hoje" }}]
                 
                 CONTEXTO OTIMIZADO:
                 {opt_text}
-                """
-                try:
-                    response = generate_with_retry(ai_model, prompt)
-                    parsed = json.loads(response.text)
-                    if isinstance(parsed, list): aggregated_meds = parsed
-                    elif isinstance(parsed, dict): aggregated_meds = parsed.get('medicamentos', [])
-                    yield json.dumps({"status": "progress", "msg": "IA processou e enviou dados."}) + "\n"
-                except Exception as e:
-                    yield json.dumps({"status": "log", "msg": f"Erro Single Shot: {e}"}) + "\n"
-                    
-            else:
-                # --- CHUNKING ---
-                chunk_size = 25000 
-                total_chunks = (len(opt_text) // chunk_size) + 1
-                max_chunks = 6 
-                if total_chunks > max_chunks: total_chunks = max_chunks
-                
-                yield json.dumps({"status": "start_chunks", "total": total_chunks, "msg": f"Iniciando processamento em {total_chunks} partes."}) + "\n"
-                
-                for i in range(total_chunks):
-                    # Progress Update
-                    yield json.dumps({
-                        "status": "progress", 
-                        "current": i + 1, 
-                        "total": total_chunks,
-                        "msg": f"Dando upload no render, render mandou pra IA {i+1}/{total_chunks}"
-                    }) + "\n"
-
-                    start = i * chunk_size
-                    end = start + chunk_size
-                    chunk = opt_text[start:end]
-                    
-                    prompt = f"""
+                """]
+    total_chunks = min((len(opt_text) // IMPORT_CHUNK_SIZE) + 1, IMPORT_MAX_CHUNKS)
+    return [f"""
                     Analise este trecho ({i+1}/{total_chunks}) de "{nome_lista}".
                     Extraia medicamentos. Retorne JSON ARRAY puro.
                     
                     TRECHO:
-                    {chunk}
-                    """
-                    try:
-                        response = generate_with_retry(ai_model, prompt)
-                        parsed = json.loads(response.text)
-                        batch = []
-                        if isinstance(parsed, list): batch = parsed
-                        elif isinstance(parsed, dict): batch = parsed.get('medicamentos', [])
-                        aggregated_meds.extend(batch)
-                        
-                        yield json.dumps({
-                            "status": "progress", 
-                            "msg": f"IA processou {i+1} e enviou {i+1}."
-                        }) + "\n"
-                        
-                        # DELAY DE 25 SEGUNDOS
-                        if i < total_chunks - 1:
-                            yield json.dumps({"status": "waiting", "seconds": 25, "msg": "Aguardando 25s para rate limit..."}) + "\n"
-                            await asyncio.sleep(25) 
-                        
-                    except Exception as e:
-                       yield json.dumps({"status": "log", "msg": f"Erro no chunk {i}: {str(e)}"}) + "\n"
-                       continue
-
-            # 5. Salva no Banco e Retorna
-            if aggregated_meds:
-                for item in aggregated_meds:
-                    nome = item.get('nome', 'DESCONHECIDO')
-                    conc = item.get('concentracao', '')
-                    forma = item.get('forma', '')
-                    db_manager.upsert_medicamento(nome, conc, forma, nome_lista, nome_lista)
-
-                final_response = {
-                    "status": "success",
-                    "method": "ai_optimized_retry_stream",
-                    "data": aggregated_meds,
-                    "debug": {
-                        "text_len": len(opt_text),
-                        "mode": "Stream"
-                    }
-                }
-                yield json.dumps(final_response) + "\n"
-            else:
-                yield json.dumps({
-                    "status": "success", 
-                    "data": [],
-                    "debug": {
-                        "msg": "AI não encontrou itens.",
-                        "extracted_text_preview": opt_text[:2000] if opt_text else "Nenhum texto extraído" 
-                    }
-                }) + "\n"
+                    {opt_text[i * IMPORT_CHUNK_SIZE:(i + 1) * IMPORT_CHUNK_SIZE]}
+                    """ for i in range(total_chunks)]
+
+def parse_meds_response(text: str) -> list:
+    with metrics.stage("json_parse"):
+        parsed = json.loads(text)
+    if isinstance(parsed, list): return parsed
+    if isinstance(parsed, dict): return parsed.get('medicamentos', [])
+    return []
 
+def process_import_job(job: dict) -> dict:
+    """
+    Executa (ou retoma) uma importação no pool de import_jobs. Cada passo vira evento
+    do job; cada trecho processado pela IA é salvo antes de seguir para o próximo.
+    Retorna o evento final.
+    """
+    with tracing.background(job.get("request_id")):
+        final = _run_import(job)
+        tracing.log_event("import_job", job_id=job["id"], status=final.get("status"), tentativa=job["tentativas"],
+                          timings_ms=tracing.current().timings_ms())
+        return {**final, **tracing.summary()}
+
+def _run_import(job):
+    job_id, nome_lista = job["id"], job["nome_lista"]
+    emit = lambda event: import_jobs.add_event(job_id, event)
+    parar = job.get("parar") or threading.Event()   # shutdown do pool: sai entre trechos
+    opt_text = job["texto"]
+
+    if opt_text is None:
+        emit({"status": "progress", "msg": "Arquivo recebido. Analisando estrutura..."})
+        content = job["pdf"]
+        # 1. Extração Otimizada (Python)
+        opt_text = parser_core.HeuristicParser().extract_optimized_context(content)
+
+        # 2. Validação: É imagem?
+        if len(opt_text) < 100 and not job["force_ai"]:
+            return {"status": "heuristic_failed",
+                    "debug": {"msg": "Pouco texto encontrado (vazio ou imagem). Requer OCR/Vision."}}
+
+        # 3. Fallback de extração (force_ai)
+        if not opt_text:
+            opt_text = extract_text_from_bytes(content)
+            if not opt_text:
+                return {"status": "error", "msg": "PDF totalmente ilegível."}
+        prompts = import_prompts(opt_text, nome_lista)
+        import_jobs.save_text(job_id, opt_text, len(prompts))
+        done = {}
+    else:
+        prompts = import_prompts(opt_text, nome_lista)
+        done = import_jobs.done_chunks(job_id)
+        emit({"status": "progress", "msg": f"Retomando importação: {len(done)} de {len(prompts)} partes já processadas."})
+
+    configure_genai(job["api_key"])
+    ai_model = genai.GenerativeModel(job["modelo"] or "gemini-1.5-flash")
+
+    # 4. Envio à IA (um trecho por vez, checkpoint a cada trecho)
+    total_chunks = len(prompts)
+    single = total_chunks == 1 and len(opt_text) <= IMPORT_SAFE_LIMIT
+    if single:
+        emit({"status": "progress", "msg": "Envio único (Texto curto). Processando com IA..."})
+    else:
+        emit({"status": "start_chunks", "total": total_chunks, "msg": f"Iniciando processamento em {total_chunks} partes."})
+
+    pending = [i for i in range(total_chunks) if i not in done]
+    for n, i in enumerate(pending):
+        if parar.is_set():
+            return {"status": "interrompido"}
+        if not single:
+            emit({"status": "progress", "current": i + 1, "total": total_chunks,
+                  "msg": f"Dando upload no render, render mandou pra IA {i+1}/{total_chunks}"})
+        try:
+            batch = parse_meds_response(generate_with_retry(ai_model, prompts[i]).text)
+            import_jobs.save_chunk(job_id, i, batch)
+            done[i] = batch
+            if not single:
+                metrics.UPLOAD_CHUNKS.inc(result="ok")
+            emit({"status": "progress", "msg": "IA processou e enviou dados." if single else f"IA processou {i+1} e enviou {i+1}."})
         except Exception as e:
-            yield json.dumps({"status": "error", "detail": str(e)}) + "\n"
+            import_jobs.save_chunk(job_id, i, erro=str(e))
+            if not single:
+                metrics.UPLOAD_CHUNKS.inc(result="error")
+            emit({"status": "log", "msg": f"Erro Single Shot: {e}" if single else f"Erro no chunk {i}: {str(e)}"})
+            continue
+
+        if n < len(pending) - 1:
+            emit({"status": "waiting", "seconds": IMPORT_CHUNK_WAIT, "msg": f"Aguardando {IMPORT_CHUNK_WAIT}s para rate limit..."})
+            with metrics.stage("rate_limit_wait"):
+                parar.wait(IMPORT_CHUNK_WAIT)
+
+    # 5. Salva no Banco (upsert idempotente: retomar no meio daqui não duplica nada)
+    aggregated_meds = [item for i in sorted(done) for item in done[i]]
+    if not aggregated_meds:
+        return {
+            "status": "success",
+            "data": [],
+            "debug": {
+                "msg": "AI não encontrou itens.",
+                "extracted_text_preview": opt_text[:2000] if opt_text else "Nenhum texto extraído"
+            }
+        }
+    with metrics.stage("db_upsert_batch"):
+        for item in aggregated_meds:
+            nome = item.get('nome', 'DESCONHECIDO')
+            conc = item.get('concentracao', '')
+            forma = item.get('forma', '')
+            db_manager.upsert_medicamento(nome, conc, forma, nome_lista, nome_lista)
+    return {
+        "status": "success",
+        "method": "ai_optimized_retry_stream",
+        "data": aggregated_meds,
+        "debug": {
+            "text_len": len(opt_text),
+            "mode": "Job",
+            "trechos": total_chunks,
+            "trechos_com_erro": total_chunks - len(done)
+        }
+    }
+
+async def _create_import_job(file, nome_lista, api_key, model, force_ai) -> str:
+    import_jobs.start_workers(process_import_job)
+    trace = tracing.current()
+    return import_jobs.create(await file.read(), nome_lista, api_key, model,
+                              force_ai.lower() == "true", trace.request_id if trace else None)
+
+async def follow_job_events(job_id: str, after: int = 0):
+    """NDJSON dos eventos do job a partir de `after`, até o evento final."""
+    import asyncio
+    from starlette.concurrency import run_in_threadpool
+    while True:
+        # sqlite síncrono: fora do event loop para não travar os outros streams
+        job = await run_in_threadpool(import_jobs.get, job_id)
+        batch = await run_in_threadpool(import_jobs.events, job_id, after)
+        for seq, event in batch:
+            after = seq
+            yield json.dumps({**event, "seq": seq}) + "\n"
+        if not batch:
+            if job is None or job["status"] in import_jobs.TERMINAIS:
+                return
+            await asyncio.sleep(0.5)
+
+@app.post("/upload-medicamento")
+async def upload_medicamento(
+    file: UploadFile = File(...), 
+    nome_lista: str = Form(...),
+    api_key: str = Form(...),
+    model: str = Form(...),
+    force_ai: str = Form("false")
+):
+    """
+    Compatível com o stream antigo: cria o job e acompanha os eventos dele. Se a conexão
+    cair, a importação continua; o cliente reconecta em /jobs/{job_id}/eventos?after=seq.
+    """
+    from fastapi.responses import StreamingResponse
+
+    job_id = await _create_import_job(file, nome_lista, api_key, model, force_ai)
+
+    async def process_stream():
+        yield json.dumps({"status": "progress", "job_id": job_id, "msg": "Importação registrada."}) + "\n"
+        async for line in follow_job_events(job_id):
+            yield line
 
     return StreamingResponse(process_stream(), media_type="application/x-ndjson")
 
+@app.post("/jobs/upload-medicamento", status_code=202)
+async def criar_job_importacao(
+    file: UploadFile = File(...),
+    nome_lista: str = Form(...),
+    api_key: str = Form(...),
+    model: str = Form(...),
+    force_ai: str = Form("false")
+):
+    """Enfileira a importação e responde na hora com o ID do job."""
+    job_id = await _create_import_job(file, nome_lista, api_key, model, force_ai)
+    return {"job_id": job_id, "status": import_jobs.PENDENTE,
+            "status_url": f"/jobs/{job_id}", "eventos_url": f"/jobs/{job_id}/eventos"}
+
+@app.get("/jobs/{job_id}")
+def status_job(job_id: str, tail: int = Query(20, ge=0, le=500)):
+    """Status, progresso por trecho e os últimos eventos do job."""
+    job = import_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado.")
+    job["eventos"] = [{**event, "seq": seq} for seq, event in import_jobs.tail(job_id, tail)]
+    return job
+
+@app.get("/jobs/{job_id}/eventos")
+def eventos_job(job_id: str, after: int = Query(0, ge=0)):
+    """Stream NDJSON dos eventos depois de `after` (reconexão), até o fim do job."""
+    from fastapi.responses import StreamingResponse
+    if import_jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado.")
+    return StreamingResponse(follow_job_events(job_id, after), media_type="application/x-ndjson")
+
+@app.post("/jobs/{job_id}/chave", status_code=202)
+def reenviar_chave(job_id: str, api_key: str = Form(...)):
+    """Job interrompido por restart ("sem_chave"): a chave não fica salva, o cliente reenvia e ele retoma."""
+    job = import_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado.")
+    if not import_jobs.resend_key(job_id, api_key):
+        raise HTTPException(status_code=409, detail=f"Job está '{job['status']}', não esperando chave.")
+    import_jobs.start_workers(process_import_job)
+    return {"job_id": job_id, "status": import_jobs.PENDENTE, "eventos_url": f"/jobs/{job_id}/eventos"}
+
 @app.post("/upload-diretriz")
 async def upload_diretriz(
     file: UploadFile = File(...),
@@ -304,31 +513,21 @@ async def upload_diretriz(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/consultar-ia")
-async def consultar_ia(req: ConsultaRequest):
-    """Cérebro da aplicação: RAG + SOAP + Missões + Keywords."""
-    try:
-        # 1. RAG
-        rag_context = simple_rag_search(req.transcricao, KNOWLEDGE_BASE_DIR)
-        
-        # 2. Gemini
-        genai.configure(api_key=req.api_key)
-        model_name = req.model if req.model else "gemini-1.5-flash"
-        model = genai.GenerativeModel(model_name)
-        
-        prompt = f"""
+def consulta_prompt(transcricao: str, rag_context: str) -> str:
+    return f"""
         Atue como Médico Auditor e Preceptor de Residência.
         Analise a transcrição.
         
         {rag_context if rag_context else "Nenhum protocolo específico encontrado na base local. Use conhecimento padrão do Ministério da Saúde."}
         
         TRANSCRIÇÃO:
-        "{req.transcricao}"
+        "{transcricao}"
         
         Gere JSON estrito:
         {{
             "soap": {{ "s": "Resumo Subjetivo", "o": "Objetivo", "a": "Avaliação/Diagnóstico", "p": "Plano/Conduta" }},
             "paciente": {{ "sexo": "Masculino/Feminino", "idade": 0 }},
+            "cids": ["CID-10 do diagnóstico, ex: M05.0"],
             "medicamentos": ["Nome Genérico 1", "Nome Genérico 2"],
             "keywords": ["Termo Clinico 1", "Termo Clinico 2"],
             "missoes": [
@@ -336,34 +535,120 @@ async def consultar_ia(req: ConsultaRequest):
             ]
         }}
         """
-        
-        # USA RETRY AQUI TAMBÉM
-        response = generate_with_retry(model, prompt)
+
+def analisar_consulta(model, transcricao: str, rag_context: str) -> dict:
+    """Gemini (com retry) + LME para uma transcrição cujo RAG já foi buscado."""
+    # USA RETRY AQUI TAMBÉM
+    response = generate_with_retry(model, consulta_prompt(transcricao, rag_context))
+    with metrics.stage("json_parse"):
         res_json = json.loads(response.text)
+
+    # Elegibilidade LME pelo índice CID -> Alto Custo (sem outra chamada ao LLM)
+    try:
+        lme = catalog_ingest.checar_lme(res_json.get("cids", []), res_json.get("medicamentos", []))
+    except Exception as e:
+        print(f"Erro checando LME: {e}")
+        lme = None
+
+    return {
+        "soap": res_json.get("soap", {}),
+        "paciente": res_json.get("paciente", {}),
+        "cids": res_json.get("cids", []),
+        "lme": lme,
+        "medicamentos": res_json.get("medicamentos", []),
+        "keywords": res_json.get("keywords", []), 
+        "missoes": res_json.get("missoes", []),
+        "debug_rag": "Contexto usado: " + ("SIM" if rag_context else "NÃO")
+    }
+
+def erro_consulta(e: Exception) -> dict:
+    """Erro legível no card em vez do JSON de crash. `retryable`: cota (429), vale tentar depois."""
+    err_msg = str(e)
+    retryable = isinstance(e, google_exceptions.TooManyRequests) or "Quota" in err_msg or "429" in err_msg
+    if retryable:
+         err_msg = "⚠️ Limite de cota atingido (Erro 429). Aguarde alguns instantes e tente novamente."
+         
+    return {
+        "soap": {"s": "Erro ao processar", "o": "", "a": err_msg, "p": ""}, 
+        "medicamentos": [], 
+        "missoes": [],
+        "keywords": [],
+        "paciente": {},
+        "debug_rag": "ERRO",
+        "retryable": retryable
+    }
+
+@app.post("/consultar-ia")
+async def consultar_ia(req: ConsultaRequest):
+    """Cérebro da aplicação: RAG + SOAP + Missões + Keywords."""
+    try:
+        # 1. RAG
+        rag_context = simple_rag_search(req.transcricao, KNOWLEDGE_BASE_DIR)
         
-        return {
-            "soap": res_json.get("soap", {}),
-            "paciente": res_json.get("paciente", {}),
-            "medicamentos": res_json.get("medicamentos", []),
-            "keywords": res_json.get("keywords", []), 
-            "missoes": res_json.get("missoes", []),
-            "debug_rag": "Contexto usado: " + ("SIM" if rag_context else "NÃO")
-        }
+        # 2. Gemini
+        configure_genai(req.api_key)
+        model_name = req.model if req.model else "gemini-1.5-flash"
+        return analisar_consulta(genai.GenerativeModel(model_name), req.transcricao, rag_context)
 
     except Exception as e:
-        # Retorna erro legível no card em vez do JSON de crash
-        err_msg = str(e)
-        if "Quota" in err_msg or "429" in err_msg:
-             err_msg = "⚠️ Limite de cota atingido (Erro 429). Aguarde alguns instantes e tente novamente."
-             
-        return {
-            "soap": {"s": "Erro ao processar", "o": "", "a": err_msg, "p": ""}, 
-            "medicamentos": [], 
-            "missoes": [],
-            "keywords": [],
-            "paciente": {},
-            "debug_rag": "ERRO"
-        }
+        return erro_consulta(e)
+
+@app.post("/consultar-ia/batch")
+async def consultar_ia_batch(req: ConsultaLoteRequest):
+    """
+    Várias transcrições (ex.: as consultas do dia na unidade-escola) numa request:
+    RAG de todas numa passada pela base, chamadas ao Gemini em paralelo sob o limite
+    de RPM da API key, e cada resultado sai no NDJSON assim que fica pronto.
+    Linhas: {"status": "start"}, uma {"index", "status": "ok"|"error", ...} por item
+    (fora de ordem) e {"status": "done"} no fim.
+    """
+    import asyncio
+    from fastapi.responses import StreamingResponse
+    from starlette.concurrency import run_in_threadpool
+
+    if not req.transcricoes:
+        raise HTTPException(status_code=400, detail="Nenhuma transcrição enviada.")
+    if len(req.transcricoes) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Máximo de {BATCH_MAX_ITEMS} transcrições por lote.")
+
+    concorrencia = max(1, min(req.concorrencia or BATCH_CONCURRENCY, BATCH_CONCURRENCY))
+    bucket = rate_limit.for_key(req.api_key)
+
+    async def process_stream():
+        total = len(req.transcricoes)
+        yield json.dumps({"status": "start", "total": total, "concorrencia": concorrencia}) + "\n"
+
+        contexts = await run_in_threadpool(rag_search_batch, req.transcricoes, KNOWLEDGE_BASE_DIR)
+        configure_genai(req.api_key)
+        model = genai.GenerativeModel(req.model or "gemini-1.5-flash")
+        sem = asyncio.Semaphore(concorrencia)
+
+        async def run_item(i):
+            async with sem:
+                wait = bucket.reserve()
+                if wait:
+                    with metrics.stage("rate_limit_wait"):
+                        await asyncio.sleep(wait)
+                try:
+                    result = await run_in_threadpool(analisar_consulta, model, req.transcricoes[i], contexts[i])
+                    return {"index": i, "status": "ok", **result}
+                except Exception as e:
+                    # Erro fica no item: o resto do lote segue
+                    return {"index": i, "status": "error", "erro": str(e), **erro_consulta(e)}
+
+        tasks = [asyncio.ensure_future(run_item(i)) for i in range(total)]
+        erros = 0
+        try:
+            for fut in asyncio.as_completed(tasks):
+                item = await fut
+                erros += item["status"] == "error"
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+        finally:
+            for t in tasks:   # cliente desconectou: não dispara o que ainda está na fila
+                t.cancel()
+        yield json.dumps({"status": "done", "total": total, "ok": total - erros, "erros": erros, **tracing.summary()}) + "\n"
+
+    return StreamingResponse(process_stream(), media_type="application/x-ndjson")
 
 if __name__ == "__main__":
     import uvicorn
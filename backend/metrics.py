@@ -0,0 +1,146 @@
+import time
+import bisect
+import functools
+import threading
+from contextlib import contextmanager
+
+import tracing
+
+# Métricas do backend no formato texto do Prometheus (GET /metrics), sem dependência
+# externa. Cada observação é um bisect + soma sob um lock por métrica (microssegundos),
+# então fica ligado em produção.
+#
+#   medubs_stage_seconds{stage=...}    histograma por etapa (pdf_parse, table_extract,
+#                                      rag_search, llm_call, llm_backoff, json_parse,
+#                                      db_upsert_batch, db_query, rate_limit_wait)
+#   medubs_llm_429_total               respostas 429 (cota) do Gemini
+#   medubs_llm_retries_total           novas tentativas do generate_with_retry
+#   medubs_upload_chunks_total{result} trechos do upload enviados à IA
+#   medubs_cache_total{cache,result}   hit/miss dos caches (ETag, snapshot)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_registry = []
+
+
+def _labels_text(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(n, "") for n in self.labelnames), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_labels_text(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}   # labels -> [contagem por bucket (não cumulativa), soma, total]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][idx] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        state = self._values.get(tuple(labels.get(n, "") for n in self.labelnames))
+        return state[2] if state else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        for key, (counts, total_sum, total) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels_text(self.labelnames, key, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels_text(self.labelnames, key)} {total_sum}")
+            lines.append(f"{self.name}_count{_labels_text(self.labelnames, key)} {total}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("medubs_stage_seconds", "Duração de cada etapa do backend.", ["stage"])
+LLM_429 = Counter("medubs_llm_429_total", "Respostas 429 (cota excedida) do Gemini.")
+LLM_RETRIES = Counter("medubs_llm_retries_total", "Novas tentativas de chamada ao Gemini.")
+UPLOAD_CHUNKS = Counter("medubs_upload_chunks_total", "Trechos de PDF enviados à IA no upload.", ["result"])
+CACHE = Counter("medubs_cache_total", "Consultas aos caches do backend.", ["cache", "result"])
+
+
+@contextmanager
+def stage(name):
+    """
+    with metrics.stage("rag_search"): ... -> observa a duração no histograma da etapa
+    e soma no Server-Timing da request atual (tracing).
+    """
+    with STAGE_SECONDS.time(stage=name), tracing.span(name):
+        yield
+
+
+def timed(name):
+    """Decorator: a função inteira conta como a etapa `name` (assinatura intacta)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def cache_result(cache, hit):
+    CACHE.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -1,12 +1,82 @@
+import os
+import sys
 import pdfplumber
 import re
 from unidecode import unidecode
 import io
 import logging
+import time
+
+import metrics
+
+# Dose/ATC: mesma gramática do app (src/med_parser.py), sem cópia da regex
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+if SRC_DIR not in sys.path:
+    sys.path.append(SRC_DIR)
+import med_parser
 
 # Suppress noisy PDF warnings matches
 logging.getLogger("pdfminer").setLevel(logging.ERROR)
 
+# --- NORMALIZAÇÃO DAS LISTAS (REMUME / RENAME) ---
+# Concentração: "500mg", "0,2mg/ml", "100.000 UI/mL", "2%", "600mg + Vitamina D 400UI"
+_STRENGTH = med_parser.STRENGTH_PATTERN
+STRENGTH_RE = re.compile(rf'{_STRENGTH}(?:\s*\+\s*(?:[a-zà-ú .]+?\s*)?{_STRENGTH})*', re.IGNORECASE)
+ATC_RE = med_parser.ATC_RE
+COMPONENTE_RE = re.compile(r'\b(Básico|Especializado|Estratégico|Hospitalar)\b')
+
+def split_remume_nome(nome_completo: str) -> dict:
+    """
+    "Dipirona sódica 500mg/ml gotas 10 ml frasco" ->
+    {"nome": "Dipirona sódica", "concentracao": "500mg/ml", "forma": "gotas 10 ml frasco"}
+    """
+    text = " ".join(str(nome_completo).split())
+    m = STRENGTH_RE.search(text)
+    if not m:
+        return {"nome": text, "concentracao": "", "forma": ""}
+    return {
+        "nome": text[:m.start()].strip(" ,"),
+        "concentracao": m.group(0).strip(),
+        "forma": text[m.end():].strip(" ,)")
+    }
+
+def split_rename_detalhes(detalhes: str) -> dict:
+    """
+    "150 mg comprimido Especializado A05AA02" ->
+    {"concentracao": "150 mg", "forma": "comprimido", "componente": "Especializado", "atc": "A05AA02"}
+    """
+    text = " ".join(str(detalhes or "").split())
+    atc_m = ATC_RE.search(text)
+    comp_m = COMPONENTE_RE.search(text)
+    atc = atc_m.group(1) if atc_m else ""
+    componente = comp_m.group(1) if comp_m else ""
+    text = ATC_RE.sub("", COMPONENTE_RE.sub("", text)).strip()
+
+    m = STRENGTH_RE.match(text)
+    concentracao = m.group(0).strip() if m else ""
+    forma = text[m.end():].strip() if m else text
+    return {"concentracao": concentracao, "forma": forma, "componente": componente, "atc": atc}
+
+# CID-10 no campo cids_autorizados do Alto Custo: "M050 - Síndrome de Felty M053 - ..."
+CID_RE = re.compile(r'\b([A-Z]\d{2}\.?\d?)\s+-\s+')
+
+def normalize_cid(code: str) -> str:
+    """"m05.0 " -> "M050" (formato usado no LME, sem ponto)."""
+    return re.sub(r'[^A-Z0-9]', '', str(code or "").upper())
+
+def split_cids(texto: str) -> list:
+    """
+    "M050 - Síndrome de Felty M053 - Artrite ..." ->
+    [("M050", "Síndrome de Felty"), ("M053", "Artrite ...")]
+    """
+    text = " ".join(str(texto or "").split())
+    matches = list(CID_RE.finditer(text))
+    cids = []
+    for i, m in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        cids.append((normalize_cid(m.group(1)), text[m.end():end].strip()))
+    return cids
+
 class HeuristicParser:
     def __init__(self):
         pass
@@ -20,13 +90,16 @@ class HeuristicParser:
         Returns a single optimized string payload.
         """
         full_context = []
+        table_seconds = 0.0
         
         try:
-            with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
+            with metrics.stage("pdf_parse"), pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
                 for i, page in enumerate(pdf.pages):
                     # 1. Table Extraction (High Fidelity)
                     # Use lighter settings to speed up
+                    t0 = time.perf_counter()
                     tables = page.extract_tables()
+                    table_seconds += time.perf_counter() - t0
                     if tables:
                         for table in tables:
                             # Filter empty rows/cols and format as CSV
@@ -58,6 +131,9 @@ class HeuristicParser:
         except Exception as e:
             print(f"Erro no parser otimizado: {e}")
             return ""
+        finally:
+            # Tabelas somadas no documento inteiro (uma observação por PDF)
+            metrics.STAGE_SECONDS.observe(table_seconds, stage="table_extract")
 
         return "\n\n".join(full_context)
 
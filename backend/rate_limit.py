@@ -0,0 +1,53 @@
+import os
+import time
+import hashlib
+import threading
+
+# Limite de requisições ao Gemini por API key, compartilhado entre as chamadas
+# concorrentes do processo (lote de consultas). Token bucket com reserva: quem chega
+# sem ficha reserva a próxima e recebe quanto esperar, então o lote sai espaçado em
+# vez de disparar tudo e voltar em 429.
+
+GEMINI_RPM = int(os.environ.get("GEMINI_RPM", "15"))   # 0 = sem limite (ex.: mock local)
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute, burst=None):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst or max(1, min(rate_per_minute, 5))
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Consome uma ficha e retorna quantos segundos esperar antes de usá-la."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1   # pode ficar negativo: a ficha já está reservada para alguém na fila
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self) -> float:
+        """Versão bloqueante (threads). Retorna o tempo esperado."""
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def for_key(api_key, rpm=None) -> TokenBucket:
+    """Bucket da API key (a cota do Gemini é por chave); a chave não fica guardada em claro."""
+    rpm = GEMINI_RPM if rpm is None else rpm
+    key = (hashlib.sha256(api_key.encode()).hexdigest(), rpm)
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = _buckets[key] = TokenBucket(rpm)
+        return bucket
@@ -8,11 +8,450 @@ def test_read_root():
     response = client.get("/")
     assert response.status_code == 200
     assert response.json()["status"] == "online"
-    assert response.json()["version"] == "3.0"
+    assert response.json()["version"] == "4.1 Retry-Enabled"
 
 def test_knowledge_base_dir_exists():
     assert os.path.exists("knowledge_base")
     assert os.path.isdir("knowledge_base")
 
+def test_medicamentos_changes_delta_and_etag(tmp_path, monkeypatch):
+    import db_manager
+    monkeypatch.setattr(db_manager, "DB_PATH", str(tmp_path / "test.db"))
+    db_manager.init_db()
+    db_manager.upsert_medicamento("Dipirona", "500MG", "CP", "remume", "remume")
+    db_manager.upsert_medicamento("Losartana", "50MG", "CP", "rename", "rename")
+
+    response = client.get("/medicamentos/changes", params={"since": 0})
+    body = response.json()
+    assert response.status_code == 200
+    assert [i["nome"] for i in body["items"]] == ["Dipirona", "Losartana"]
+    assert body["versao_atual"] == 2
+
+    # Mesmo estado -> 304
+    etag = response.headers["etag"]
+    cached = client.get("/medicamentos/changes", params={"since": 0}, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+
+    # Upsert sem mudança real não gera versão nova
+    assert db_manager.upsert_medicamento("Dipirona", "500MG", "CP", "remume", "remume") == "SKIP"
+    # Merge de flag gera
+    assert db_manager.upsert_medicamento("Dipirona", "500MG", "CP", "rename", "rename") == "UPDATE"
+
+    delta = client.get("/medicamentos/changes", params={"since": body["proximo_since"]}).json()
+    assert [(i["nome"], i["disp_rename"]) for i in delta["items"]] == [("Dipirona", 1)]
+    assert delta["versao_atual"] > body["versao_atual"]
+    assert not delta["items"][0]["removido"]
+
+    # Item que sai da lista (recarga do catálogo): versão nova, todas as flags 0 e removido
+    import json
+    import catalog_ingest
+    remume = tmp_path / "db_remume.json"
+    remume.write_text(json.dumps([{"nome_completo": "Amoxicilina 500mg cápsula"}]), encoding="utf-8")
+    catalog_ingest.ingest_all(str(tmp_path))
+    remume.write_text(json.dumps([]), encoding="utf-8")
+    since = client.get("/medicamentos/changes", params={"since": 0}).json()["versao_atual"]
+    catalog_ingest.ingest_all(str(tmp_path))
+
+    removed = client.get("/medicamentos/changes", params={"since": since}).json()["items"]
+    assert [i["nome"] for i in removed] == ["Amoxicilina"]
+    assert removed[0]["removido"] and not (removed[0]["disp_remume"] or removed[0]["disp_rename"] or removed[0]["disp_estadual"])
+
+def test_migration_versions_preexisting_rows(tmp_path, monkeypatch):
+    import sqlite3
+    import db_manager
+    path = tmp_path / "old.db"
+    conn = sqlite3.connect(str(path))
+    conn.execute("CREATE TABLE medicamentos (id INTEGER PRIMARY KEY AUTOINCREMENT, nome TEXT NOT NULL, concentracao TEXT, "
+                 "forma TEXT, origem_arquivo TEXT, disp_rename INTEGER DEFAULT 0, disp_estadual INTEGER DEFAULT 0, disp_remume INTEGER DEFAULT 0)")
+    conn.execute("INSERT INTO medicamentos (nome, concentracao, forma, disp_remume) VALUES ('Dipirona', '500MG', 'CP', 1)")
+    conn.execute("INSERT INTO medicamentos (nome, concentracao, forma, disp_rename) VALUES ('Losartana', '50MG', 'CP', 1)")
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(db_manager, "DB_PATH", str(path))
+
+    db_manager.init_db()
+    current, rows = db_manager.get_changes_since(0)
+    assert current == 2 and [(r["nome"], r["versao"]) for r in rows] == [("Dipirona", 1), ("Losartana", 2)]
+    db_manager.init_db()  # idempotente
+    assert db_manager.get_changes_since(0)[0] == 2
+
+def test_catalogo_snapshot_sqlite(tmp_path, monkeypatch):
+    import gzip
+    import sqlite3
+    import db_manager
+    import catalog_ingest
+    import catalog_snapshot
+    monkeypatch.setattr(db_manager, "DB_PATH", str(tmp_path / "test.db"))
+    db_manager.init_db()
+    monkeypatch.setattr(catalog_snapshot, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+
+    response = client.get("/catalogo/snapshot")
+    assert response.status_code == 200
+    db_file = tmp_path / "catalogo.sqlite"
+    db_file.write_bytes(gzip.decompress(response.content))
+
+    conn = sqlite3.connect(str(db_file))
+    listas = dict(conn.execute("SELECT lista, COUNT(*) FROM catalogo GROUP BY lista").fetchall())
+    assert set(listas) == {"remume", "rename", "alto_custo"}
+    assert conn.execute("SELECT 1 FROM catalogo WHERE nome_norm = 'abatacepte'").fetchone()
+    # Mesma fonte que /catalogo/buscar: o snapshot sai do catalogo_itens ingerido
+    rename = conn.execute("SELECT concentracao, forma, atc FROM catalogo WHERE lista = 'rename' AND nome_norm = ?",
+                          ("acido ursodesoxicolico",)).fetchone()
+    assert rename == tuple(catalog_ingest.buscar("ácido ursodesoxicólico", "rename")[0][k] for k in ("concentracao", "forma", "atc"))
+    conn.close()
+    ingerido = db_manager.get_connection()
+    assert sum(listas.values()) == ingerido.execute("SELECT COUNT(*) FROM catalogo_itens").fetchone()[0]
+    ingerido.close()
+
+    cached = client.get("/catalogo/snapshot", headers={"If-None-Match": response.headers["etag"]})
+    assert cached.status_code == 304
+
+def test_catalog_ingest_skips_unchanged(tmp_path, monkeypatch):
+    import db_manager
+    import catalog_ingest
+    monkeypatch.setattr(db_manager, "DB_PATH", str(tmp_path / "test.db"))
+    db_manager.init_db()
+
+    assert set(catalog_ingest.ingest_all().values()) == {"loaded"}
+    versao, _ = db_manager.get_changes_since(0, 1)
+    assert set(catalog_ingest.ingest_all().values()) == {"unchanged"}
+    assert db_manager.get_changes_since(0, 1)[0] == versao
+
+    # O catálogo sai no mesmo delta das importações, com a flag da lista
+    delta = client.get("/medicamentos/changes", params={"since": 0, "limit": 5000}).json()["items"]
+    dipirona = [i for i in delta if i["nome"] == "Dipirona sódica" and i["concentracao"] == "500mg"]
+    assert dipirona and dipirona[0]["disp_remume"] == 1
+    assert any(i["disp_estadual"] for i in delta)
+
+    response = client.get("/catalogo/buscar", params={"nome": "Dipirona sódica", "lista": "remume"})
+    items = response.json()["items"]
+    assert items and items[0]["nome"] == "Dipirona sódica"
+    assert {i["concentracao"] for i in items} >= {"500mg/ml", "500mg"}
+
+    rename = catalog_ingest.buscar("ácido ursodesoxicólico", "rename")[0]
+    assert (rename["concentracao"], rename["forma"], rename["atc"]) == ("150 mg", "comprimido", "A05AA02")
+
+def test_catalog_ingest_clears_flag_of_removed_items(tmp_path, monkeypatch):
+    import json
+    import db_manager
+    import catalog_ingest
+    monkeypatch.setattr(db_manager, "DB_PATH", str(tmp_path / "test.db"))
+    db_manager.init_db()
+    remume = tmp_path / "db_remume.json"
+    remume.write_text(json.dumps([{"nome_completo": "Dipirona 500mg comprimido"},
+                                  {"nome_completo": "Losartana 50mg comprimido"}]), encoding="utf-8")
+    assert catalog_ingest.ingest_all(str(tmp_path))["remume"] == "loaded"
+
+    remume.write_text(json.dumps([{"nome_completo": "Dipirona 500mg comprimido"}]), encoding="utf-8")
+    catalog_ingest.ingest_all(str(tmp_path))
+    conn = db_manager.get_connection()
+    flags = dict(conn.execute("SELECT nome, disp_remume FROM medicamentos").fetchall())
+    conn.close()
+    assert flags == {"Dipirona": 1, "Losartana": 0}
+
+def test_parser_core_and_med_parser_agree_on_doses(tmp_path, monkeypatch):
+    import db_manager
+    import catalog_ingest
+    import parser_core
+    import med_parser
+    monkeypatch.setattr(db_manager, "DB_PATH", str(tmp_path / "test.db"))
+    db_manager.init_db()
+    catalog_ingest.ingest_all()
+    conn = db_manager.get_connection()
+    textos = [r[0] for r in conn.execute("SELECT texto_original FROM catalogo_itens").fetchall()]
+    conn.close()
+    assert len(textos) > 900
+
+    # Concentração do backend (data/*.json) == primeiras doses do med_parser do app
+    for texto in textos:
+        m = parser_core.STRENGTH_RE.search(texto)
+        backend = med_parser.parse_doses(med_parser._norm(m.group(0))) if m else ()
+        app = med_parser.parse(texto).doses
+        assert backend == app[:len(backend)] and bool(backend) == bool(app), texto
+
+def test_cid_index_alto_custo(tmp_path, monkeypatch):
+    import db_manager
+    import parser_core
+    import catalog_ingest
+    monkeypatch.setattr(db_manager, "DB_PATH", str(tmp_path / "test.db"))
+    db_manager.init_db()
+    catalog_ingest.ingest_all()
+
+    assert parser_core.split_cids("M050 - Síndrome de Felty M053 - Artrite reumatóide") == \
+        [("M050", "Síndrome de Felty"), ("M053", "Artrite reumatóide")]
+
+    exato = client.get("/catalogo/cid/m05.0").json()
+    assert exato["cid"] == "M050"
+    nomes = {i["nome"] for i in exato["items"]}
+    assert "Abatacepte" in nomes
+    assert all(c["cid"] == "M050" for i in exato["items"] for c in i["cids"])
+
+    faixa = client.get("/catalogo/cid/M05", params={"prefixo": True}).json()["items"]
+    assert nomes <= {i["nome"] for i in faixa}
+
+    lme = catalog_ingest.checar_lme(["M05.0"], ["Abatacepte 250mg", "Dipirona"])
+    assert [(m["alto_custo"], m["autorizado"]) for m in lme["medicamentos"]] == [("Abatacepte", True)]
+    assert not catalog_ingest.checar_lme(["J45"], ["Abatacepte"])["medicamentos"][0]["autorizado"]
+
+    # Mesmo medicamento em várias linhas do Alto Custo: um elegível só, com todas as apresentações
+    elegiveis = catalog_ingest.checar_lme(["M050", "M053"], [])["elegiveis"]
+    abatacepte = [e for e in elegiveis if e["nome"] == "Abatacepte"]
+    assert len(abatacepte) == 1 and len(abatacepte[0]["doses"]) == 2
+    assert [c["cid"] for c in abatacepte[0]["cids"]] == ["M050", "M053"]
+
+def test_metrics_stages_and_429(monkeypatch):
+    import main
+    import metrics
+    from google.api_core import exceptions as google_exceptions
+
+    class FlakyModel:
+        calls = 0
+        def generate_content(self, prompt, generation_config=None):
+            FlakyModel.calls += 1
+            if FlakyModel.calls == 1:
+                raise google_exceptions.ResourceExhausted("quota")
+            return "ok"
+
+    monkeypatch.setattr(main.time, "sleep", lambda s: None)
+    before_429 = metrics.LLM_429.value()
+    before_llm = metrics.STAGE_SECONDS.count(stage="llm_call")
+    assert main.generate_with_retry(FlakyModel(), "prompt") == "ok"
+    main.simple_rag_search("dor lombar cronica", "knowledge_base")
+
+    assert metrics.LLM_429.value() == before_429 + 1
+    assert metrics.STAGE_SECONDS.count(stage="llm_call") == before_llm + 2
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert "# TYPE medubs_stage_seconds histogram" in body
+    assert 'medubs_stage_seconds_bucket{stage="rag_search",le="+Inf"}' in body
+    assert "medubs_llm_retries_total" in body
+
+def test_request_id_and_server_timing(tmp_path, monkeypatch):
+    import json
+    import logging
+    import db_manager
+    import tracing
+    import import_jobs
+    monkeypatch.setattr(db_manager, "DB_PATH", str(tmp_path / "test.db"))
+    db_manager.init_db()
+
+    records = []
+    handler = logging.Handler()
+    handler.emit = lambda record: records.append(json.loads(record.getMessage()))
+    tracing.logger.addHandler(handler)
+    try:
+        r = client.get("/medicamentos/changes", headers={"X-Request-ID": "abc123"})
+        # Stream NDJSON: o resumo vai no evento final
+        s = client.post("/upload-medicamento", files={"file": ("x.pdf", b"nao eh pdf")},
+                        data={"nome_lista": "remume", "api_key": "k", "model": "m"})
+    finally:
+        tracing.logger.removeHandler(handler)
+
+    assert r.headers["x-request-id"] == "abc123"
+    assert "db;dur=" in r.headers["server-timing"] and "total;dur=" in r.headers["server-timing"]
+
+    final = json.loads(s.text.strip().splitlines()[-1])
+    assert final["status"] == "heuristic_failed"
+    assert final["request_id"] == s.headers["x-request-id"]
+    assert "parse" in final["server_timing"]
+
+    logged = {rec["request_id"]: rec for rec in records if rec["event"] == "request"}
+    assert logged["abc123"]["path"] == "/medicamentos/changes" and logged["abc123"]["status"] == 200
+    assert "db" in logged["abc123"]["timings_ms"]
+    assert final["request_id"] in logged
+    import_jobs.stop_workers()
+
+def test_import_job_checkpoint_and_resume(tmp_path, monkeypatch):
+    import re
+    import sqlite3
+    import json
+    import types
+    import pytest
+    import main
+    import db_manager
+    import import_jobs
+    import_jobs.stop_workers()  # o job roda à mão aqui, sem o pool disputando
+    monkeypatch.setattr(db_manager, "DB_PATH", str(tmp_path / "test.db"))
+    db_manager.init_db()
+    monkeypatch.setattr(main, "IMPORT_SAFE_LIMIT", 300)
+    monkeypatch.setattr(main, "IMPORT_CHUNK_SIZE", 200)
+    monkeypatch.setattr(main, "IMPORT_CHUNK_WAIT", 0)
+    monkeypatch.setattr(main.parser_core.HeuristicParser, "extract_optimized_context", lambda self, data: "x" * 900)
+
+    sent = []
+    class FakeModel:
+        crash_at = 3
+        def __init__(self, name): pass
+        def generate_content(self, prompt, generation_config=None):
+            n = int(re.search(r"\((\d+)/5\)", prompt).group(1))
+            if n == FakeModel.crash_at:
+                raise SystemExit("processo morreu")  # simula o restart no meio do trecho 3
+            sent.append(n)
+            return types.SimpleNamespace(text=json.dumps([{"nome": f"Med {n}", "concentracao": "1MG", "forma": "CP"}]))
+    monkeypatch.setattr(main.genai, "GenerativeModel", FakeModel)
+
+    job_id = import_jobs.create(b"%PDF", "remume", "k", "m")
+    with pytest.raises(SystemExit):
+        main.process_import_job(import_jobs.claim())
+    assert sent == [1, 2] and import_jobs.get(job_id)["status"] == import_jobs.EXECUTANDO
+
+    # A chave nunca vai para o banco
+    with sqlite3.connect(db_manager.DB_PATH) as conn:
+        assert conn.execute("SELECT api_key FROM import_jobs").fetchone()[0] is None
+
+    # Processo morreu (a chave em memória foi junto) e o heartbeat parou além do lease
+    import_jobs._keys.clear()
+    monkeypatch.setattr(import_jobs, "LEASE_SECONDS", -1)
+    FakeModel.crash_at = None
+    assert import_jobs.claim() is None
+    parado = client.get(f"/jobs/{job_id}").json()
+    assert parado["status"] == import_jobs.SEM_CHAVE and "reenvie a chave" in parado["erro"]
+    assert parado["eventos"][-1]["status"] == import_jobs.SEM_CHAVE
+
+    # Chave reenviada: outro worker retoma do trecho 3
+    monkeypatch.setattr(import_jobs, "start_workers", lambda process: None)
+    assert client.post(f"/jobs/{job_id}/chave", data={"api_key": "k"}).status_code == 202
+    assert client.post(f"/jobs/{job_id}/chave", data={"api_key": "k"}).status_code == 409
+    job = import_jobs.claim()
+    assert job["id"] == job_id and job["tentativas"] == 2 and job["api_key"] == "k"
+    import_jobs.finish(job_id, main.process_import_job(job))
+    assert sent == [1, 2, 3, 4, 5]
+
+    status = client.get(f"/jobs/{job_id}").json()
+    assert status["status"] == import_jobs.CONCLUIDO and status["trechos_ok"] == 5
+    assert [m["nome"] for m in status["resultado"]["data"]] == [f"Med {n}" for n in range(1, 6)]
+    assert any("Retomando" in e.get("msg", "") for e in status["eventos"])
+    assert db_manager.get_changes_since(0)[0] == 5
+
+    # Reconexão: stream só do que veio depois de `after`, até o evento final
+    last_seq = status["eventos"][-2]["seq"]
+    lines = [json.loads(l) for l in client.get(f"/jobs/{job_id}/eventos", params={"after": last_seq}).text.splitlines()]
+    assert [l["status"] for l in lines] == ["success"]
+    assert client.get("/jobs/naoexiste").status_code == 404
+
+def test_import_pool_stop_waits_between_chunks(tmp_path, monkeypatch):
+    import json
+    import time
+    import types
+    import main
+    import db_manager
+    import import_jobs
+    import_jobs.stop_workers()
+    monkeypatch.setattr(db_manager, "DB_PATH", str(tmp_path / "test.db"))
+    db_manager.init_db()
+    monkeypatch.setattr(main, "IMPORT_SAFE_LIMIT", 300)
+    monkeypatch.setattr(main, "IMPORT_CHUNK_SIZE", 200)
+    monkeypatch.setattr(main, "IMPORT_CHUNK_WAIT", 30)
+    monkeypatch.setattr(main.parser_core.HeuristicParser, "extract_optimized_context", lambda self, data: "x" * 900)
+    monkeypatch.setattr(main.genai, "GenerativeModel", lambda name: types.SimpleNamespace(
+        generate_content=lambda prompt, generation_config=None: types.SimpleNamespace(text=json.dumps([]))))
+
+    job_id = import_jobs.create(b"%PDF", "remume", "k", "m")
+    pool = import_jobs.WorkerPool(main.process_import_job, workers=1, poll=0.05).start()
+    deadline = time.monotonic() + 5
+    while import_jobs.get(job_id)["trechos_ok"] < 1 and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+    # Parada no meio da espera entre trechos: não espera os 30s, e só libera depois da thread sair
+    started = time.monotonic()
+    pool.stop()
+    assert time.monotonic() - started < 5
+    assert not any(t.is_alive() for t in pool._threads)
+    job = import_jobs.get(job_id)
+    assert job["status"] == import_jobs.SEM_CHAVE and job["trechos_ok"] == 1 and job["tentativas"] == 0
+
+def test_import_job_endpoint_returns_immediately(tmp_path, monkeypatch):
+    import json
+    import db_manager
+    import import_jobs
+    monkeypatch.setattr(db_manager, "DB_PATH", str(tmp_path / "test.db"))
+    db_manager.init_db()
+
+    created = client.post("/jobs/upload-medicamento", files={"file": ("x.pdf", b"nao eh pdf")},
+                          data={"nome_lista": "remume", "api_key": "k", "model": "m"})
+    assert created.status_code == 202
+    job_id = created.json()["job_id"]
+
+    final = json.loads(client.get(f"/jobs/{job_id}/eventos").text.splitlines()[-1])
+    assert final["status"] == "heuristic_failed" and final["job_id"] == job_id
+    assert client.get(f"/jobs/{job_id}").json()["status"] == "falhou"
+    import_jobs.stop_workers()
+
+def test_rag_batch_matches_single_search(tmp_path):
+    import main
+    (tmp_path / "asma.txt").write_text("Asma: chiado no peito e tosse noturna. Salbutamol spray.", encoding="utf-8")
+    (tmp_path / "has.txt").write_text("Hipertensão: cefaleia, tontura. Losartana e hidroclorotiazida.", encoding="utf-8")
+    queries = ["Paciente com tosse noturna e chiado", "Cefaleia e tontura, usa losartana", "nada relevante"]
+
+    batch = main.rag_search_batch(queries, str(tmp_path))
+    assert batch == [main.simple_rag_search(q, str(tmp_path)) for q in queries]
+    assert "(asma.txt)" in batch[0] and "(has.txt)" in batch[1] and batch[2] == ""
+
+def test_token_bucket_spaces_requests(monkeypatch):
+    import rate_limit
+    bucket = rate_limit.TokenBucket(60, burst=2)   # 1/s depois de 2 imediatas
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: bucket.updated)
+    assert [round(bucket.reserve(), 3) for _ in range(4)] == [0.0, 0.0, 1.0, 2.0]
+    assert rate_limit.TokenBucket(0).reserve() == 0.0
+    assert rate_limit.for_key("a") is rate_limit.for_key("a") is not rate_limit.for_key("b")
+
+def test_consultar_ia_batch_streams_items_and_errors(tmp_path, monkeypatch):
+    import json
+    import types
+    import main
+    import db_manager
+    monkeypatch.setattr(db_manager, "DB_PATH", str(tmp_path / "test.db"))
+    db_manager.init_db()
+
+    class FakeModel:
+        def __init__(self, name): pass
+        def generate_content(self, prompt, generation_config=None):
+            if "FALHA" in prompt:
+                raise ValueError("resposta inválida")
+            return types.SimpleNamespace(text=json.dumps({"soap": {"s": "ok"}, "cids": ["J45"], "medicamentos": ["Salbutamol"]}))
+    monkeypatch.setattr(main.genai, "GenerativeModel", FakeModel)
+
+    r = client.post("/consultar-ia/batch", json={
+        "transcricoes": ["tosse noturna", "FALHA aqui", "cefaleia"], "api_key": "lote-teste", "concorrencia": 2})
+    lines = [json.loads(l) for l in r.text.splitlines()]
+
+    assert lines[0] == {"status": "start", "total": 3, "concorrencia": 2}
+    items = {l["index"]: l for l in lines[1:-1]}
+    assert sorted(items) == [0, 1, 2]
+    assert items[0]["status"] == "ok" and items[0]["cids"] == ["J45"]
+    assert items[1]["status"] == "error" and items[1]["erro"] == "resposta inválida" and not items[1]["retryable"]
+    assert items[1]["soap"]["s"] == "Erro ao processar"
+    assert lines[-1]["status"] == "done" and (lines[-1]["ok"], lines[-1]["erros"]) == (2, 1)
+    assert lines[-1]["request_id"] == r.headers["x-request-id"]
+
+    assert client.post("/consultar-ia/batch", json={"transcricoes": [], "api_key": "k"}).status_code == 400
+
+def test_trace_span_counts_union_of_overlapping_spans():
+    import time
+    import threading
+    import contextvars
+    import tracing
+
+    def llm(delay, dur):
+        time.sleep(delay)
+        with tracing.span("llm_call"):
+            time.sleep(dur)
+
+    with tracing.background() as trace:
+        # Lote concorrente: 0.0-0.2s e 0.1-0.3s -> 0.3s de parede (nem 0.2 nem 0.4)
+        threads = [threading.Thread(target=contextvars.copy_context().run, args=(llm, d, 0.2)) for d in (0.0, 0.1)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        with tracing.span("llm_call"):
+            with tracing.span("llm_backoff"):  # aninhado no mesmo grupo não conta duas vezes
+                time.sleep(0.05)
+
+    assert 0.33 <= trace.groups["llm"] < 0.42
+
 print("✅ Testes Básicos de Infraestrutura (Backend) Passaram!")
 print("Rode este teste com: pytest test_main.py")
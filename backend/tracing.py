@@ -0,0 +1,169 @@
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Rastreamento por requisição: cada request ganha um ID (X-Request-ID do cliente ou
+# gerado aqui) e acumula o tempo das etapas num contextvar. Como o contexto segue
+# sozinho por generate_with_retry, HeuristicParser e db_manager (inclusive no
+# threadpool do FastAPI), nenhuma assinatura muda.
+#   - resposta: headers X-Request-ID e Server-Timing (rag, llm, parse, db, total)
+#   - NDJSON: o evento final leva o mesmo resumo (os headers saem antes do corpo)
+#   - log: uma linha JSON por request no logger "medubs.trace"
+
+REQUEST_ID_HEADER = "x-request-id"
+
+# Etapa (metrics.stage) -> grupo do Server-Timing
+STAGE_GROUPS = {
+    "rag_search": "rag",
+    "llm_call": "llm",
+    "llm_backoff": "llm",
+    "pdf_parse": "parse",
+    "json_parse": "parse",
+    "db_upsert_batch": "db",
+    "db_query": "db",
+    "rate_limit_wait": "wait",
+}
+
+logger = logging.getLogger("medubs.trace")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_current = contextvars.ContextVar("medubs_trace", default=None)
+
+
+class Trace:
+    def __init__(self, request_id=None):
+        self.request_id = request_id or uuid.uuid4().hex[:16]
+        self.start = time.perf_counter()
+        self.groups = {}     # grupo -> segundos de parede (união dos spans)
+        # Spans do mesmo grupo podem se sobrepor (aninhados ou em threads do lote):
+        # conta quantos estão abertos e desde quando o grupo está ativo
+        self._depth = {}
+        self._since = {}
+        self._lock = threading.Lock()
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def timings_ms(self) -> dict:
+        out = {g: round(s * 1000, 1) for g, s in self.groups.items()}
+        out["total"] = round(self.elapsed() * 1000, 1)
+        return out
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{g};dur={ms}" for g, ms in self.timings_ms().items())
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def span(stage):
+    """
+    Soma no grupo da etapa o tempo de parede em que algum span dele esteve aberto, na
+    trace da request atual (se houver): spans sobrepostos contam a união, não a soma.
+    """
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    group = STAGE_GROUPS.get(stage, stage)
+    with trace._lock:
+        if not trace._depth.get(group):
+            trace._since[group] = time.perf_counter()
+        trace._depth[group] = trace._depth.get(group, 0) + 1
+    try:
+        yield
+    finally:
+        with trace._lock:
+            trace._depth[group] -= 1
+            if not trace._depth[group]:
+                trace.groups[group] = trace.groups.get(group, 0.0) + time.perf_counter() - trace._since.pop(group)
+
+
+@contextmanager
+def background(request_id=None):
+    """Trace fora de uma request (job em thread própria); mesmo ID = logs ligados à request de origem."""
+    token = _current.set(Trace(request_id))
+    try:
+        yield _current.get()
+    finally:
+        _current.reset(token)
+
+
+def summary() -> dict:
+    """{"request_id", "server_timing"} da request atual, para colocar no corpo (evento final do NDJSON)."""
+    trace = _current.get()
+    if trace is None:
+        return {}
+    return {"request_id": trace.request_id, "server_timing": trace.timings_ms()}
+
+
+def log_event(event, **fields):
+    """Linha de log JSON ligada à request atual."""
+    trace = _current.get()
+    record = {"ts": round(time.time(), 3), "event": event}
+    if trace is not None:
+        record["request_id"] = trace.request_id
+    record.update(fields)
+    logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+
+class TracingMiddleware:
+    """
+    Middleware ASGI puro (não o BaseHTTPMiddleware): injeta os headers no início da
+    resposta e só loga quando o último pedaço do corpo sai, então streams entram inteiros.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope.get("headers") or []).get(REQUEST_ID_HEADER.encode())
+        trace = Trace(incoming.decode("latin-1")[:64] if incoming else None)
+        token = _current.set(trace)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", trace.request_id.encode("latin-1")))
+                headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                _log_request(scope, status["code"], trace)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            _log_request(scope, 500, trace)
+            raise
+        finally:
+            _current.reset(token)
+
+
+def _log_request(scope, status, trace):
+    logger.info(json.dumps({
+        "ts": round(time.time(), 3),
+        "event": "request",
+        "request_id": trace.request_id,
+        "method": scope.get("method"),
+        "path": scope.get("path"),
+        "status": status,
+        "timings_ms": trace.timings_ms(),
+    }, ensure_ascii=False))
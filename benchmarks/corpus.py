@@ -0,0 +1,147 @@
+import os
+import random
+
+from fpdf import FPDF
+
+# Corpus sintético e determinístico (mesma seed = mesmos bytes) para os benchmarks:
+#   - PDFs de lista de medicamentos: N páginas, densidade de tabela, páginas "escaneadas"
+#     (só desenho, sem texto extraível, como um PDF de imagem)
+#   - transcrições de consulta (Médico/Paciente)
+#   - protocolos (PCDT) em .txt para o RAG
+
+MEDICAMENTOS = [
+    ("Dipirona sódica", "500mg/ml", "gotas"), ("Paracetamol", "500mg", "comprimido"),
+    ("Amoxicilina", "500mg", "cápsula"), ("Losartana potássica", "50mg", "comprimido"),
+    ("Metformina", "850mg", "comprimido"), ("Sinvastatina", "20mg", "comprimido"),
+    ("Omeprazol", "20mg", "cápsula"), ("Hidroclorotiazida", "25mg", "comprimido"),
+    ("Enalapril", "10mg", "comprimido"), ("Captopril", "25mg", "comprimido"),
+    ("Ibuprofeno", "600mg", "comprimido"), ("Prednisona", "20mg", "comprimido"),
+    ("Salbutamol", "100mcg/dose", "aerossol"), ("Insulina NPH", "100UI/ml", "suspensão injetável"),
+    ("Levotiroxina", "50mcg", "comprimido"), ("Fluoxetina", "20mg", "cápsula"),
+    ("Azitromicina", "500mg", "comprimido"), ("Cefalexina", "500mg", "cápsula"),
+    ("Ácido fólico", "5mg", "comprimido"), ("Sulfato ferroso", "40mg", "comprimido"),
+    ("Metronidazol", "250mg", "comprimido"), ("Carbamazepina", "200mg", "comprimido"),
+    ("Anlodipino", "5mg", "comprimido"), ("Atenolol", "50mg", "comprimido"),
+]
+COMPONENTES = ["Básico", "Estratégico", "Especializado"]
+
+DOENCAS = {
+    "hipertensao": ("Hipertensão arterial sistêmica", "I10", ["cefaleia", "tontura", "pressão alta"]),
+    "diabetes": ("Diabetes mellitus tipo 2", "E11", ["sede excessiva", "poliúria", "glicemia alterada"]),
+    "asma": ("Asma", "J45", ["falta de ar", "chiado no peito", "tosse noturna"]),
+    "depressao": ("Episódio depressivo", "F32", ["tristeza", "insônia", "desânimo"]),
+    "artrite": ("Artrite reumatoide", "M05", ["dor nas articulações", "rigidez matinal", "inchaço nas mãos"]),
+    "itu": ("Infecção do trato urinário", "N39", ["ardência ao urinar", "febre", "dor lombar"]),
+}
+
+PROSA = (
+    "A relação municipal de medicamentos essenciais orienta a prescrição nas unidades básicas. "
+    "Os itens abaixo estão disponíveis conforme o componente de financiamento e a programação "
+    "anual da assistência farmacêutica. Consulte a farmácia da unidade antes da dispensação. "
+)
+
+
+def _latin1(text):
+    # fontes core do FPDF 1.7 são latin-1
+    return text.encode("latin-1", "replace").decode("latin-1")
+
+
+def medication_pdf(pages=10, table_density=0.5, scanned_pages=0, seed=0) -> bytes:
+    """
+    PDF de lista de medicamentos. `table_density` (0..1): fração de cada página em tabela
+    (resto é prosa). `scanned_pages`: quantas páginas viram "imagem" (ruído desenhado, sem texto).
+    """
+    rng = random.Random(seed)
+    scanned = set(rng.sample(range(pages), min(scanned_pages, pages)))
+    rows_per_page = 38
+    pdf = FPDF()
+    pdf.set_auto_page_break(False)
+
+    for p in range(pages):
+        pdf.add_page()
+        if p in scanned:
+            pdf.set_fill_color(200, 200, 200)
+            for _ in range(400):
+                pdf.rect(rng.uniform(10, 195), rng.uniform(10, 280), rng.uniform(0.5, 4), rng.uniform(0.5, 2), "F")
+            continue
+
+        pdf.set_font("Arial", "B", 12)
+        pdf.cell(0, 8, _latin1(f"RELAÇÃO MUNICIPAL DE MEDICAMENTOS - PÁGINA {p + 1}"), ln=1)
+        table_rows = int(round(rows_per_page * table_density))
+        if table_rows:
+            pdf.set_font("Arial", "B", 8)
+            for header, w in (("Medicamento", 70), ("Concentração", 35), ("Forma", 45), ("Componente", 35)):
+                pdf.cell(w, 6, _latin1(header), border=1)
+            pdf.ln()
+            pdf.set_font("Arial", "", 8)
+            for _ in range(table_rows - 1):
+                nome, conc, forma = rng.choice(MEDICAMENTOS)
+                for value, w in ((nome, 70), (conc, 35), (forma, 45), (rng.choice(COMPONENTES), 35)):
+                    pdf.cell(w, 6, _latin1(value), border=1)
+                pdf.ln()
+        prose_lines = rows_per_page - table_rows
+        if prose_lines:
+            pdf.set_font("Arial", "", 9)
+            pdf.multi_cell(0, 5, _latin1((PROSA * (prose_lines // 3 + 1))[:prose_lines * 95]))
+        pdf.set_font("Arial", "", 7)
+        pdf.set_xy(10, 285)
+        pdf.cell(0, 5, f"{p + 1} de {pages}", align="C")
+
+    return pdf.output(dest="S").encode("latin-1")
+
+
+def transcript(seed=0, exchanges=12) -> str:
+    """Transcrição sintética de consulta, com sintomas, CID e medicamentos de uma doença sorteada."""
+    rng = random.Random(seed)
+    nome, cid, sintomas = DOENCAS[rng.choice(sorted(DOENCAS))]
+    meds = rng.sample(MEDICAMENTOS, 2)
+    lines = ["Médico: Bom dia. O que traz o senhor hoje?",
+             f"Paciente: Doutor, estou com {sintomas[0]} há {rng.randint(2, 30)} dias."]
+    for _ in range(exchanges):
+        s = rng.choice(sintomas)
+        lines.append(f"Médico: E quanto a {s}, piorou ou melhorou desde a última consulta?")
+        lines.append(f"Paciente: Ainda sinto {s}, principalmente à noite, e também {rng.choice(sintomas)}.")
+    lines.append(f"Médico: Pelo quadro é {nome} ({cid}). Vamos manter {meds[0][0]} {meds[0][1]} "
+                 f"e iniciar {meds[1][0]} {meds[1][1]}, um {meds[1][2]} por dia.")
+    lines.append("Paciente: Certo, doutor. Volto em trinta dias.")
+    return "\n".join(lines)
+
+
+def protocol_corpus(out_dir, files=20, size_kb=40, seed=0):
+    """Grava `files` protocolos .txt (~size_kb cada) em out_dir. Retorna os caminhos."""
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    keys = sorted(DOENCAS)
+    paths = []
+    for i in range(files):
+        nome, cid, sintomas = DOENCAS[keys[i % len(keys)]]
+        header = f"PROTOCOLO CLÍNICO E DIRETRIZES TERAPÊUTICAS - {nome.upper()} ({cid})\n\n"
+        parts = [header]
+        size = len(header)
+        while size < size_kb * 1024:
+            med = rng.choice(MEDICAMENTOS)
+            para = (f"Pacientes com {nome.lower()} que apresentam {rng.choice(sintomas)} devem ser avaliados "
+                    f"quanto ao uso de {med[0]} {med[1]} ({med[2]}). {PROSA}\n")
+            parts.append(para)
+            size += len(para)
+        path = os.path.join(out_dir, f"pcdt_{i:03d}_{keys[i % len(keys)]}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("".join(parts))
+        paths.append(path)
+    return paths
+
+
+def query_terms(names, count=200, typo_rate=0.3, seed=0):
+    """Termos como a IA devolve: nomes do catálogo, às vezes com erro de digitação, e alguns inexistentes."""
+    rng = random.Random(seed)
+    terms = []
+    for _ in range(count):
+        if rng.random() < 0.1:
+            terms.append(f"medicamentox {rng.randint(1, 999)}mg")
+            continue
+        term = rng.choice(names).lower()
+        if rng.random() < typo_rate and len(term) > 4:
+            i = rng.randrange(1, len(term) - 1)
+            term = term[:i] + term[i + 1] + term[i] + term[i + 2:]
+        terms.append(term)
+    return terms
@@ -0,0 +1,183 @@
+"""
+Teste de carga do backend: N unidades (clínicas) chamando /consultar-ia e
+/upload-medicamento em paralelo. Reporta p50/p95/p99 e vazão por endpoint.
+
+    # backend já rodando (com GEMINI_API_BASE apontando para o mock):
+    python benchmarks/load_test.py --backend http://127.0.0.1:8000 --clinics 10 --requests 20
+
+    # sobe mock do Gemini + backend (uvicorn) num diretório temporário:
+    python benchmarks/load_test.py --spawn --clinics 20 --latency-ms 400 --error-rate 0.02
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+
+import requests
+
+import corpus
+from mock_gemini import MockGemini
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(os.path.dirname(BENCH_DIR), "backend")
+
+
+def percentile(values, pct):
+    """Percentil com interpolação linear (pct em 0..100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(samples, elapsed):
+    """samples: [(endpoint, segundos, ok)] -> relatório por endpoint + total."""
+    report = {}
+    for name in sorted({s[0] for s in samples}) + ["total"]:
+        rows = [s for s in samples if name == "total" or s[0] == name]
+        lat = [s[1] * 1000 for s in rows]
+        report[name] = {
+            "requests": len(rows),
+            "errors": sum(1 for s in rows if not s[2]),
+            "p50_ms": round(percentile(lat, 50), 1),
+            "p95_ms": round(percentile(lat, 95), 1),
+            "p99_ms": round(percentile(lat, 99), 1),
+            "throughput_rps": round(len(rows) / elapsed, 2) if elapsed else None,
+        }
+    return report
+
+
+def consultar(session, base, seed):
+    resp = session.post(f"{base}/consultar-ia", json={
+        "transcricao": corpus.transcript(seed=seed), "api_key": "mock", "model": "gemini-1.5-flash",
+    }, timeout=300)
+    # O endpoint devolve 200 mesmo com erro (card "Erro ao processar")
+    return resp.status_code == 200 and resp.json().get("soap", {}).get("s") != "Erro ao processar"
+
+
+def upload(session, base, pdf_bytes):
+    resp = session.post(f"{base}/upload-medicamento", files={"file": ("lista.pdf", pdf_bytes, "application/pdf")},
+                        data={"nome_lista": "remume", "api_key": "mock", "model": "gemini-1.5-flash"},
+                        stream=True, timeout=600)
+    last = None
+    for line in resp.iter_lines():
+        if line:
+            last = json.loads(line)
+    return resp.status_code == 200 and bool(last) and last.get("status") == "success"
+
+
+def run_load(base, clinics=5, requests_per_clinic=10, upload_ratio=0.1, think_ms=0, seed=0):
+    """Dispara as clínicas em threads e devolve (amostras, segundos totais)."""
+    pdf_bytes = corpus.medication_pdf(pages=2, table_density=0.8, seed=seed)
+    samples, lock = [], threading.Lock()
+
+    def clinic(idx):
+        rng = random.Random(seed * 1000 + idx)
+        session = requests.Session()   # cada unidade com a sua conexão keep-alive
+        for i in range(requests_per_clinic):
+            is_upload = rng.random() < upload_ratio
+            start = time.perf_counter()
+            try:
+                ok = upload(session, base, pdf_bytes) if is_upload else consultar(session, base, idx * 1000 + i)
+            except requests.RequestException:
+                ok = False
+            with lock:
+                samples.append(("upload-medicamento" if is_upload else "consultar-ia", time.perf_counter() - start, ok))
+            if think_ms:
+                time.sleep(rng.uniform(0, 2 * think_ms) / 1000)
+
+    threads = [threading.Thread(target=clinic, args=(c,), daemon=True) for c in range(clinics)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples, time.perf_counter() - start
+
+
+def spawn_backend(gemini_base, port, workdir):
+    """uvicorn do backend num diretório temporário (banco e knowledge_base descartáveis)."""
+    corpus.protocol_corpus(os.path.join(workdir, "knowledge_base"), files=10, size_kb=20)
+    env = dict(os.environ, GEMINI_API_BASE=gemini_base)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND_DIR,
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("backend encerrou durante o startup")
+        try:
+            if requests.get(base + "/", timeout=1).status_code == 200:
+                return proc, base
+        except requests.RequestException:
+            time.sleep(0.3)
+    proc.terminate()
+    raise RuntimeError("backend não respondeu em 60s")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Teste de carga do backend MEDUBS")
+    ap.add_argument("--backend", default="http://127.0.0.1:8000")
+    ap.add_argument("--spawn", action="store_true", help="Sobe mock do Gemini + backend locais")
+    ap.add_argument("--port", type=int, default=8765, help="Porta do backend com --spawn")
+    ap.add_argument("--clinics", type=int, default=5)
+    ap.add_argument("--requests", type=int, default=10, help="Requisições por clínica")
+    ap.add_argument("--upload-ratio", type=float, default=0.1)
+    ap.add_argument("--think-ms", type=float, default=0)
+    ap.add_argument("--latency-ms", type=float, default=300, help="Mock: latência base")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="Mock: fração de 429")
+    ap.add_argument("--rpm", type=int, default=0, help="Mock: limite de requisições/minuto")
+    ap.add_argument("--out", help="Grava o relatório em JSON")
+    args = ap.parse_args(argv)
+
+    mock = proc = workdir = None
+    base = args.backend.rstrip("/")
+    try:
+        if args.spawn:
+            mock = MockGemini(latency_ms=args.latency_ms, jitter_ms=args.latency_ms / 4,
+                              error_rate=args.error_rate, rpm=args.rpm).start()
+            workdir = tempfile.mkdtemp(prefix="medubs_load_")
+            proc, base = spawn_backend(mock.base_url, args.port, workdir)
+            print(f"Mock Gemini: {mock.base_url} | backend: {base}")
+
+        samples, elapsed = run_load(base, args.clinics, args.requests, args.upload_ratio, args.think_ms)
+        report = {"config": vars(args), "elapsed_s": round(elapsed, 2), "endpoints": summarize(samples, elapsed)}
+        if mock:
+            report["gemini"] = mock.state.stats
+
+        print(f"{'endpoint':<20} {'req':>5} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>7}")
+        for name, r in report["endpoints"].items():
+            print(f"{name:<20} {r['requests']:>5} {r['errors']:>4} {r['p50_ms']:>9} {r['p95_ms']:>9} "
+                  f"{r['p99_ms']:>9} {r['throughput_rps']:>7}")
+        if mock:
+            g = report["gemini"]
+            print(f"Gemini mock: {g['ok']} ok, {g['throttled']} x 429, "
+                  f"{g['prompt_tokens']} tokens de entrada, {g['output_tokens']} de saída")
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait(10)
+        if mock:
+            mock.stop()
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
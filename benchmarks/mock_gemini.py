@@ -0,0 +1,315 @@
+"""
+Servidor local no lugar da API do Gemini (generateContent + File API resumable),
+para teste de carga e ponta a ponta sem API key nem cota.
+
+    python benchmarks/mock_gemini.py --port 8090 --latency-ms 400 --error-rate 0.05 --rpm 120
+
+Clientes:
+    src/ (gemini_client)        GEMINI_API_BASE=http://127.0.0.1:8090
+    backend (google.generativeai, transporte REST)
+                                GEMINI_API_BASE=http://127.0.0.1:8090 uvicorn main:app
+
+Respostas determinísticas (mesmo prompt = mesma resposta), montadas a partir do
+vocabulário do corpus sintético: lista de medicamentos (JSON array), consulta
+(JSON SOAP), transcrição (texto). GET /stats: requisições, 429s e tokens.
+Falhas determinísticas para os testes: `faults` ({n-ésima generateContent: 429,
+503 ou "drop"}) e `upload_faults` ({offset do chunk: status}, recebe só parte).
+"""
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import corpus
+
+GENERATE_RE = re.compile(r"^/v1(?:beta)?/models/([^/:]+):generateContent")
+
+
+def count_tokens(text) -> int:
+    """Aproximação do Gemini: ~4 caracteres por token."""
+    return max(1, len(text) // 4)
+
+
+def _found_meds(text):
+    low = text.lower()
+    return [m for m in corpus.MEDICAMENTOS if m[0].lower() in low]
+
+
+def synthetic_response(prompt, audio_seed=None):
+    """Resposta determinística para o prompt (e o áudio, se houver: vira uma transcrição sintética)."""
+    if "transcreva" in prompt.lower():
+        return corpus.transcript(seed=audio_seed or 0)
+
+    text = prompt + ("\n" + corpus.transcript(seed=audio_seed) if audio_seed is not None else "")
+    if "JSON ARRAY" in prompt:
+        lista = re.search(r'de "([^"]+)"', prompt)
+        return json.dumps([{
+            "nome": nome, "concentracao": conc, "forma": forma,
+            "lista_origem": lista.group(1) if lista else "", "data_importacao": "hoje",
+        } for nome, conc, forma in _found_meds(text)], ensure_ascii=False)
+
+    doencas = [d for d in corpus.DOENCAS.values() if d[1] in text or d[0].lower() in text.lower()]
+    nome, cid, sintomas = doencas[0] if doencas else ("Quadro inespecífico", "R69", ["queixa vaga"])
+    meds = [f"{n} {c}" for n, c, _ in _found_meds(text)]
+    return json.dumps({
+        "soap": {
+            "s": f"Paciente refere {', '.join(sintomas[:2])}.",
+            "o": "Sem alterações ao exame físico.",
+            "a": f"{nome} ({cid})",
+            "p": "Manter tratamento e retorno em 30 dias.",
+        },
+        "paciente": {"sexo": "Masculino", "idade": 45},
+        "cids": [cid],
+        "medicamentos": meds,
+        "keywords": sintomas,
+        "missoes": [{"tarefa": f"Solicitar exames de controle de {nome.lower()}", "categoria": "Exame", "doenca": nome}],
+        "sugestoes": {"s": [], "o": ["Aferir sinais vitais"], "a": [], "p": []},
+    }, ensure_ascii=False)
+
+
+class MockState:
+    def __init__(self, latency_ms=0, jitter_ms=0, ms_per_1k_tokens=0, error_rate=0.0, rpm=0, seed=0,
+                 faults=None, upload_faults=None, record=False):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.ms_per_1k_tokens = ms_per_1k_tokens
+        self.error_rate = error_rate
+        self.rpm = rpm
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window = deque()      # horários das requisições aceitas no último minuto
+        self.files = {}             # File API: id -> {"data": bytearray, "mime": ..., "size": ...}
+        self.faults = dict(faults or {})
+        self.upload_faults = dict(upload_faults or {})
+        self.record = record
+        self.requests = []          # corpos de generateContent (só com record=True)
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stats = {"requests": 0, "ok": 0, "throttled": 0, "prompt_tokens": 0,
+                          "output_tokens": 0, "by_model": {}}
+            self._window.clear()
+
+    def admit(self):
+        """None = atender; senão a falha a devolver: 429 (injeção, rpm estourado), 503 ou "drop"."""
+        with self._lock:
+            self.stats["requests"] += 1
+            fault = self.faults.pop(self.stats["requests"], None)
+            now = time.monotonic()
+            while self._window and now - self._window[0] > 60:
+                self._window.popleft()
+            if fault is None and (self._rng.random() < self.error_rate or (self.rpm and len(self._window) >= self.rpm)):
+                fault = 429
+            if fault == 429:
+                self.stats["throttled"] += 1
+            if fault is None:
+                self._window.append(now)
+            return fault
+
+    def delay(self, tokens):
+        with self._lock:
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+        seconds = max(0.0, self.latency_ms + jitter + self.ms_per_1k_tokens * tokens / 1000) / 1000
+        if seconds:
+            time.sleep(seconds)
+
+    def account(self, model, prompt_tokens, output_tokens):
+        with self._lock:
+            self.stats["ok"] += 1
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["output_tokens"] += output_tokens
+            self.stats["by_model"][model] = self.stats["by_model"].get(model, 0) + 1
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive: os clientes usam sessão com pool
+
+    @property
+    def state(self) -> MockState:
+        return self.server.state
+
+    def log_message(self, *args):
+        pass
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status, payload=None, headers=None):
+        data = json.dumps(payload).encode() if payload is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/stats":
+            with self.state._lock:
+                self._send(200, json.loads(json.dumps(self.state.stats)))
+        elif path.startswith("/v1beta/files/"):
+            file_id = path.rsplit("/", 1)[1]
+            f = self.state.files.get(file_id)
+            if f:
+                self._send(200, self._file_resource(file_id, f))
+            else:
+                self._send(404, {"error": {"code": 404, "message": "arquivo não encontrado"}})
+        else:
+            self._send(404, {"error": {"code": 404, "message": "not found"}})
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        body = self._body()
+        if path == "/stats/reset":
+            self.state.reset()
+            self._send(200, {})
+            return
+        if path == "/upload/v1beta/files":
+            self._upload_start(body)
+            return
+        if path.startswith("/upload/session/"):
+            self._upload_chunk(path.rsplit("/", 1)[1], body)
+            return
+        m = GENERATE_RE.match(path)
+        if not m:
+            self._send(404, {"error": {"code": 404, "message": "not found"}})
+            return
+
+        fault = self.state.admit()
+        if fault == "drop":
+            self.close_connection = True   # derruba a conexão sem responder
+            return
+        if fault == 429:
+            self._send(429, {"error": {"code": 429, "message": "Resource has been exhausted (e.g. check quota).",
+                                       "status": "RESOURCE_EXHAUSTED"}})
+            return
+        if fault:
+            self._send(fault, {"error": {"code": fault, "message": "falha injetada"}})
+            return
+
+        request = json.loads(body or b"{}")
+        if self.state.record:
+            self.state.requests.append(request)
+        texts, audio_seed = [], None
+        for content in request.get("contents", []):
+            for part in content.get("parts", []):
+                if "text" in part:
+                    texts.append(part["text"])
+                media = part.get("inline_data") or part.get("inlineData") or part.get("file_data") or part.get("fileData")
+                if media:
+                    ref = media.get("data") or media.get("file_uri") or media.get("fileUri") or ""
+                    audio_seed = int(hashlib.sha256(ref[-4096:].encode()).hexdigest()[:6], 16)
+        prompt = "\n".join(texts)
+        answer = synthetic_response(prompt, audio_seed)
+
+        prompt_tokens = count_tokens(prompt) + (500 if audio_seed is not None else 0)
+        output_tokens = count_tokens(answer)
+        self.state.delay(prompt_tokens + output_tokens)
+        self.state.account(m.group(1), prompt_tokens, output_tokens)
+        self._send(200, {
+            "candidates": [{"content": {"parts": [{"text": answer}], "role": "model"},
+                            "finishReason": "STOP", "index": 0}],
+            "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": output_tokens,
+                              "totalTokenCount": prompt_tokens + output_tokens},
+            "modelVersion": m.group(1),
+        })
+
+    # --- File API (upload resumable) ---
+    def _upload_start(self, body):
+        file_id = hashlib.sha1(f"{time.time_ns()}{id(body)}".encode()).hexdigest()[:12]
+        self.state.files[file_id] = {
+            "data": bytearray(), "mime": self.headers.get("X-Goog-Upload-Header-Content-Type", "audio/wav"),
+            "size": int(self.headers.get("X-Goog-Upload-Header-Content-Length") or 0),
+        }
+        host = self.headers.get("Host")
+        self._send(200, {}, {"X-Goog-Upload-URL": f"http://{host}/upload/session/{file_id}"})
+
+    def _upload_chunk(self, file_id, body):
+        f = self.state.files.get(file_id)
+        if f is None:
+            self._send(404, {})
+            return
+        command = self.headers.get("X-Goog-Upload-Command", "")
+        if command == "query":
+            self._send(200, {}, {"X-Goog-Upload-Size-Received": str(len(f["data"]))})
+            return
+        offset = int(self.headers.get("X-Goog-Upload-Offset") or 0)
+        if offset != len(f["data"]):
+            self._send(400, {"error": {"code": 400, "message": "offset inválido"}})
+            return
+        status = self.state.upload_faults.pop(offset, None)
+        if status:
+            f["data"] += body[:100]   # recebeu só uma parte antes de "cair"
+            self._send(status, {"error": {"code": status, "message": "falha injetada"}})
+            return
+        f["data"] += body
+        self._send(200, {"file": self._file_resource(file_id, f)} if "finalize" in command else {})
+
+    def _file_resource(self, file_id, f):
+        host = self.headers.get("Host")
+        return {"name": f"files/{file_id}", "uri": f"http://{host}/v1beta/files/{file_id}",
+                "mimeType": f["mime"], "sizeBytes": str(len(f["data"])), "state": "ACTIVE"}
+
+
+class MockGemini:
+    """Servidor em thread: with MockGemini(latency_ms=200) as mock: ... mock.base_url"""
+
+    def __init__(self, host="127.0.0.1", port=0, **state_kwargs):
+        self.state = MockState(**state_kwargs)
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.server.state = self.state
+        self.base_url = f"http://{host}:{self.server.server_port}"
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Mock local da API do Gemini")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8090)
+    ap.add_argument("--latency-ms", type=float, default=300)
+    ap.add_argument("--jitter-ms", type=float, default=100)
+    ap.add_argument("--ms-per-1k-tokens", type=float, default=50)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="Fração de 429 aleatórios")
+    ap.add_argument("--rpm", type=int, default=0, help="Limite de requisições/minuto (0 = sem limite)")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+
+    mock = MockGemini(args.host, args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                      ms_per_1k_tokens=args.ms_per_1k_tokens, error_rate=args.error_rate,
+                      rpm=args.rpm, seed=args.seed)
+    print(f"Mock Gemini em {mock.base_url} (GEMINI_API_BASE={mock.base_url})")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
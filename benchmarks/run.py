@@ -0,0 +1,230 @@
+"""
+Benchmarks do MEDUBS (backend + matchers do cliente) sobre um corpus sintético.
+
+    python benchmarks/run.py                      # roda tudo, grava benchmarks/results.json
+    python benchmarks/run.py --quick              # tamanhos menores (CI / smoke)
+    python benchmarks/run.py --only rag           # só os benchmarks cujo nome contém "rag"
+    python benchmarks/run.py --update-baseline    # grava o resultado como nova baseline
+
+Compara a mediana de cada benchmark com benchmarks/baseline.json (mesmos parâmetros)
+e sai com código 1 se algum ficou mais lento que baseline * --threshold.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [BENCH_DIR, os.path.join(ROOT, "backend"), os.path.join(ROOT, "src")]
+
+import corpus  # noqa: E402
+
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+RESULTS_PATH = os.path.join(BENCH_DIR, "results.json")
+DEFAULT_THRESHOLD = 1.3     # 30% mais lento = regressão
+MIN_DELTA_S = 0.002         # diferenças abaixo de 2ms são ruído
+
+BENCHMARKS = []
+
+
+def benchmark(name, **params):
+    """Registra fn(ctx, **params) -> callable medido. Parâmetros quick em params["quick"]."""
+    def decorator(fn):
+        BENCHMARKS.append((name, fn, params))
+        return fn
+    return decorator
+
+
+def measure(run, repeat, setup=None):
+    times = []
+    for _ in range(repeat + 1):          # 1ª rodada = aquecimento, descartada
+        if setup:
+            setup()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    times = times[1:]
+    return {"median_s": statistics.median(times), "min_s": min(times), "max_s": max(times), "runs": len(times)}
+
+
+# --- BACKEND ---
+
+@benchmark("parser_text_pdf", pages=10, table_density=0.2, quick={"pages": 3})
+@benchmark("parser_table_pdf", pages=10, table_density=0.9, quick={"pages": 3})
+@benchmark("parser_scanned_pdf", pages=10, table_density=0.5, scanned_pages=5, quick={"pages": 3, "scanned_pages": 2})
+def bench_parser(ctx, pages, table_density, scanned_pages=0):
+    import parser_core
+    data = corpus.medication_pdf(pages, table_density, scanned_pages)
+    parser = parser_core.HeuristicParser()
+    return {"run": lambda: parser.extract_optimized_context(data)}
+
+
+@benchmark("rag_search", files=30, size_kb=40, queries=20, quick={"files": 10, "size_kb": 20, "queries": 5})
+def bench_rag(ctx, files, size_kb, queries):
+    import main as backend_main
+    kb_dir = os.path.join(ctx["tmp"], f"kb_{files}_{size_kb}")
+    corpus.protocol_corpus(kb_dir, files, size_kb)
+    transcripts = [corpus.transcript(seed=i) for i in range(queries)]
+    return {"run": lambda: [backend_main.simple_rag_search(t, kb_dir) for t in transcripts]}
+
+
+@benchmark("rag_search_batch", files=30, size_kb=40, queries=20, quick={"files": 10, "size_kb": 20, "queries": 5})
+def bench_rag_batch(ctx, files, size_kb, queries):
+    import main as backend_main
+    kb_dir = os.path.join(ctx["tmp"], f"kb_{files}_{size_kb}")
+    corpus.protocol_corpus(kb_dir, files, size_kb)
+    transcripts = [corpus.transcript(seed=i) for i in range(queries)]
+    return {"run": lambda: backend_main.rag_search_batch(transcripts, kb_dir)}
+
+
+@benchmark("upsert_medicamento", items=300, quick={"items": 50})
+def bench_upsert(ctx, items):
+    import db_manager
+    rows = [(f"{n} {i}", conc, forma) for i in range(items // len(corpus.MEDICAMENTOS) + 1)
+            for n, conc, forma in corpus.MEDICAMENTOS][:items]
+
+    def setup():
+        db_manager.DB_PATH = os.path.join(ctx["tmp"], "bench.db")
+        if os.path.exists(db_manager.DB_PATH):
+            os.remove(db_manager.DB_PATH)
+        db_manager.init_db()
+
+    def run():
+        for nome, conc, forma in rows:
+            db_manager.upsert_medicamento(nome, conc, forma, "remume", "remume")
+
+    return {"run": run, "setup": setup}
+
+
+# --- CLIENTE (src/) ---
+
+def _catalog_sources():
+    data_dir = os.path.join(ROOT, "data")
+
+    def load(name):
+        with open(os.path.join(data_dir, name), encoding="utf-8") as f:
+            return json.load(f)
+
+    rename = [{"nome": it["nome"], "detalhes": it.get("detalhes", "")}
+              for g in load("db_rename.json") for it in g.get("itens", []) if it.get("nome")]
+    return {
+        "remume": [x["nome_completo"] for x in load("db_remume.json") if x.get("nome_completo")],
+        "rename": rename,
+        "alto_custo": [x["nome"] for x in load("db_alto_custo.json") if x.get("nome")],
+    }
+
+
+@benchmark("catalog_index_build")
+def bench_index_build(ctx):
+    import catalog_index
+    sources = _catalog_sources()
+    return {"run": lambda: catalog_index.CatalogIndex(sources)}
+
+
+@benchmark("catalog_check_batch", terms=300, quick={"terms": 60})
+def bench_check_batch(ctx, terms):
+    import catalog_index
+    sources = _catalog_sources()
+    index = catalog_index.CatalogIndex(sources)
+    names = sources["remume"] + sources["alto_custo"] + [r["nome"] for r in sources["rename"]]
+    query = corpus.query_terms(names, terms)
+    return {"run": lambda: index.check_batch(query)}
+
+
+@benchmark("med_parser_parse", terms=2000, quick={"terms": 300})
+def bench_med_parser(ctx, terms):
+    import med_parser
+    names = _catalog_sources()["remume"]
+    query = (names * (terms // len(names) + 1))[:terms]
+    return {"run": lambda: [med_parser.parse(t) for t in query]}
+
+
+# --- EXECUÇÃO / REGRESSÃO ---
+
+def run_all(quick=False, only=None, repeat=None):
+    repeat = repeat or (1 if quick else 3)
+    results = {}
+    tmp = tempfile.mkdtemp(prefix="medubs_bench_")
+    cwd = os.getcwd()
+    os.chdir(tmp)  # o backend cria knowledge_base/ e o .db no diretório atual
+    try:
+        ctx = {"tmp": tmp}
+        for name, fn, params in BENCHMARKS:
+            if only and only not in name:
+                continue
+            params = dict(params)
+            quick_params = params.pop("quick", {})
+            if quick:
+                params.update(quick_params)
+            case = fn(ctx, **params)
+            stats = measure(case["run"], repeat, case.get("setup"))
+            results[name] = {"params": params, **stats}
+            print(f"{name:<22} {stats['median_s'] * 1000:10.1f} ms  (min {stats['min_s'] * 1000:.1f}, {stats['runs']}x)")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp, ignore_errors=True)
+    return {
+        "meta": {
+            "python": platform.python_version(), "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "quick": quick,
+        },
+        "results": dict(sorted(results.items())),
+    }
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """[(nome, atual_s, baseline_s, razão)] dos benchmarks que ficaram mais lentos que o limite."""
+    regressions = []
+    for name, cur in results["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or base.get("params") != cur["params"]:
+            continue  # sem baseline comparável (benchmark novo ou tamanhos diferentes)
+        ratio = cur["median_s"] / base["median_s"] if base["median_s"] else float("inf")
+        if ratio > threshold and cur["median_s"] - base["median_s"] > MIN_DELTA_S:
+            regressions.append((name, cur["median_s"], base["median_s"], ratio))
+    return regressions
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmarks do MEDUBS")
+    ap.add_argument("--quick", action="store_true", help="Corpus menor, 1 repetição")
+    ap.add_argument("--only", help="Roda só benchmarks cujo nome contém este texto")
+    ap.add_argument("--repeat", type=int, help="Repetições medidas por benchmark")
+    ap.add_argument("--out", default=RESULTS_PATH)
+    ap.add_argument("--baseline", default=BASELINE_PATH)
+    ap.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    ap.add_argument("--update-baseline", action="store_true")
+    args = ap.parse_args(argv)
+
+    results = run_all(args.quick, args.only, args.repeat)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"Resultados: {args.out}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"Baseline atualizada: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("Sem baseline para comparar (use --update-baseline).")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    for name, cur, base, ratio in regressions:
+        print(f"REGRESSÃO {name}: {cur * 1000:.1f} ms vs baseline {base * 1000:.1f} ms ({ratio:.2f}x)")
+    if not regressions:
+        print(f"Sem regressões (limite {args.threshold:.2f}x).")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
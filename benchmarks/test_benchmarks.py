@@ -0,0 +1,20 @@
+import corpus
+import run
+
+
+def test_corpus_pdf_has_tables_and_scanned_pages():
+    import parser_core
+    data = corpus.medication_pdf(pages=4, table_density=0.5, scanned_pages=2, seed=1)
+    assert data == corpus.medication_pdf(pages=4, table_density=0.5, scanned_pages=2, seed=1)
+    text = parser_core.HeuristicParser().extract_optimized_context(data)
+    assert text.count("[TABELA PÁGINA") == 2  # páginas escaneadas não têm texto
+    assert "Medicamento | Concentração | Forma | Componente" in text
+
+
+def test_compare_flags_only_comparable_regressions():
+    def res(**cases):
+        return {"results": {n: {"params": p, "median_s": t} for n, (p, t) in cases.items()}}
+
+    baseline = res(a=({"n": 1}, 0.100), b=({"n": 1}, 0.100), c=({"n": 2}, 0.100), d=({}, 0.0001))
+    current = res(a=({"n": 1}, 0.200), b=({"n": 1}, 0.110), c=({"n": 1}, 0.500), d=({}, 0.001), e=({}, 9.0))
+    assert [r[0] for r in run.compare(current, baseline, threshold=1.3)] == ["a"]
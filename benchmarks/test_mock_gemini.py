@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+import run  # noqa: F401  (coloca backend/ e src/ no sys.path)
+import load_test
+from mock_gemini import MockGemini
+
+
+def test_src_client_against_mock_inline_and_upload(tmp_path, monkeypatch):
+    import gemini_client
+    audio = tmp_path / "consulta.wav"
+    audio.write_bytes(b"RIFF" + bytes(range(256)) * 64)
+
+    with MockGemini() as mock:
+        inline = gemini_client.generate_content("mock", "Gere o SOAP em JSON", str(audio),
+                                                json_output=True, base_url=mock.base_url)
+        monkeypatch.setattr(gemini_client, "INLINE_MAX_BYTES", 1024)  # força o upload resumable
+        uploaded = gemini_client.generate_content("mock", "Gere o SOAP em JSON", str(audio),
+                                                  json_output=True, base_url=mock.base_url)
+        stats = mock.state.stats
+
+    assert "soap" in json.loads(gemini_client.response_text(inline))
+    assert "soap" in json.loads(gemini_client.response_text(uploaded))
+    assert stats["ok"] == 2 and stats["prompt_tokens"] > 1000
+
+
+def test_backend_genai_rest_against_mock_and_429(monkeypatch):
+    from google.api_core import exceptions as google_exceptions
+    import main as backend_main
+
+    with MockGemini(rpm=1) as mock:
+        monkeypatch.setattr(backend_main, "GEMINI_API_BASE", mock.base_url)
+        backend_main.configure_genai("mock")
+        model = backend_main.genai.GenerativeModel("gemini-1.5-flash")
+        prompt = 'Extraia TODOS os medicamentos de "remume" e devolva um JSON ARRAY. Texto: Amoxicilina 500mg'
+        first = json.loads(model.generate_content(prompt).text)
+        with pytest.raises(google_exceptions.TooManyRequests):
+            model.generate_content(prompt)   # rpm=1 estourado
+        stats = mock.state.stats
+
+    assert first[0]["nome"] == "Amoxicilina" and first[0]["lista_origem"] == "remume"
+    assert stats["requests"] == 2 and stats["throttled"] == 1
+
+
+def test_percentile_and_summary():
+    assert load_test.percentile([], 50) is None
+    assert load_test.percentile([10, 20, 30, 40], 50) == 25
+    assert load_test.percentile([5], 99) == 5
+    samples = [("consultar-ia", 0.1, True), ("consultar-ia", 0.3, False), ("upload-medicamento", 1.0, True)]
+    report = load_test.summarize(samples, elapsed=2.0)
+    assert report["consultar-ia"]["errors"] == 1 and report["consultar-ia"]["p50_ms"] == 200.0
+    assert report["total"]["requests"] == 3 and report["total"]["throughput_rps"] == 1.5
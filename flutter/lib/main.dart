@@ -302,6 +302,10 @@ class _MainScreenState extends State<MainScreen> {
                timerText.value = "Concluído!";
                addLog("✅ ${event['debug']?['mode'] ?? 'Processamento'} Finalizado.");
             }
+            else if (status == 'sem_chave') {
+               // Servidor reiniciou no meio: a chave não fica salva lá (POST /jobs/{id}/chave retoma)
+               addLog("🔑 ${event['detail']}");
+            }
             else if (status == 'error') {
                addLog("❌ Erro: ${event['detail']}");
                // Don't throw immediately, let user see log?
@@ -15,7 +15,7 @@ class ApiService {
         lastResult = item;
       }
       // Check for error
-      if (item['status'] == 'error') {
+      if (item['status'] == 'error' || item['status'] == 'sem_chave') {
          throw Exception(item['detail'] ?? 'Erro desconhecido');
       }
        if (item['status'] == 'heuristic_failed') {
@@ -76,6 +76,47 @@ class ApiService {
     }
   }
 
+  /// Delta Sync: busca só os medicamentos alterados depois de [since].
+  /// Retorna null quando o servidor responde 304 (ETag igual, nada mudou).
+  static Future<Map<String, dynamic>?> medicamentosChanges(int since, {String? etag, int limit = 500}) async {
+    var uri = Uri.parse('$baseUrl/medicamentos/changes?since=$since&limit=$limit');
+
+    try {
+      var response = await http.get(
+        uri,
+        headers: {if (etag != null) 'If-None-Match': etag},
+      );
+
+      if (response.statusCode == 304) {
+        return null;
+      }
+      if (response.statusCode == 200) {
+        Map<String, dynamic> body = json.decode(utf8.decode(response.bodyBytes));
+        body['etag'] = response.headers['etag'];
+        return body;
+      }
+      throw Exception('Falha no sync: ${response.statusCode} ${response.body}');
+    } catch (e) {
+      throw Exception('Erro de conexão: $e');
+    }
+  }
+
+  /// Medicamentos do Alto Custo autorizados (LME) para um CID.
+  /// [prefixo] = true busca a categoria inteira ("M05" -> M050, M051, ...).
+  static Future<List<dynamic>> altoCustoPorCid(String cid, {bool prefixo = false}) async {
+    var uri = Uri.parse('$baseUrl/catalogo/cid/${Uri.encodeComponent(cid)}?prefixo=$prefixo');
+
+    try {
+      var response = await http.get(uri);
+      if (response.statusCode == 200) {
+        return json.decode(utf8.decode(response.bodyBytes))['items'];
+      }
+      throw Exception('Falha na consulta de CID: ${response.statusCode} ${response.body}');
+    } catch (e) {
+      throw Exception('Erro de conexão: $e');
+    }
+  }
+
   static Future<Map<String, dynamic>> consultarIA(String transcricao, String apiKey, {String model = 'gemini-1.5-flash'}) async {
     var uri = Uri.parse('$baseUrl/consultar-ia');
     
@@ -1,11 +1,30 @@
-import flet as ft
+import os
 import sys
+import time
+
+# Mesmo perfil de cold start do app (src/startup_profile.py, MEDUBS_PROFILE_STARTUP=1).
+# Safe mode: se o módulo não vier no pacote, segue sem perfil.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+try:
+    import startup_profile
+    startup_profile.install()
+except Exception:
+    startup_profile = None
+
+import flet as ft
 
 # ANDROID SAFE MODE
-# Sem imports pesados (requests/unidecode) no topo
+# Sem imports pesados (requests/unidecode) no topo: só carregam no clique do botão
 # Apenas Interface Nativa Pura para testar se o Flet carrega
 
+def mark(label):
+    if startup_profile:
+        startup_profile.mark(label)
+
+mark("imports do main_android.py")
+
 def main(page: ft.Page):
+    mark("main() chamado")
     page.title = "Android Debug"
     page.bgcolor = "white"
     
@@ -15,8 +34,9 @@ def main(page: ft.Page):
         try:
             lbl_status.value = "Carregando Requests..."
             page.update()
+            start = time.perf_counter()
             import requests
-            lbl_status.value = f"Requests OK: {requests.__version__}"
+            lbl_status.value = f"Requests OK: {requests.__version__} ({(time.perf_counter() - start) * 1000:.0f} ms)"
             lbl_status.color = "green"
             page.update()
         except Exception as ex:
@@ -39,6 +59,11 @@ def main(page: ft.Page):
             horizontal_alignment="center"
         )
     )
+    # page.add já faz o primeiro update
+    mark("primeiro page.update")
+    if startup_profile and startup_profile.ENABLED:
+        import app_storage
+        startup_profile.finish(app_storage.data_path("startup_profile.txt"))
 
 if __name__ == "__main__":
     ft.app(target=main)
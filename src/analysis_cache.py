@@ -0,0 +1,84 @@
+import json
+import time
+import sqlite3
+import hashlib
+from contextlib import contextmanager
+
+# Cache local de análises: apertar "Processar" de novo no mesmo áudio não
+# reenvia (nem recobra) o arquivo. Chave = (hash do áudio, versão do prompt, modelo).
+# Limitado por número de entradas e bytes, com despejo LRU.
+
+MAX_ENTRIES = 50
+MAX_BYTES = 5 * 1024 * 1024
+
+
+def file_sha256(path) -> str:
+    """Hash em streaming (não carrega o áudio inteiro)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def make_key(audio_hash, prompt_version, model) -> str:
+    return hashlib.sha256(f"{audio_hash}:{prompt_version}:{model}".encode()).hexdigest()
+
+
+class AnalysisCache:
+    def __init__(self, db_path, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS analises (
+                    chave TEXT PRIMARY KEY,
+                    resultado TEXT NOT NULL,
+                    tamanho INTEGER NOT NULL,
+                    ultimo_uso REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_analises_uso ON analises (ultimo_uso)')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        try:
+            with conn:  # commit/rollback
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        with self._connect() as conn:
+            row = conn.execute("SELECT resultado FROM analises WHERE chave = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE analises SET ultimo_uso = ? WHERE chave = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, result: dict):
+        payload = json.dumps(result, ensure_ascii=False)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO analises (chave, resultado, tamanho, ultimo_uso) VALUES (?, ?, ?, ?)",
+                (key, payload, len(payload.encode("utf-8")), time.time())
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(tamanho), 0) FROM analises").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # Remove os menos usados até caber (sempre mantém a entrada mais recente)
+        for chave, tamanho in conn.execute("SELECT chave, tamanho FROM analises ORDER BY ultimo_uso").fetchall()[:-1]:
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM analises WHERE chave = ?", (chave,))
+            count -= 1
+            total -= tamanho
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM analises").fetchone()[0]
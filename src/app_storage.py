@@ -0,0 +1,18 @@
+import os
+
+# Diretório gravável do app. No Android o Flet expõe FLET_APP_STORAGE_DATA
+# (pasta privada do app); no desktop cai para ~/.swift_gemini.
+
+APP_DIR_NAME = ".swift_gemini"
+
+
+def data_dir() -> str:
+    base = os.environ.get("FLET_APP_STORAGE_DATA") or os.path.join(os.path.expanduser("~"), APP_DIR_NAME)
+    os.makedirs(base, exist_ok=True)
+    return base
+
+
+def data_path(*parts) -> str:
+    path = os.path.join(data_dir(), *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
@@ -0,0 +1,198 @@
+import os
+import wave
+import tempfile
+
+# Pré-processamento do áudio antes do upload para o Gemini:
+#   estéreo -> mono, 44.1kHz -> 16kHz e pausas longas encurtadas (VAD por energia).
+# Modelo de fala não precisa de 44.1kHz; consulta tem muito silêncio. Resultado
+# típico: 3-5x menos bytes (e tokens de áudio) para a mesma consulta.
+# Sem numpy (ex.: APK) ou formato não-WAV: devolve o arquivo original.
+# O WAV gerado vai para um arquivo temporário (nunca ao lado do original, que pode
+# estar numa pasta do usuário ou só de leitura): quem chama apaga com cleanup().
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+TARGET_RATE = 16000
+FRAME_MS = 30            # janela do VAD
+MIN_SILENCE_S = 1.0      # silêncios maiores que isso são encurtados...
+KEEP_SILENCE_S = 0.3     # ...para isso (mantém o ritmo da fala)
+BLOCK_SECONDS = 30       # leitura em blocos (não carrega o WAV de 44.1kHz inteiro)
+FIR_TAPS = 63
+
+# Extensão -> mime aceito pelo Gemini (arquivo enviado sem pré-processamento)
+MIME_TYPES = {
+    ".wav": "audio/wav", ".mp3": "audio/mp3", ".m4a": "audio/mp4", ".mp4": "audio/mp4",
+    ".aac": "audio/aac", ".ogg": "audio/ogg", ".oga": "audio/ogg", ".opus": "audio/ogg",
+    ".flac": "audio/flac", ".aiff": "audio/aiff", ".aif": "audio/aiff", ".webm": "audio/webm",
+}
+
+
+def mime_type(path) -> str:
+    return MIME_TYPES.get(os.path.splitext(str(path))[1].lower(), "audio/mp3")
+
+_DTYPES = {1: "uint8", 2: "<i2", 4: "<i4"}
+
+
+def _lowpass(cutoff, taps=FIR_TAPS):
+    """FIR sinc janelado (Hamming); cutoff em fração da taxa de amostragem."""
+    n = np.arange(taps) - (taps - 1) / 2
+    h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(taps)
+    return (h / h.sum()).astype(np.float32)
+
+
+def _to_float(raw, sampwidth, channels):
+    data = np.frombuffer(raw, dtype=_DTYPES[sampwidth]).astype(np.float32)
+    if sampwidth == 1:
+        data = (data - 128.0) / 128.0
+    else:
+        data /= float(2 ** (8 * sampwidth - 1))
+    if channels > 1:
+        data = data[:len(data) - len(data) % channels].reshape(-1, channels).mean(axis=1)
+    return data
+
+
+def resample_wav(path, target_rate=TARGET_RATE):
+    """Lê o WAV em blocos: downmix + anti-aliasing + interpolação -> float32 mono em target_rate."""
+    with wave.open(path, "rb") as wav:
+        channels, sampwidth, rate = wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+        if sampwidth not in _DTYPES:
+            raise ValueError(f"WAV de {8 * sampwidth} bits não suportado")
+
+        step = rate / target_rate
+        fir = _lowpass(0.45 / step) if step > 1 else None
+        history = np.zeros(FIR_TAPS - 1 if fir is not None else 0, dtype=np.float32)
+        consumed = 0   # amostras filtradas já emitidas antes do bloco atual
+        next_pos = 0.0  # posição (no sinal de entrada) da próxima amostra de saída
+        tail = np.zeros(0, dtype=np.float32)
+        out = []
+
+        while True:
+            raw = wav.readframes(int(rate * BLOCK_SECONDS))
+            if not raw:
+                break
+            block = _to_float(raw, sampwidth, channels)
+            if fir is not None:
+                padded = np.concatenate([history, block])
+                history = padded[-(FIR_TAPS - 1):]
+                block = np.convolve(padded, fir, mode="valid").astype(np.float32)
+
+            # `tail` guarda a última amostra do bloco anterior para interpolar na fronteira
+            signal = np.concatenate([tail, block])
+            base = consumed - len(tail)
+            last = base + len(signal) - 1
+            if next_pos <= last:
+                positions = np.arange(next_pos, last, step) if last > next_pos else np.array([next_pos])
+                out.append(np.interp(positions - base, np.arange(len(signal)), signal).astype(np.float32))
+                next_pos = positions[-1] + step
+            consumed += len(block)
+            tail = signal[-1:]
+
+    return (np.concatenate(out) if out else np.zeros(0, dtype=np.float32)), target_rate
+
+
+def frame_energies(samples, rate, frame_ms=FRAME_MS):
+    """Energia (dBFS) por frame de frame_ms: (array_db, amostras_por_frame)."""
+    frame = int(rate * frame_ms / 1000)
+    n = len(samples) // frame
+    if n == 0:
+        return np.zeros(0, dtype=np.float32), frame
+    frames = samples[:n * frame].reshape(n, frame)
+    return 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-12), frame
+
+
+def voiced_mask(samples, rate, frame_ms=FRAME_MS):
+    """VAD por energia: frame com voz se RMS acima do piso de ruído + 12 dB (mínimo -50 dBFS)."""
+    db, frame = frame_energies(samples, rate, frame_ms)
+    if not len(db):
+        return np.ones(0, dtype=bool), frame
+    noise_floor = np.percentile(db, 10)
+    return db > max(noise_floor + 12.0, -50.0), frame
+
+
+def trim_silence(samples, rate, min_silence_s=MIN_SILENCE_S, keep_silence_s=KEEP_SILENCE_S):
+    """Encurta cada trecho de silêncio maior que min_silence_s para keep_silence_s."""
+    voiced, frame = voiced_mask(samples, rate)
+    if not len(voiced) or not voiced.any():
+        return samples
+
+    keep = np.ones(len(samples), dtype=bool)
+    min_frames = int(min_silence_s * 1000 / FRAME_MS)
+    half_keep = int(keep_silence_s * rate / 2)
+
+    # Fronteiras dos trechos silenciosos (frames consecutivos sem voz)
+    edges = np.diff(np.concatenate([[1], voiced.astype(np.int8), [1]]))
+    for start, end in zip(np.flatnonzero(edges == -1), np.flatnonzero(edges == 1)):
+        if end - start >= min_frames:
+            a, b = start * frame + half_keep, end * frame - half_keep
+            if b > a:
+                keep[a:b] = False
+    return samples[keep]
+
+
+def write_wav(path, samples, rate):
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(pcm.tobytes())
+
+
+def preprocess(path, out_path=None, target_rate=TARGET_RATE, trim=True) -> dict:
+    """
+    Gera um WAV mono 16kHz sem pausas longas e devolve o relatório:
+    {"path", "mime_type", "skipped", "in_bytes", "out_bytes", "ratio", "in_seconds", "out_seconds"}.
+    Sem `out_path`, o WAV sai num arquivo temporário (report["temp"] = True).
+    """
+    in_bytes = os.path.getsize(path)
+    report = {"path": path, "mime_type": mime_type(path), "skipped": None, "temp": False,
+              "in_bytes": in_bytes, "out_bytes": in_bytes, "ratio": 1.0}
+    if np is None:
+        report["skipped"] = "numpy indisponível"
+        return report
+    if not path.lower().endswith(".wav"):
+        report["skipped"] = "formato não-WAV (enviado sem alteração)"
+        return report
+
+    temp = out_path is None
+    try:
+        with wave.open(path, "rb") as wav:
+            report["in_seconds"] = round(wav.getnframes() / wav.getframerate(), 1)
+        samples, rate = resample_wav(path, target_rate)
+        if trim:
+            samples = trim_silence(samples, rate)
+
+        if temp:
+            fd, out_path = tempfile.mkstemp(suffix=f"_{rate // 1000}k.wav", prefix="medubs_")
+            os.close(fd)
+        write_wav(out_path, samples, rate)
+    except (wave.Error, ValueError, EOFError, OSError) as e:
+        # Sem espaço/permissão também cai aqui: vai o original
+        print(f"Pré-processamento ignorado ({path}): {e}")
+        if temp and out_path:
+            cleanup({"path": out_path, "temp": True})
+        report["skipped"] = str(e)
+        return report
+
+    out_bytes = os.path.getsize(out_path)
+    report.update({
+        "path": out_path,
+        "mime_type": "audio/wav",
+        "temp": temp,
+        "out_bytes": out_bytes,
+        "ratio": round(in_bytes / max(out_bytes, 1), 2),
+        "out_seconds": round(len(samples) / rate, 1),
+    })
+    return report
+
+
+def cleanup(report):
+    """Apaga o WAV temporário gerado por preprocess (o original nunca é tocado)."""
+    if report.get("temp"):
+        try:
+            os.remove(report["path"])
+        except OSError:
+            pass
@@ -0,0 +1,88 @@
+import os
+import json
+import hashlib
+import threading
+from collections import namedtuple
+
+import catalog_index
+
+# Catálogo em cache no processo, invalidado por arquivo:
+#   1. stat() a cada acesso (barato): (mtime_ns, tamanho) iguais -> reaproveita
+#   2. mtime mudou -> sha256; conteúdo igual (ex.: `touch`, checkout) -> reaproveita
+#   3. conteúdo mudou -> reparseia só aquela lista e reconstrói o índice
+
+CatalogSnapshot = namedtuple("CatalogSnapshot", ["names", "index", "errors", "version"])
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class CatalogCache:
+    """
+    `files`: {lista: caminho do JSON}
+    `parsers`: {lista: fn(dados_json) -> [entradas para o catalog_index]}
+    """
+
+    def __init__(self, files, parsers):
+        self.files = dict(files)
+        self.parsers = parsers
+        self._lock = threading.Lock()
+        self._stamps = {}   # lista -> (mtime_ns, size)
+        self._hashes = {}   # lista -> sha256
+        self._entries = {}  # lista -> entradas parseadas
+        self._errors = {}
+        self._snapshot = None
+        self.version = 0    # incrementa a cada reconstrução do índice
+
+    def _stamp(self, path):
+        try:
+            st = os.stat(path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _refresh(self, lista, path) -> bool:
+        """Recarrega a lista se o arquivo mudou. Retorna True se o conteúdo mudou."""
+        stamp = self._stamp(path)
+        if stamp is not None and stamp == self._stamps.get(lista):
+            return False
+        self._stamps[lista] = stamp
+
+        if stamp is None:
+            changed = lista in self._hashes or lista not in self._entries
+            self._hashes.pop(lista, None)
+            self._entries[lista] = []
+            return changed
+
+        try:
+            digest = _sha256(path)
+            if digest == self._hashes.get(lista):
+                return False  # só o mtime mudou
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._entries[lista] = self.parsers[lista](data)
+            self._hashes[lista] = digest
+            self._errors.pop(lista, None)
+        except Exception as e:
+            print(f"Erro ao ler {path}: {e}")
+            self._errors[lista] = str(e)
+            self._entries.setdefault(lista, [])
+        return True
+
+    def get(self) -> CatalogSnapshot:
+        with self._lock:
+            changed = False
+            for lista, path in self.files.items():
+                changed = self._refresh(lista, path) or changed
+            if changed or self._snapshot is None:
+                self.version += 1
+                index = catalog_index.CatalogIndex(self._entries)
+                names = {lista: [e["nome"] if isinstance(e, dict) else e for e in entries]
+                         for lista, entries in self._entries.items()}
+                self._snapshot = CatalogSnapshot(names, index, dict(self._errors), self.version)
+            return self._snapshot
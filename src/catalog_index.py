@@ -0,0 +1,260 @@
+import re
+import threading
+from unidecode import unidecode
+from med_matcher import Matcher, TrigramIndex
+import med_parser
+
+# Índice do catálogo em memória (processo inteiro).
+# Antes cada checagem relia e re-normalizava os 3 JSONs; agora isso é feito
+# uma única vez (em background no startup) e todas as buscas reutilizam.
+
+LISTS = ("remume", "rename", "alto_custo")
+# Encontrado, mas não na apresentação pedida (a tela mostra a ressalva)
+NAO_EXATO = {"dose_diferente": "outra dose", "forma_diferente": "outra forma"}
+FUZZY_THRESHOLD = 0.65 # Dice mínimo para sugerir um item por similaridade / cobertura mínima de substring
+MAX_TYPO_EDITS = 1     # edições por palavra do princípio ativo aceitas numa sugestão
+
+
+def normalize(text) -> str:
+    return unidecode(str(text)).lower().strip()
+
+
+_DOSE_WORDS = {"mg", "mcg", "g", "ml", "ui", "comp", "cp", "caps", "amp", "ampola", "frasco", "gotas", "xarope"}
+
+
+def drug_part(norm) -> str:
+    """"dipirona sodica 500mg comp" -> "dipirona sodica" (descarta dose/forma, que diluem o score)."""
+    words = [w for w in norm.split() if not w[0].isdigit() and w.strip(",.()") not in _DOSE_WORDS]
+    return " ".join(words) or norm
+
+
+def _short_words_ok(term_part, match_part) -> bool:
+    # "vitamina d" não pode casar com "vitamina b2" só porque "vitamina" domina o score:
+    # palavras curtas do termo (letra de vitamina, "b", "c"...) precisam existir no candidato
+    short = {w for w in term_part.split() if len(w) <= 2}
+    return short <= set(match_part.split())
+
+
+def edit_distance(a, b) -> int:
+    """Levenshtein com transposição de vizinhos ("amoxicilna" -> "amoxicilina" = 1)."""
+    prev2, prev = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+def _typo_only(term_ing, match_ing) -> bool:
+    # Similar só vale como erro de digitação no princípio ativo: "prednisolona" x "prednisona"
+    # e "acido folico" x "acido folinico" têm trigramas parecidos mas são outro fármaco
+    a, b = term_ing.split(), match_ing.split()
+    return len(a) == len(b) and all(edit_distance(x, y) <= MAX_TYPO_EDITS for x, y in zip(a, b))
+
+
+def _token_prefix(short, long) -> bool:
+    """`short` aparece em `long` começando numa palavra ("ferro" não vale em "desferroxamina")."""
+    return re.search(r'(?<![a-z0-9])' + re.escape(short), long) is not None
+
+
+class ListIndex:
+    """Uma lista (REMUME/RENAME/Alto Custo) pré-normalizada + motor de matching."""
+
+    def __init__(self, entries):
+        self.originals = []
+        self.norms = []
+        self.keys = []
+        # Índices hash sobre a apresentação estruturada (med_parser)
+        self.by_ingrediente = {}
+        self.by_dose = {}
+        self.by_ing_forma = {}
+        for entry in entries:
+            # Entrada pode ser só o nome ou {"nome", "detalhes"} (RENAME guarda a dose em detalhes)
+            if isinstance(entry, dict):
+                name, detalhes = entry.get("nome", ""), entry.get("detalhes", "")
+            else:
+                name, detalhes = entry, ""
+            if not name:
+                continue
+            idx = len(self.originals)
+            self.originals.append(name)
+            self.norms.append(normalize(name))
+
+            key = med_parser.parse(name, detalhes)
+            self.keys.append(key)
+            if key.ingrediente:
+                self.by_ingrediente.setdefault(key.ingrediente, []).append(idx)
+                self.by_ing_forma.setdefault((key.ingrediente, key.forma), []).append(idx)
+                # Todas as doses da entrada ("Metformina 500mg, 850mg" atende as duas)
+                for dose in dict.fromkeys(key.doses):
+                    self.by_dose.setdefault((key.ingrediente, dose), []).append(idx)
+        self.matcher = Matcher(self.norms)
+        # Similaridade só sobre o nome do fármaco (sem dose/forma, que diluem o score)
+        self.drug_parts = [drug_part(n) for n in self.norms]
+        self.trigrams = TrigramIndex(self.drug_parts)
+
+    def __len__(self):
+        return len(self.norms)
+
+    def rank(self, term, top_n=5, threshold=FUZZY_THRESHOLD):
+        """Melhores candidatos (substring + similaridade): [{"match", "score"}, ...]."""
+        term_norm = normalize(term)
+        scores = dict((idx, s) for s, idx in self.trigrams.top_batch([drug_part(term_norm)], top_n, threshold)[0])
+        for s, idx in self.matcher.rank(term_norm, top_n):
+            scores[idx] = max(s, scores.get(idx, 0))
+        ranked = sorted(scores.items(), key=lambda x: (-x[1], x[0]))[:top_n]
+        return [{"match": self.originals[idx], "score": round(s, 3)} for idx, s in ranked]
+
+    def check_batch(self, terms, threshold=FUZZY_THRESHOLD):
+        """
+        Melhor match de cada termo: {"found", "match", "score", "tipo"}; sem match, pode
+        vir {"found": False, "sugestao": {"match", "score", "tipo": "similar"}}.
+        Similaridade de todos os termos é calculada numa passada só (TrigramIndex).
+        """
+        terms_norm = [normalize(t) for t in terms]
+        results = [None] * len(terms)
+
+        # 1. Nome idêntico ou chave estruturada (princípio ativo/dose/forma): O(1)
+        pending = []
+        for i, (term, term_norm) in enumerate(zip(terms, terms_norm)):
+            if term_norm in self.matcher.exact:
+                results[i] = self._hit(1.0, self.matcher.exact[term_norm], "exato")
+                continue
+            hit = self.lookup_key(term)
+            if hit:
+                results[i] = self._hit(*hit)
+            else:
+                pending.append(i)
+
+        # 2. Fallback: substring (Aho-Corasick) + similaridade de trigramas numa passada só.
+        # Substring só conta como encontrado se cobre boa parte do nome; similaridade
+        # nunca marca "found": vira sugestão ("você quis dizer") para o médico conferir.
+        parts = [drug_part(terms_norm[i]) for i in pending]
+        fuzzy = self.trigrams.top_batch(parts, top_n=3, threshold=threshold) if pending else []
+        for i, part, candidates in zip(pending, parts, fuzzy):
+            partial = self._partial(terms_norm[i], part, threshold)
+            if partial:
+                results[i] = self._hit(*partial, "parcial")
+                continue
+            results[i] = {"found": False, "match": None}
+            term_ing = med_parser.parse(terms[i]).ingrediente or part
+            for score, idx in candidates:
+                if _short_words_ok(part, self.drug_parts[idx]) and \
+                        _typo_only(term_ing, self.keys[idx].ingrediente or self.drug_parts[idx]):
+                    results[i]["sugestao"] = {"match": self.originals[idx], "score": round(score, 3), "tipo": "similar"}
+                    break
+        return results
+
+    def _partial(self, term_norm, part, threshold):
+        """(score, idx) do melhor item que contém o termo (ou está contido nele) em fronteira de palavra."""
+        for _, idx in self.matcher.rank(term_norm, top_n=5):
+            short, long = sorted((part, self.drug_parts[idx]), key=len)
+            if not short or not _token_prefix(short, long):
+                continue
+            score = len(short) / len(long)
+            if score >= threshold:
+                return score, idx
+        return None
+
+    def _hit(self, score, idx, tipo):
+        return {"found": True, "match": self.originals[idx], "score": round(score, 3), "tipo": tipo}
+
+    def lookup_key(self, term):
+        """
+        Lookup por chave estruturada. Retorna (score, idx, tipo) ou None.
+        Mesmo princípio ativo em outra dose/forma ainda conta, mas com tipo
+        "dose_diferente"/"forma_diferente" (score menor) para aparecer na tela.
+        """
+        key = med_parser.parse(term)
+        ids = self.by_ingrediente.get(key.ingrediente) if key.ingrediente else None
+        if not ids:
+            return None
+        if not key.doses:
+            # Sem dose no termo: nunca é exato, mas a forma ainda precisa bater
+            if not key.forma:
+                return 0.95, ids[0], "chave"
+            same_form = self._with_form(ids, key.forma)
+            return (0.95, same_form, "chave") if same_form is not None else (0.85, ids[0], "forma_diferente")
+        for dose in key.doses:
+            same_dose = self.by_dose.get((key.ingrediente, dose))
+            if not same_dose:
+                continue
+            if not key.forma:
+                return 1.0, same_dose[0], "chave"
+            same_form = self._with_form(same_dose, key.forma)
+            return (1.0, same_form, "chave") if same_form is not None else (0.9, same_dose[0], "forma_diferente")
+        return 0.9, ids[0], "dose_diferente"
+
+    def _with_form(self, ids, forma):
+        """Primeiro item com a mesma forma; entrada sem forma no catálogo ("Losartana 50mg") é compatível."""
+        for idx in ids:
+            if self.keys[idx].forma == forma:
+                return idx
+        for idx in ids:
+            if not self.keys[idx].forma:
+                return idx
+        return None
+
+    def search(self, term):
+        """Melhor match (não mais o primeiro da lista)."""
+        return self.check_batch([term])[0]
+
+
+class CatalogIndex:
+    def __init__(self, sources: dict):
+        self.lists = {name: ListIndex(sources.get(name, [])) for name in LISTS}
+
+    def search(self, list_name, term):
+        return self.lists[list_name].search(term)
+
+    def check_batch(self, terms):
+        """Receita inteira de uma vez: [{"remume": {...}, "rename": {...}, "alto_custo": {...}}, ...]."""
+        per_list = {name: idx.check_batch(terms) for name, idx in self.lists.items()}
+        return [{name: per_list[name][i] for name in LISTS} for i in range(len(terms))]
+
+    def fuzzy_top(self, terms, top_n=3, threshold=FUZZY_THRESHOLD):
+        """Top-N por similaridade (Dice de trigramas) em cada lista."""
+        out = {}
+        for name, idx in self.lists.items():
+            batch = idx.trigrams.top_batch([drug_part(normalize(t)) for t in terms], top_n, threshold)
+            out[name] = [[{"match": idx.originals[i], "score": round(s, 3)} for s, i in row] for row in batch]
+        return out
+
+    def counts(self):
+        return {name: len(idx) for name, idx in self.lists.items()}
+
+
+# --- SINGLETON DO PROCESSO ---
+_index = None
+_lock = threading.Lock()
+
+
+def get_index(loader) -> CatalogIndex:
+    """
+    Retorna o índice do processo, construindo na primeira chamada.
+    `loader()` deve devolver {"remume": [nomes], "rename": [...], "alto_custo": [...]}.
+    """
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                _index = CatalogIndex(loader())
+    return _index
+
+
+def warm_up(loader):
+    """Constrói o índice numa thread de fundo (chamar no startup do app)."""
+    t = threading.Thread(target=get_index, args=(loader,), daemon=True)
+    t.start()
+    return t
+
+
+def reset():
+    """Descarta o índice (ex.: catálogo atualizado)."""
+    global _index
+    with _lock:
+        _index = None
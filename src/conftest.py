@@ -0,0 +1,86 @@
+import os
+import sys
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Servidores locais dos testes do cliente:
+#   - stub_server: HTTP genérico; a resposta de cada teste vem de uma função respond(req)
+#   - mock_gemini: o mock de benchmarks/mock_gemini.py (generateContent + File API,
+#     com 429/503/conexão derrubada injetados via `faults` e `upload_faults`)
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks")
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive, como o backend real
+
+    def _handle(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.json = json.loads(self.rfile.read(length)) if length else None
+        self.server.requests.append(self)
+        status, payload = self.server.respond(self)
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = _handle
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer:
+    """Servidor em thread. respond(req) -> (status, payload); req.command/.path/.json/.client_address."""
+
+    def __init__(self, respond):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+        self.server.daemon_threads = True
+        self.server.respond = respond
+        self.server.requests = []
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def requests(self):
+        return self.server.requests
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_server():
+    """Fábrica: stub_server(respond) -> StubServer rodando (parado no fim do teste)."""
+    servers = []
+
+    def start(respond):
+        servers.append(StubServer(respond))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def mock_gemini():
+    """Fábrica: mock_gemini(**MockState) -> MockGemini rodando (parado no fim do teste)."""
+    if BENCHMARKS_DIR not in sys.path:
+        sys.path.insert(0, BENCHMARKS_DIR)
+    from mock_gemini import MockGemini
+    mocks = []
+
+    def start(**state_kwargs):
+        mocks.append(MockGemini(**state_kwargs).start())
+        return mocks[-1]
+
+    yield start
+    for mock in mocks:
+        mock.stop()
@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import base64
+
+import requests
+
+import http_client
+
+# Cliente REST do Gemini para os apps (Flet/Streamlit), com foco em memória no Android:
+#   - áudio pequeno: inline_data, mas o base64 é gerado em streaming direto no corpo
+#     da requisição (antes: bytes do arquivo + string base64 + JSON = 3 cópias inteiras)
+#   - áudio grande: File API com upload resumable em chunks (retoma do offset
+#     confirmado pelo servidor se a conexão cair) e referência via file_data
+#   - sessão compartilhada do http_client (keep-alive + pool) para todas as chamadas
+
+GEMINI_API_BASE = os.environ.get("GEMINI_API_BASE", "https://generativelanguage.googleapis.com")
+
+INLINE_MAX_BYTES = 8 * 1024 * 1024    # acima disso: upload resumable (limite inline do Gemini ~20MB)
+UPLOAD_CHUNK = 8 * 1024 * 1024        # múltiplo de 256KiB (exigência do protocolo)
+_B64_READ = 3 * 64 * 1024             # múltiplo de 3: base64 por pedaço sem padding no meio
+RETRIES = 2
+TRANSIENT_STATUS = (408, 429, 500, 502, 503, 504)
+
+
+class GeminiError(Exception):
+    def __init__(self, status, text):
+        super().__init__(f"Erro API Gemini ({status}): {text}")
+        self.status = status
+        self.text = text
+
+
+def is_transient(exc) -> bool:
+    """Falha que vale retentar mais tarde (sem rede, timeout, cota, servidor fora)."""
+    if isinstance(exc, GeminiError):
+        return exc.status in TRANSIENT_STATUS
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        return exc.response.status_code in TRANSIENT_STATUS
+    return isinstance(exc, (requests.ConnectionError, requests.Timeout))
+
+
+def _iter_base64(path):
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_B64_READ), b""):
+            yield base64.b64encode(block)
+
+
+class StreamBody:
+    """
+    Corpo de requisição lido sob demanda de um gerador, com tamanho conhecido:
+    o requests manda Content-Length (sem chunked) e o http.client chama read() em blocos.
+    """
+
+    def __init__(self, chunks, length):
+        self._chunks = iter(chunks)
+        self._current = b""
+        self._pos = 0
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        out = []
+        wanted = size
+        while size < 0 or wanted > 0:
+            if self._pos >= len(self._current):
+                self._current, self._pos = next(self._chunks, None), 0
+                if self._current is None:
+                    self._current = b""
+                    break
+            end = len(self._current) if size < 0 else self._pos + wanted
+            piece = self._current[self._pos:end]
+            self._pos += len(piece)
+            wanted -= len(piece)
+            out.append(piece)
+        return b"".join(out)
+
+
+def inline_body(parts, path, mime_type, generation_config=None) -> StreamBody:
+    """
+    Corpo JSON com o áudio inline, sem montar a string base64 inteira na memória.
+    `parts` são as partes de texto que vêm antes do áudio.
+    """
+    head = json.dumps({"contents": [{"parts": parts + [{"inline_data": {"mime_type": mime_type, "data": ""}}]}]})
+    # Divide no "data": "" para injetar o base64 no meio do JSON
+    prefix, suffix = head.rsplit('"data": ""', 1)
+    if generation_config:
+        suffix = suffix[:-1] + ', "generationConfig": ' + json.dumps(generation_config) + "}"
+    prefix = (prefix + '"data": "').encode("utf-8")
+    suffix = ('"' + suffix).encode("utf-8")
+
+    def chunks():
+        yield prefix
+        yield from _iter_base64(path)
+        yield suffix
+
+    b64_len = 4 * ((os.path.getsize(path) + 2) // 3)
+    return StreamBody(chunks(), len(prefix) + b64_len + len(suffix))
+
+
+def upload_file(api_key, path, mime_type, base_url=None, chunk_size=None, on_progress=None, retries=3):
+    """Upload resumable na File API. Retorna o recurso {"name", "uri", "mimeType", "state", ...}."""
+    base = base_url or GEMINI_API_BASE
+    size = os.path.getsize(path)
+    chunk_size = chunk_size or UPLOAD_CHUNK
+
+    start = http_client.post(
+        f"{base}/upload/v1beta/files?key={api_key}",
+        headers={
+            "X-Goog-Upload-Protocol": "resumable",
+            "X-Goog-Upload-Command": "start",
+            "X-Goog-Upload-Header-Content-Length": str(size),
+            "X-Goog-Upload-Header-Content-Type": mime_type,
+            "Content-Type": "application/json",
+        },
+        json={"file": {"display_name": os.path.basename(path)}},
+        timeout=30,
+    )
+    upload_url = start.headers.get("X-Goog-Upload-URL")
+    if start.status_code != 200 or not upload_url:
+        raise GeminiError(start.status_code, start.text[:200])
+
+    offset, failures = 0, 0
+    with open(path, "rb") as f:
+        while True:
+            f.seek(offset)
+            chunk = f.read(chunk_size)
+            last = offset + len(chunk) >= size
+            try:
+                resp = http_client.post(upload_url, data=chunk, timeout=120, headers={
+                    "X-Goog-Upload-Command": "upload, finalize" if last else "upload",
+                    "X-Goog-Upload-Offset": str(offset),
+                })
+                if resp.status_code != 200:
+                    raise GeminiError(resp.status_code, resp.text[:200])
+            except (requests.RequestException, GeminiError) as e:
+                failures += 1
+                if failures > retries:
+                    raise
+                print(f"Upload interrompido em {offset}/{size} ({e}); retomando...")
+                time.sleep(min(2 ** failures, 10))
+                offset = _query_offset(upload_url)
+                continue
+
+            offset += len(chunk)
+            if on_progress:
+                on_progress(offset, size)
+            if last:
+                return resp.json().get("file", {})
+
+
+def _query_offset(upload_url) -> int:
+    """Pergunta ao servidor quantos bytes ele já recebeu (protocolo resumable)."""
+    resp = http_client.post(upload_url, headers={"X-Goog-Upload-Command": "query"}, timeout=30)
+    if resp.status_code != 200:
+        raise GeminiError(resp.status_code, resp.text[:200])
+    return int(resp.headers.get("X-Goog-Upload-Size-Received", 0))
+
+
+def wait_active(api_key, file, base_url=None, timeout=120):
+    """Arquivos de áudio ficam PROCESSING por alguns segundos antes de poderem ser usados."""
+    base = base_url or GEMINI_API_BASE
+    deadline = time.monotonic() + timeout
+    while file.get("state") == "PROCESSING" and time.monotonic() < deadline:
+        time.sleep(1)
+        resp = http_client.get(f"{base}/v1beta/{file['name']}?key={api_key}", timeout=30)
+        if resp.status_code != 200:
+            raise GeminiError(resp.status_code, resp.text[:200])
+        file = resp.json()
+    if file.get("state") == "FAILED":
+        raise GeminiError(500, f"Processamento do arquivo falhou: {file.get('name')}")
+    return file
+
+
+def generate_content(api_key, prompt, audio_path=None, mime_type="audio/wav", model="gemini-2.5-flash",
+                     json_output=False, timeout=120, base_url=None, retries=RETRIES) -> dict:
+    """
+    generateContent com prompt (+ áudio opcional). Retorna o JSON bruto da resposta.
+    Escolhe inline em streaming ou upload resumable conforme o tamanho do arquivo.
+    """
+    base = base_url or GEMINI_API_BASE
+    url = f"{base}/v1beta/models/{model}:generateContent?key={api_key}"
+    config = {"responseMimeType": "application/json"} if json_output else None
+    parts = [{"text": prompt}]
+
+    file_ref = None
+    if audio_path and os.path.getsize(audio_path) > INLINE_MAX_BYTES:
+        file_ref = wait_active(api_key, upload_file(api_key, audio_path, mime_type, base), base)
+
+    def body():
+        if audio_path and file_ref is None:
+            return inline_body(parts, audio_path, mime_type, config)  # recriado a cada tentativa
+        payload = {"contents": [{"parts": parts + ([{"file_data": {
+            "mime_type": file_ref.get("mimeType", mime_type), "file_uri": file_ref["uri"]}}] if file_ref else [])}]}
+        if config:
+            payload["generationConfig"] = config
+        return json.dumps(payload).encode("utf-8")
+
+    for attempt in range(retries + 1):
+        resp = http_client.post(url, data=body(), headers={"Content-Type": "application/json"}, timeout=timeout)
+        if resp.status_code == 200:
+            return resp.json()
+        if resp.status_code in (429, 500, 503) and attempt < retries:
+            time.sleep(2 ** attempt)
+            continue
+        raise GeminiError(resp.status_code, resp.text)
+
+
+def response_text(result: dict) -> str:
+    candidates = result.get("candidates", [])
+    if not candidates:
+        raise GeminiError(200, "Gemini não retornou candidatos.")
+    return candidates[0]["content"]["parts"][0]["text"]
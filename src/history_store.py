@@ -0,0 +1,178 @@
+import json
+import time
+import sqlite3
+from contextlib import contextmanager
+
+# Histórico local de consultas (SQLite no aparelho) com busca full-text (FTS5)
+# sobre o SOAP e os medicamentos. Listagem sempre paginada por id (keyset),
+# então abrir/buscar continua rápido com milhares de consultas.
+# SQLite sem FTS5 (alguns Android antigos): cai para LIKE, mesma API.
+
+PAGE_SIZE = 20
+SOAP_KEYS = ("s", "o", "a", "p")
+
+
+def fts_query(text) -> str:
+    """Texto livre -> consulta FTS5 segura: cada palavra vira prefixo entre aspas ("dor"* "cabe"*)."""
+    words = [w.replace('"', "") for w in str(text or "").split()]
+    return " ".join(f'"{w}"*' for w in words if w)
+
+
+class HistoryStore:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS consultas (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    criado_em REAL NOT NULL,
+                    audio_hash TEXT,
+                    modelo TEXT,
+                    prompt_version TEXT,
+                    soap_s TEXT, soap_o TEXT, soap_a TEXT, soap_p TEXT,
+                    medicamentos TEXT,
+                    resultado TEXT NOT NULL,
+                    auditoria TEXT
+                )
+            ''')
+            try:
+                # Bancos antigos: sem a versão do prompt, a entrada não é reaproveitada por análise nova
+                conn.execute('ALTER TABLE consultas ADD COLUMN prompt_version TEXT')
+            except sqlite3.OperationalError:
+                pass  # Já existe
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_consultas_audio ON consultas (audio_hash)')
+            self.fts = self._init_fts(conn)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_fts(self, conn) -> bool:
+        try:
+            # Índice "external content": o texto fica só na tabela consultas
+            conn.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS consultas_fts USING fts5(
+                    soap_s, soap_o, soap_a, soap_p, medicamentos,
+                    content='consultas', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            print(f"FTS5 indisponível, busca via LIKE: {e}")
+            return False
+        conn.executescript('''
+            CREATE TRIGGER IF NOT EXISTS consultas_ai AFTER INSERT ON consultas BEGIN
+                INSERT INTO consultas_fts (rowid, soap_s, soap_o, soap_a, soap_p, medicamentos)
+                VALUES (new.id, new.soap_s, new.soap_o, new.soap_a, new.soap_p, new.medicamentos);
+            END;
+            CREATE TRIGGER IF NOT EXISTS consultas_ad AFTER DELETE ON consultas BEGIN
+                INSERT INTO consultas_fts (consultas_fts, rowid, soap_s, soap_o, soap_a, soap_p, medicamentos)
+                VALUES ('delete', old.id, old.soap_s, old.soap_o, old.soap_a, old.soap_p, old.medicamentos);
+            END;
+        ''')
+        return True
+
+    def add(self, result: dict, audio_hash=None, modelo=None, audit=None, prompt_version=None) -> int:
+        soap = result.get("soap") or {}
+        meds = result.get("medicamentos") or []
+        with self._connect() as conn:
+            cur = conn.execute('''
+                INSERT INTO consultas (criado_em, audio_hash, modelo, prompt_version, soap_s, soap_o, soap_a, soap_p,
+                                       medicamentos, resultado, auditoria)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                time.time(), audio_hash, modelo, prompt_version, *[str(soap.get(k) or "") for k in SOAP_KEYS],
+                ", ".join(map(str, meds)), json.dumps(result, ensure_ascii=False),
+                json.dumps(audit, ensure_ascii=False) if audit else None
+            ))
+            return cur.lastrowid
+
+    def set_audit(self, consulta_id, audit):
+        # auditoria não está no índice FTS: UPDATE direto, sem mexer nos triggers
+        with self._connect() as conn:
+            conn.execute("UPDATE consultas SET auditoria = ? WHERE id = ?",
+                         (json.dumps(audit, ensure_ascii=False), consulta_id))
+
+    def find_by_audio(self, audio_hash, modelo=None, prompt_version=None):
+        """Consulta mais recente do áudio com o mesmo modelo e versão do prompt (outra análise = outra entrada)."""
+        with self._connect() as conn:
+            row = conn.execute('''
+                SELECT id FROM consultas WHERE audio_hash = ? AND modelo IS ? AND prompt_version IS ?
+                ORDER BY id DESC LIMIT 1
+            ''', (audio_hash, modelo, prompt_version)).fetchone()
+        return row["id"] if row else None
+
+    def get(self, consulta_id):
+        """Consulta completa: {"id", "criado_em", "data", "audit"} ou None."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT id, criado_em, resultado, auditoria FROM consultas WHERE id = ?",
+                               (consulta_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row["id"], "criado_em": row["criado_em"],
+            "data": json.loads(row["resultado"]),
+            "audit": json.loads(row["auditoria"]) if row["auditoria"] else None,
+        }
+
+    def search(self, text="", limit=PAGE_SIZE, before_id=None):
+        """
+        Página de resumos, mais recentes primeiro: [{"id", "criado_em", "avaliacao", "medicamentos", "trecho"}].
+        Próxima página: before_id = id do último item recebido.
+        """
+        query = fts_query(text)
+        params = []
+        where = []
+        if before_id is not None:
+            where.append("c.id < ?")
+            params.append(before_id)
+
+        if query and self.fts:
+            sql = '''
+                SELECT c.id, c.criado_em, c.soap_a, c.medicamentos,
+                       snippet(consultas_fts, -1, '[', ']', '…', 10) AS trecho
+                FROM consultas_fts JOIN consultas c ON c.id = consultas_fts.rowid
+                WHERE consultas_fts MATCH ? {extra}
+                ORDER BY c.id DESC LIMIT ?
+            '''.format(extra="".join(f" AND {w}" for w in where))
+            params = [query] + params
+        else:
+            for word in str(text or "").split():
+                where.append("(c.soap_s || ' ' || c.soap_o || ' ' || c.soap_a || ' ' || c.soap_p"
+                             " || ' ' || c.medicamentos) LIKE ?")
+                params.append(f"%{word}%")
+            sql = '''
+                SELECT c.id, c.criado_em, c.soap_a, c.medicamentos, NULL AS trecho
+                FROM consultas c {where}
+                ORDER BY c.id DESC LIMIT ?
+            '''.format(where=("WHERE " + " AND ".join(where)) if where else "")
+
+        with self._connect() as conn:
+            rows = conn.execute(sql, params + [limit]).fetchall()
+        return [{
+            "id": r["id"], "criado_em": r["criado_em"], "avaliacao": r["soap_a"],
+            "medicamentos": r["medicamentos"], "trecho": r["trecho"],
+        } for r in rows]
+
+    def iter_recent(self, limit=50):
+        """Consultas completas mais recentes (exportação em lote)."""
+        with self._connect() as conn:
+            ids = [r["id"] for r in conn.execute("SELECT id FROM consultas ORDER BY id DESC LIMIT ?", (limit,))]
+        for consulta_id in ids:
+            item = self.get(consulta_id)
+            if item:
+                yield item
+
+    def delete(self, consulta_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM consultas WHERE id = ?", (consulta_id,))
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM consultas").fetchone()[0]
@@ -0,0 +1,87 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Rede do app num lugar só: uma requests.Session compartilhada (keep-alive + pool),
+# então Gemini, checagem de atualização e backend reaproveitam a conexão TCP/TLS
+# em vez de pagar DNS + handshake a cada chamada (centenas de ms no 4G).
+#   - timeouts separados: conectar rápido, ler com folga (áudio/LLM demoram)
+#   - retry automático só em GET (POST com corpo em streaming não dá para reenviar;
+#     o gemini_client retenta os POSTs ele mesmo)
+#   - respostas gzip (Accept-Encoding), descompactadas pelo requests
+# Modo backend (MEDUBS_BACKEND_URL): a análise vai para /consultar-ia na mesma sessão.
+
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 60
+DEFAULT_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+POOL_SIZE = 8            # >= workers do modo segmentado + fila offline
+BACKEND_URL = os.environ.get("MEDUBS_BACKEND_URL", "").rstrip("/")
+
+_session = None
+_lock = threading.Lock()
+
+
+def _build_session() -> requests.Session:
+    session = requests.Session()
+    retry = Retry(
+        total=3, backoff_factor=0.5,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Accept-Encoding": "gzip, deflate", "User-Agent": "MEDUBS"})
+    return session
+
+
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def request(method, url, timeout=DEFAULT_TIMEOUT, **kwargs) -> requests.Response:
+    """session.request com timeout padrão (connect, read); `timeout` numérico vale só para a leitura."""
+    if isinstance(timeout, (int, float)):
+        timeout = (CONNECT_TIMEOUT, timeout)
+    return get_session().request(method, url, timeout=timeout, **kwargs)
+
+
+def get(url, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def backend_enabled(base_url=None) -> bool:
+    return bool(base_url or BACKEND_URL)
+
+
+def consultar_ia(transcricao, api_key, model=None, base_url=None, timeout=120) -> dict:
+    """
+    POST /consultar-ia no backend (RAG + SOAP + LME). Levanta requests.HTTPError se falhar.
+    O backend responde 200 com um card de erro (debug_rag "ERRO") quando o Gemini falha:
+    vira {"error", "retryable"} para não entrar no cache nem no histórico.
+    """
+    base = (base_url or BACKEND_URL).rstrip("/")
+    payload = {"transcricao": transcricao, "api_key": api_key}
+    if model:
+        payload["model"] = model
+    resp = post(f"{base}/consultar-ia", json=payload, timeout=timeout)
+    resp.raise_for_status()
+    body = resp.json()
+    if body.get("debug_rag") == "ERRO":
+        msg = body.get("soap", {}).get("a") or "Erro no backend"
+        # Backend antigo não manda "retryable": cota (429) é o caso que vale retentar
+        return {"error": f"Backend: {msg}", "retryable": body.get("retryable", "429" in msg)}
+    return body
@@ -0,0 +1,204 @@
+import json
+import time
+import random
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Fila offline de análises: nas UBS com internet instável a consulta não se perde.
+# Os jobs ficam em SQLite no aparelho (sobrevivem ao app fechar) e um worker em
+# background processa até N ao mesmo tempo, retentando com backoff exponencial.
+# Quando um job dá certo (a rede voltou), os pendentes são antecipados para já.
+
+PENDENTE, EXECUTANDO, CONCLUIDO, FALHOU = "pendente", "executando", "concluido", "falhou"
+
+BACKOFF_BASE = 15.0      # s: 15, 30, 60, ... (com jitter)
+BACKOFF_MAX = 15 * 60.0
+MAX_ATTEMPTS = 8
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, max_delay=BACKOFF_MAX) -> float:
+    """Espera antes da próxima tentativa; jitter evita todos os jobs voltarem juntos."""
+    return min(base * 2 ** max(attempt - 1, 0), max_delay) * random.uniform(0.5, 1.0)
+
+
+class JobQueue:
+    def __init__(self, db_path, max_attempts=MAX_ATTEMPTS, backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    audio_path TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    tentativas INTEGER NOT NULL DEFAULT 0,
+                    proxima_tentativa REAL NOT NULL,
+                    erro TEXT,
+                    resultado TEXT,
+                    criado_em REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, proxima_tentativa)')
+            # App morto no meio de um job: volta para a fila
+            conn.execute("UPDATE jobs SET status = ? WHERE status = ?", (PENDENTE, EXECUTANDO))
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, audio_path) -> int:
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                "INSERT INTO jobs (audio_path, status, proxima_tentativa, criado_em) VALUES (?, ?, ?, ?)",
+                (audio_path, PENDENTE, now, now)
+            )
+            return cur.lastrowid
+
+    def claim(self):
+        """Pega o próximo job vencido e marca como executando. None se não há nenhum."""
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? AND proxima_tentativa <= ? ORDER BY proxima_tentativa, id LIMIT 1",
+                (PENDENTE, time.time())
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE jobs SET status = ?, tentativas = tentativas + 1 WHERE id = ?", (EXECUTANDO, row["id"]))
+            job = dict(row)
+            job["status"], job["tentativas"] = EXECUTANDO, row["tentativas"] + 1
+            return job
+
+    def complete(self, job_id, result):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET status = ?, resultado = ?, erro = NULL WHERE id = ?",
+                         (CONCLUIDO, json.dumps(result, ensure_ascii=False), job_id))
+
+    def retry(self, job_id, error) -> str:
+        """Reagenda com backoff; depois de max_attempts desiste. Retorna o novo status."""
+        with self._connect() as conn:
+            attempts = conn.execute("SELECT tentativas FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+            if attempts >= self.max_attempts:
+                status, when = FALHOU, time.time()
+            else:
+                status, when = PENDENTE, time.time() + backoff_delay(attempts, self.backoff_base, self.backoff_max)
+            conn.execute("UPDATE jobs SET status = ?, erro = ?, proxima_tentativa = ? WHERE id = ?",
+                         (status, str(error), when, job_id))
+        return status
+
+    def fail(self, job_id, error):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET status = ?, erro = ? WHERE id = ?", (FALHOU, str(error), job_id))
+
+    def retry_now(self):
+        """Antecipa todos os pendentes (ex.: a conexão voltou)."""
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET proxima_tentativa = ? WHERE status = ?", (time.time(), PENDENTE))
+
+    def next_due(self):
+        """Horário (time.time) do próximo pendente, ou None."""
+        with self._connect() as conn:
+            return conn.execute("SELECT MIN(proxima_tentativa) FROM jobs WHERE status = ?", (PENDENTE,)).fetchone()[0]
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def active_audio_paths(self) -> set:
+        """Áudios de jobs ainda na fila (pendentes ou em execução); o resto pode ser apagado."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT audio_path FROM jobs WHERE status IN (?, ?)", (PENDENTE, EXECUTANDO)).fetchall()
+        return {r[0] for r in rows}
+
+    def counts(self) -> dict:
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+class QueueWorker:
+    """
+    Threads em background consumindo a fila. `process(job)` retorna o resultado da análise:
+    {"error": ..., "retryable": True} reagenda; outro {"error"} falha de vez.
+    on_done(job, result) é chamado quando o job termina (concluído ou falha definitiva).
+    """
+
+    def __init__(self, queue, process, concurrency=2, on_done=None, idle_wait=30.0):
+        self.queue = queue
+        self.process = process
+        self.concurrency = concurrency
+        self.on_done = on_done
+        self.idle_wait = idle_wait
+        self._cond = threading.Condition()
+        self._stop = False
+        self._threads = []
+
+    def start(self):
+        for i in range(self.concurrency):
+            t = threading.Thread(target=self._loop, name=f"fila-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def stop(self, timeout=5):
+        self._stop = True
+        self.wake()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def _sleep(self):
+        due = self.queue.next_due()
+        wait = self.idle_wait if due is None else min(self.idle_wait, max(due - time.time(), 0.01))
+        with self._cond:
+            if not self._stop:
+                self._cond.wait(wait)
+
+    def _loop(self):
+        while not self._stop:
+            try:
+                job = self.queue.claim()
+            except sqlite3.Error as e:
+                print(f"Erro lendo a fila: {e}")
+                job = None
+            if job is None:
+                self._sleep()
+                continue
+            self._run(job)
+
+    def _run(self, job):
+        try:
+            result = self.process(job)
+        except Exception as e:
+            result = {"error": f"Erro Geral: {e}"}
+
+        if "error" not in result:
+            self.queue.complete(job["id"], result)
+            # Deu certo: a conexão voltou, não espera o backoff dos outros
+            self.queue.retry_now()
+            self.wake()
+        elif not result.get("retryable"):
+            self.queue.fail(job["id"], result["error"])
+        elif self.queue.retry(job["id"], result["error"]) != FALHOU:
+            print(f"Job {job['id']} reagendado (tentativa {job['tentativas']}): {result['error']}")
+            return
+
+        if self.on_done:
+            try:
+                self.on_done(job, result)
+            except Exception as e:
+                print(f"Erro notificando job {job['id']}: {e}")
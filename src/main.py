@@ -1,128 +1,47 @@
+import startup_profile
+startup_profile.install()  # MEDUBS_PROFILE_STARTUP=1 liga o relatório de cold start
+
 import flet as ft
 import os
 import json
 import threading
 import time
-import requests
 import re
-from unidecode import unidecode
-from fpdf import FPDF
-from datetime import datetime
+import hashlib
+import analysis_cache
+import history_store
+import job_queue
+import app_storage
+# Módulos pesados carregam no primeiro uso, não no startup:
+#   fpdf/unidecode -> pdf_report | requests -> gemini_client/segmented/check_update
+#   numpy -> audio_prep/catalog_index (o índice é aquecido numa thread de fundo)
 
-# ... (Imports e Configs) ...
+startup_profile.mark("imports do main.py")
 
 # --- GERADOR DE PDF ---
-class PDFReport(FPDF):
-    def header(self):
-        self.set_font('Arial', 'B', 16)
-        self.set_text_color(0, 82, 204) # MEDICAL_BLUE
-        self.cell(0, 10, 'MEDUBS - Relatório Clínico', 0, 1, 'C')
-        self.ln(5)
-
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('Arial', 'I', 8)
-        self.set_text_color(128)
-        self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'C')
-
-def generate_pdf_report(data, filename):
-    pdf = PDFReport()
-    pdf.add_page()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    
-    # Helper para texto seguro (FPDF Clássico não suporta UTF-8 nativo bem)
-    def safe_txt(text):
-        if not text: return "-"
-        return unidecode(text)
-
-    # Data/Hora
-    pdf.set_font("Arial", size=10)
-    pdf.set_text_color(100)
-    now = datetime.now().strftime("%d/%m/%Y %H:%M")
-    pdf.cell(0, 10, safe_txt(f"Gerado em: {now}"), ln=True, align='R')
-    pdf.ln(5)
-
-    # SOAP
-    soap = data.get("soap", {})
-    suggestions = data.get("sugestoes", {})
-    
-    sections = [
-        ("Subjetivo", soap.get('s'), "s"),
-        ("Objetivo", soap.get('o'), "o"),
-        ("Avaliacao", soap.get('a'), "a"), # Unidecoded title
-        ("Plano", soap.get('p'), "p")
-    ]
-
-    for title, content, key in sections:
-        # Título Seção
-        pdf.set_font("Arial", 'B', 12)
-        pdf.set_text_color(0, 0, 0)
-        pdf.set_fill_color(240, 240, 240)
-        pdf.cell(0, 8, safe_txt(f" {title}"), 1, 1, 'L', fill=True)
-        
-        # Conteúdo
-        pdf.set_font("Arial", size=11)
-        pdf.multi_cell(0, 6, safe_txt(content))
-        pdf.ln(2)
-        
-        # Sugestões
-        sugs = suggestions.get(key, [])
-        if sugs:
-            pdf.set_font("Arial", 'I', 10)
-            pdf.set_text_color(100, 100, 100)
-            pdf.cell(0, 6, safe_txt("Sugestões da IA:"), ln=True)
-            for s in sugs:
-                 pdf.multi_cell(0, 5, safe_txt(f" - {s}"))
-            pdf.ln(3)
-        
-        pdf.ln(3)
-
-    # Medicamentos
-    pdf.add_page()
-    pdf.set_font("Arial", 'B', 12)
-    pdf.set_text_color(0, 0, 0)
-    pdf.set_fill_color(227, 242, 253) # Light Blue
-    pdf.cell(0, 8, safe_txt(" Prescrição & Análise"), 1, 1, 'L', fill=True)
-    pdf.ln(5)
-
-    meds = data.get("medicamentos", [])
-    if not meds:
-        pdf.set_font("Arial", 'I', 11)
-        pdf.cell(0, 10, safe_txt("Nenhum medicamento identificado."), ln=True)
-    else:
-        # Re-usa lógica de check
-        audit = check_meds_debug(meds)
-        
-        pdf.set_font("Arial", size=10)
-        
-        for item in audit["items"]:
-            name = item['ia_term'].title()
-            # Tags em texto
-            tags = []
-            if item['remume']['found']: tags.append("[REMUME]")
-            if item['alto_custo']['found']: tags.append("[ALTO CUSTO]")
-            if item['rename']['found']: tags.append("[RENAME]")
-            if not tags: tags.append("[NAO CONSTA]")
-            
-            tag_str = " ".join(tags)
-            
-            pdf.set_font("Arial", 'B', 11)
-            pdf.cell(0, 6, safe_txt(f"{name}"), ln=True)
-            pdf.set_font("Arial", size=9)
-            pdf.set_text_color(0, 82, 204)
-            pdf.cell(0, 5, safe_txt(f"{tag_str}"), ln=True)
-            
-            # Detalhes Match
-            pdf.set_text_color(80)
-            for db in ['remume', 'alto_custo', 'rename']:
-                if item[db]['found']:
-                     match = item[db]['match']
-                     pdf.cell(0, 4, safe_txt(f"  -> {db.upper()}: {match}"), ln=True)
-            
-            pdf.set_text_color(0)
-            pdf.ln(3)
-
-    return pdf.output(dest='S').encode('latin-1', 'replace') # Retorna bytes
+def generate_pdf_report(data, path, audit=None):
+    """Grava o PDF direto em `path`. `audit`: a checagem já feita na tela (não recalcula)."""
+    import pdf_report  # fpdf/unidecode só carregam no primeiro PDF
+    return pdf_report.generate_pdf_report(data, path, audit)
+
+def export_history(path, limit=50, on_progress=None):
+    """Exporta as consultas do histórico do aparelho: um PDF só (.pdf) ou um PDF por consulta (.zip)."""
+    import pdf_report
+    from datetime import datetime
+    consultas = []
+    for item in get_history().iter_recent(limit):
+        when = datetime.fromtimestamp(item["criado_em"])
+        consultas.append({
+            "data": item["data"],
+            "audit": item["audit"],
+            "titulo": f"Consulta de {when.strftime('%d/%m/%Y %H:%M')}",
+            "arquivo": f"Consulta_{when.strftime('%Y%m%d_%H%M%S')}.pdf",
+        })
+    if not consultas:
+        return 0
+    export = pdf_report.export_batch_pdf if path.lower().endswith(".pdf") else pdf_report.export_batch_zip
+    export(consultas, path, check_meds=check_meds_debug, on_progress=on_progress)
+    return len(consultas)
 
 
 
@@ -195,7 +114,7 @@ def get_alto_custo():
                 names.append(item)
     return [n for n in names if n]
 
-def get_rename():
+def get_rename(with_details=False):
     data = load_json_db("db_rename.json")
     names = []
     # Estrutura do JSON detectada: [{'grupo': '...', 'itens': [{'nome': '...'}, ...]}, ...]
@@ -203,7 +122,11 @@ def get_rename():
         for grupo in data:
             if isinstance(grupo, dict) and "itens" in grupo:
                 for item in grupo["itens"]:
-                    if isinstance(item, dict):
+                    if isinstance(item, dict) and with_details:
+                        # Dose/forma/ATC ficam em 'detalhes' (usado pelo índice estruturado)
+                        if item.get('nome'):
+                            names.append({"nome": item['nome'], "detalhes": item.get('detalhes', '')})
+                    elif isinstance(item, dict):
                         names.append(item.get('nome', ''))
                     elif isinstance(item, str):
                         names.append(item)
@@ -213,15 +136,99 @@ def get_rename():
                 names.append(grupo)
     return [n for n in names if n]
 
+def load_catalogs():
+    # Loader do índice em memória (catalog_index) - lido uma única vez por processo
+    return {"remume": get_remume(), "rename": get_rename(with_details=True), "alto_custo": get_alto_custo()}
+
 # Verificador de Medicamentos (Mantido para compatibilidade, se necessário)
 def check_meds(med_list):
     # ... (lógica antiga, pode manter ou remover se só usar o debug)
     return [] 
 
 # --- INTEGRAÇÃO GEMINI (REST API) ---
-import base64
+ANALYSIS_PROMPT = """
+Você é um assistente médico sênior e cínico (Dr. House).
+Analise o áudio e gere um JSON VÁLIDO e ESTRITO.
+
+Regras de Formatação:
+1. Responda APENAS o JSON. Sem markdown.
+2. Se faltar info crítica no SOAP (ex: não perguntou alergias, histórico), adicione "[CRITICA CÍNICA]: <texto>" ao final do campo específico.
+3. Escape aspas duplas.
+
+Estrutura Obrigatória:
+{
+  "soap": { "s": "...", "o": "...", "a": "...", "p": "..." },
+  "medicamentos": ["..."],
+  "sugestoes": { "s": ["..."], "o": ["..."], "a": ["..."], "p": ["..."] }
+}
+"""
+ANALYSIS_MODEL = "gemini-2.5-flash"
+# Muda sozinho quando o prompt muda: resultados antigos do cache deixam de valer
+PROMPT_VERSION = hashlib.sha256(ANALYSIS_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+_analysis_cache = None
+
+def get_analysis_cache():
+    global _analysis_cache
+    if _analysis_cache is None:
+        _analysis_cache = analysis_cache.AnalysisCache(app_storage.data_path("analises_cache.db"))
+    return _analysis_cache
+
+_history = None
+
+def get_history():
+    global _history
+    if _history is None:
+        _history = history_store.HistoryStore(app_storage.data_path("historico.db"))
+    return _history
+
+# --- FILA OFFLINE (análises que falharam por rede) ---
+QUEUE_CONCURRENCY = 2
+_job_queue = None
+
+def get_job_queue():
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = job_queue.JobQueue(app_storage.data_path("fila.db"))
+    return _job_queue
+
+def enqueue_analysis(audio_path_val):
+    """Copia o áudio para a pasta do app (o arquivo escolhido pode ser temporário) e põe na fila."""
+    import shutil
+    dest = app_storage.data_path("fila", f"{int(time.time() * 1000)}_{os.path.basename(audio_path_val)}")
+    shutil.copyfile(audio_path_val, dest)
+    return get_job_queue().enqueue(dest)
+
+def remove_queue_audio(path):
+    try: os.remove(path)
+    except OSError: pass
+
+def clean_queue_audio():
+    """Apaga cópias em fila/ sem job ativo (ex.: jobs que falharam antes de a limpeza existir)."""
+    try:
+        active = get_job_queue().active_audio_paths()
+        pasta = os.path.dirname(app_storage.data_path("fila", "x"))
+        for nome in os.listdir(pasta):
+            path = os.path.join(pasta, nome)
+            if path not in active:
+                remove_queue_audio(path)
+    except Exception as e:
+        print(f"Erro limpando áudios da fila: {e}")
+
+def save_history(result, audio_hash, prompt_version):
+    """
+    Guarda a consulta no histórico local. Retorna o id. Mesmo áudio com o mesmo modelo e
+    prompt (resultado do cache) reaproveita a entrada; análise nova vira entrada nova.
+    """
+    try:
+        history = get_history()
+        existing = history.find_by_audio(audio_hash, ANALYSIS_MODEL, prompt_version) if audio_hash else None
+        return existing or history.add(result, audio_hash=audio_hash, modelo=ANALYSIS_MODEL, prompt_version=prompt_version)
+    except Exception as e:
+        print(f"Erro salvando histórico: {e}")
+        return None
 
-def run_gemini_analysis(api_key, audio_path_val):
+def run_gemini_analysis(api_key, audio_path_val, on_progress=None):
     print(f"DEBUG: Iniciando análise para {audio_path_val}")
     if not api_key:
         return {"error": "API Key não fornecida."}
@@ -229,53 +236,78 @@ def run_gemini_analysis(api_key, audio_path_val):
     if not os.path.exists(audio_path_val):
         return {"error": "Arquivo de áudio não encontrado."}
 
+    # Mesmo áudio + mesmo prompt/modelo: devolve na hora, sem reenviar nem recobrar
+    import http_client
+    # Resultado do backend tem outro formato/prompt: não mistura no cache
+    prompt_version = f"backend:{PROMPT_VERSION}" if http_client.backend_enabled() else PROMPT_VERSION
+    cache_key = audio_hash = None
     try:
-        # Lê e codifica o áudio
-        with open(audio_path_val, "rb") as f:
-            audio_data = base64.b64encode(f.read()).decode("utf-8")
-            
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={api_key}"
-        
-        prompt = """
-        Você é um assistente médico sênior e cínico (Dr. House).
-        Analise o áudio e gere um JSON VÁLIDO e ESTRITO.
-        
-        Regras de Formatação:
-        1. Responda APENAS o JSON. Sem markdown.
-        2. Se faltar info crítica no SOAP (ex: não perguntou alergias, histórico), adicione "[CRITICA CÍNICA]: <texto>" ao final do campo específico.
-        3. Escape aspas duplas.
-        
-        Estrutura Obrigatória:
-        {
-          "soap": { "s": "...", "o": "...", "a": "...", "p": "..." },
-          "medicamentos": ["..."],
-          "sugestoes": { "s": ["..."], "o": ["..."], "a": ["..."], "p": ["..."] }
-        }
-        """
-        
-        payload = {
-            "contents": [{
-                "parts": [
-                    {"text": prompt},
-                    {"inline_data": {
-                        "mime_type": "audio/mp3", # Genérico para audio
-                        "data": audio_data
-                    }}
-                ]
-            }],
-            "generationConfig": {
-                "responseMimeType": "application/json"
-            }
-        }
-        
-        headers = {"Content-Type": "application/json"}
-        # Timeout aumentado para áudios longos
-        response = requests.post(url, json=payload, headers=headers, timeout=120)
-        
-        if response.status_code != 200:
-            return {"error": f"Erro API Gemini ({response.status_code}): {response.text}"}
-            
-        result = response.json()
+        audio_hash = analysis_cache.file_sha256(audio_path_val)
+        cache_key = analysis_cache.make_key(audio_hash, prompt_version, ANALYSIS_MODEL)
+        cached = get_analysis_cache().get(cache_key)
+        if cached is not None:
+            return {**cached, "from_cache": True, "history_id": save_history(cached, audio_hash, prompt_version)}
+    except Exception as e:
+        print(f"Cache de análises indisponível: {e}")
+
+    result = _run_gemini_analysis(api_key, audio_path_val, on_progress)
+    if "error" in result:
+        return result
+    if cache_key:
+        try:
+            get_analysis_cache().put(cache_key, result)
+        except Exception as e:
+            print(f"Erro salvando cache: {e}")
+    return {**result, "history_id": save_history(result, audio_hash, prompt_version)}
+
+def _run_gemini_analysis(api_key, audio_path_val, on_progress=None):
+    # numpy/requests só entram na primeira análise
+    import audio_prep
+    # Mono 16kHz sem pausas longas (só WAV e com numpy; senão vai o original)
+    try:
+        prep = audio_prep.preprocess(audio_path_val)
+    except OSError as e:
+        return {"error": f"Erro lendo o áudio: {e}"}
+    print(f"DEBUG: Pré-processamento: {prep}")
+    try:
+        return _analyze_prepared(api_key, prep, on_progress)
+    finally:
+        audio_prep.cleanup(prep)  # WAV temporário: não fica nada depois do envio
+
+def _analyze_prepared(api_key, prep, on_progress=None):
+    import segmented
+    import gemini_client
+    import http_client
+    try:
+        audio_path_val = prep["path"]
+        mime_type = prep["mime_type"]
+
+        # Consulta longa: trechos em paralelo + merge (uma requisição só estouraria o timeout)
+        if not prep["skipped"] and prep.get("out_seconds", 0) > segmented.LONG_AUDIO_S:
+            return segmented.analyze_long(api_key, audio_path_val, ANALYSIS_PROMPT, on_progress=on_progress)
+
+        # Modo backend (MEDUBS_BACKEND_URL): Gemini só transcreve; RAG + SOAP + LME
+        # ficam no /consultar-ia, pela mesma conexão em pool
+        if http_client.backend_enabled():
+            try:
+                result = gemini_client.generate_content(
+                    api_key, segmented.TRANSCRIBE_PROMPT.format(idx=1, total=1), audio_path=audio_path_val,
+                    mime_type=mime_type, model=ANALYSIS_MODEL, timeout=120
+                )
+                transcricao = gemini_client.response_text(result)
+            except gemini_client.GeminiError as e:
+                return {"error": str(e), "retryable": gemini_client.is_transient(e)}
+            return http_client.consultar_ia(transcricao, api_key, model=ANALYSIS_MODEL)
+
+        # Áudio vai em streaming (inline até INLINE_MAX_BYTES, senão upload resumable);
+        # nada de arquivo inteiro + string base64 + JSON na memória ao mesmo tempo
+        try:
+            result = gemini_client.generate_content(
+                api_key, ANALYSIS_PROMPT, audio_path=audio_path_val, mime_type=mime_type, model=ANALYSIS_MODEL,
+                json_output=True, timeout=120  # Timeout aumentado para áudios longos
+            )
+        except gemini_client.GeminiError as e:
+            return {"error": str(e), "retryable": gemini_client.is_transient(e)}
         
         # Extração Segura com Regex
         try:
@@ -299,39 +331,23 @@ def run_gemini_analysis(api_key, audio_path_val):
             return {"error": f"Erro JSON: {str(e)}"}
             
     except Exception as e:
-        return {"error": f"Erro Geral: {e}"}
+        # Sem rede/timeout: "retryable" manda a consulta para a fila offline
+        return {"error": f"Erro Geral: {e}", "retryable": gemini_client.is_transient(e)}
 
 # --- INTEGRAÇÃO GEMINI (REST API) ---
 # (run_gemini_analysis já está acima)
 
 def check_meds_debug(meds_found):
+    import catalog_index
     try:
-        remume_list = [unidecode(x).lower() for x in get_remume()]
-        rename_list = [unidecode(x).lower() for x in get_rename()]
-        alto_custo_list = [unidecode(x).lower() for x in get_alto_custo()]
-        
-        audit_items = []
+        # Índice pré-normalizado (construído uma vez, reaproveitado em toda checagem)
+        index = catalog_index.get_index(load_catalogs)
         
-        for med in meds_found:
-            med_norm = unidecode(med).lower()
-            
-            # Helper de busca fuzzy ou exata
-            def search_db(db_list):
-                # Busca Exata
-                if med_norm in db_list:
-                    return {"found": True, "match": med}
-                # Busca Parcial (Simples)
-                for item in db_list:
-                    if med_norm in item or item in med_norm:
-                         return {"found": True, "match": item}
-                return {"found": False, "match": None}
-    
-            audit_items.append({
-                "ia_term": med,
-                "remume": search_db(remume_list),
-                "rename": search_db(rename_list),
-                "alto_custo": search_db(alto_custo_list)
-            })
+        # Receita inteira pontuada de uma vez (exato -> substring -> similaridade de trigramas)
+        audit_items = [
+            {"ia_term": med, **checks}
+            for med, checks in zip(meds_found, index.check_batch(meds_found))
+        ]
             
         return {
             "items": audit_items,
@@ -353,6 +369,12 @@ NEUTRAL_GREY = "#757575"
 
 # --- UI PRINCIPAL (Refatorada - Fase 3) ---
 def main(page: ft.Page):
+    startup_profile.mark("main() chamado")
+    # Pré-carrega o catálogo em background enquanto a UI monta (import do numpy incluso)
+    def warm_catalog():
+        import catalog_index
+        catalog_index.get_index(load_catalogs)
+    threading.Thread(target=warm_catalog, daemon=True).start()
     try:
         page.title = "MEDUBS" # Nome Novo
         page.scroll = "adaptive"
@@ -494,12 +516,23 @@ def main(page: ft.Page):
             
             def task():
                 try:
-                    res = run_gemini_analysis(api_key, audio_path.current)
-                    if "error" in res:
+                    def on_progress(done, total, msg):
+                        txt_status.value = f"{msg} ({done}/{total})"
+                        page.update()
+
+                    res = run_gemini_analysis(api_key, audio_path.current, on_progress=on_progress)
+                    if res.get("retryable"):
+                        # Sem conexão: vai para a fila e o worker tenta de novo sozinho
+                        job_id = enqueue_analysis(audio_path.current)
+                        queue_worker.wake()
+                        refresh_queue_status()
+                        txt_status.value = f"Sem conexão: consulta #{job_id} na fila, será processada automaticamente."
+                        page.show_snack_bar(ft.SnackBar(ft.Text("Consulta guardada na fila offline."), bgcolor=WARNING_ORANGE))
+                    elif "error" in res:
                         page.show_snack_bar(ft.SnackBar(ft.Text(f"Erro: {res['error']}"), bgcolor="red"))
                         txt_status.value = f"Erro: {res['error'][:30]}..."
                     else:
-                        txt_status.value = "Análise Concluída."
+                        txt_status.value = "Análise Concluída (cache)." if res.get("from_cache") else "Análise Concluída."
                         show_results(res)
                 except Exception as e:
                      page.show_snack_bar(ft.SnackBar(ft.Text(f"Erro Thread: {e}"), bgcolor="red"))
@@ -524,7 +557,8 @@ def main(page: ft.Page):
                     url = f"https://api.github.com/repos/{REPO_OWNER}/{REPO_NAME}/releases/latest"
                     print(f"DEBUG: Checking update at {url}")
                     
-                    resp = requests.get(url, timeout=10)
+                    import http_client  # mesma sessão (keep-alive) das análises
+                    resp = http_client.get(url, timeout=10)
                     if resp.status_code == 200:
                         data = resp.json()
                         latest_tag = data.get("tag_name", "v0.0.0")
@@ -584,24 +618,146 @@ def main(page: ft.Page):
              if not hasattr(result_col, 'data') or not result_col.data: 
                  return
              
+             from datetime import datetime
              save_file_dialog.save_file(file_name=f"Consulta_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf")
 
         def on_save_result(e: ft.FilePickerResultEvent):
-            if e.path:
+            if not e.path:
+                return
+            data, audit = result_col.data, getattr(result_col, "audit", None)
+            txt_status.value = "Gerando PDF..."
+            page.update()
+
+            # Fora da thread da UI (antes o app congelava durante a geração)
+            def pdf_task():
                 try:
-                    pdf_bytes = generate_pdf_report(result_col.data, e.path)
-                    with open(e.path, "wb") as f:
-                        f.write(pdf_bytes)
+                    generate_pdf_report(data, e.path, audit)
+                    txt_status.value = "PDF salvo."
                     page.show_snack_bar(ft.SnackBar(ft.Text(f"Salvo em: {e.path}"), bgcolor=SUCCESS_GREEN))
                 except Exception as ex:
                     page.show_snack_bar(ft.SnackBar(ft.Text(f"Erro ao salvar: {ex}"), bgcolor="red"))
+                page.update()
+
+            threading.Thread(target=pdf_task, daemon=True).start()
 
         save_file_dialog = ft.FilePicker(on_result=on_save_result)
         page.overlay.append(save_file_dialog)
 
+        # --- EXPORTAÇÃO EM LOTE (histórico salvo no aparelho) ---
+        def export_click(e):
+            from datetime import datetime
+            export_dialog.save_file(file_name=f"Historico_{datetime.now().strftime('%Y%m%d_%H%M')}.zip",
+                                    allowed_extensions=["zip", "pdf"])
+
+        def on_export_result(e: ft.FilePickerResultEvent):
+            if not e.path:
+                return
+            txt_status.value = "Exportando histórico..."
+            page.update()
+
+            def export_task():
+                def on_progress(done, total):
+                    txt_status.value = f"Exportando histórico ({done}/{total})..."
+                    page.update()
+                try:
+                    n = export_history(e.path, on_progress=on_progress)
+                    txt_status.value = f"{n} consultas exportadas." if n else "Nenhuma consulta salva."
+                    if n:
+                        page.show_snack_bar(ft.SnackBar(ft.Text(f"Salvo em: {e.path}"), bgcolor=SUCCESS_GREEN))
+                except Exception as ex:
+                    txt_status.value = "Erro na exportação."
+                    page.show_snack_bar(ft.SnackBar(ft.Text(f"Erro ao exportar: {ex}"), bgcolor="red"))
+                page.update()
+
+            threading.Thread(target=export_task, daemon=True).start()
+
+        export_dialog = ft.FilePicker(on_result=on_export_result)
+        page.overlay.append(export_dialog)
+
+        btn_export = ft.ElevatedButton(
+            "Exportar Histórico",
+            icon=ft.icons.ARCHIVE,
+            on_click=export_click,
+            bgcolor="white", color=MEDICAL_BLUE,
+            style=ft.ButtonStyle(shape=ft.RoundedRectangleBorder(radius=12), elevation=1)
+        )
+
+        # --- HISTÓRICO / BUSCA (SQLite + FTS5 no aparelho) ---
+        # Carrega só uma página por vez (keyset por id): rápido mesmo com milhares de consultas
+        history_state = {"query": "", "last_id": None}
+        history_list = ft.ListView(spacing=2, height=360)
+        btn_more = ft.TextButton("Carregar mais", visible=False)
+        txt_search = ft.TextField(
+            label="Buscar no histórico (sintomas, diagnóstico, medicamento)",
+            prefix_icon=ft.icons.SEARCH, border_radius=12, dense=True,
+        )
+
+        def load_history_page(reset):
+            if reset:
+                history_state["query"] = (txt_search.value or "").strip()
+                history_state["last_id"] = None
+                history_list.controls.clear()
+
+            def task():
+                from datetime import datetime
+                try:
+                    rows = get_history().search(history_state["query"], before_id=history_state["last_id"])
+                except Exception as ex:
+                    page.show_snack_bar(ft.SnackBar(ft.Text(f"Erro no histórico: {ex}"), bgcolor="red"))
+                    rows = []
+                for row in rows:
+                    when = datetime.fromtimestamp(row["criado_em"]).strftime('%d/%m/%Y %H:%M')
+                    history_list.controls.append(ft.ListTile(
+                        leading=ft.Icon(ft.icons.DESCRIPTION, color=MEDICAL_BLUE),
+                        title=ft.Text(f"{when} - {(row['avaliacao'] or 'Sem avaliação')[:60]}", size=13),
+                        subtitle=ft.Text(row["trecho"] or row["medicamentos"] or "", size=11, max_lines=2),
+                        dense=True,
+                        on_click=lambda e, cid=row["id"]: open_history_item(cid),
+                    ))
+                if rows:
+                    history_state["last_id"] = rows[-1]["id"]
+                if not history_list.controls:
+                    history_list.controls.append(ft.Text("Nenhuma consulta encontrada.", italic=True, color=NEUTRAL_GREY))
+                btn_more.visible = len(rows) == history_store.PAGE_SIZE
+                page.update()
+
+            threading.Thread(target=task, daemon=True).start()
+
+        def open_history_item(consulta_id):
+            item = get_history().get(consulta_id)
+            if not item:
+                return
+            history_col.visible = False
+            container_placeholder.visible = False
+            txt_status.value = "Consulta do histórico."
+            show_results({**item["data"], "history_id": item["id"], "audit": item["audit"]})
+
+        def toggle_history(e):
+            history_col.visible = not history_col.visible
+            if history_col.visible:
+                load_history_page(reset=True)
+            page.update()
+
+        txt_search.on_submit = lambda e: load_history_page(reset=True)
+        btn_more.on_click = lambda e: load_history_page(reset=False)
+        history_col = ft.Column([
+            txt_search,
+            history_list,
+            ft.Row([btn_more], alignment=ft.MainAxisAlignment.CENTER),
+        ], visible=False)
+
+        btn_history = ft.ElevatedButton(
+            "Histórico",
+            icon=ft.icons.HISTORY,
+            on_click=toggle_history,
+            bgcolor="white", color=MEDICAL_BLUE,
+            style=ft.ButtonStyle(shape=ft.RoundedRectangleBorder(radius=12), elevation=1)
+        )
+
         def show_results(data):
             result_col.controls.clear()
             result_col.data = data # Persiste dados para PDF
+            result_col.audit = None # Checagem do catálogo (reaproveitada no PDF)
 
             
             # --- BLOCOS SOAP ---
@@ -696,33 +852,61 @@ def main(page: ft.Page):
             if not meds:
                  med_content.append(ft.Container(content=ft.Text("Nenhum medicamento identificado.", italic=True), padding=10))
             else:
-                audit = check_meds_debug(meds)
+                audit = data.get("audit") or check_meds_debug(meds)
+                result_col.audit = audit
+                if data.get("history_id") and not data.get("audit"):
+                    try: get_history().set_audit(data["history_id"], audit)
+                    except Exception as ex: print(f"Erro salvando auditoria no histórico: {ex}")
                 
+                import catalog_index
+
+                def rotulo(label, res):
+                    # Consta na lista, mas não na dose/forma pedida: a ressalva vai no próprio selo
+                    ressalva = catalog_index.NAO_EXATO.get(res.get('tipo'))
+                    return f"{label} ({ressalva})" if ressalva else label
+
                 for item in audit["items"]:
                     name = item['ia_term']
                     tags = []
                     
                     if item['remume']['found']: 
-                        tags.append(ft.Container(content=ft.Text("REMUME", size=10, color="white", weight="bold"), bgcolor=SUCCESS_GREEN, padding=5, border_radius=4))
+                        tags.append(ft.Container(content=ft.Text(rotulo("REMUME", item['remume']), size=10, color="white", weight="bold"), bgcolor=SUCCESS_GREEN, padding=5, border_radius=4))
                     if item['alto_custo']['found']:
-                         tags.append(ft.Container(content=ft.Text("ALTO CUSTO", size=10, color="white", weight="bold"), bgcolor=WARNING_ORANGE, padding=5, border_radius=4))
+                         tags.append(ft.Container(content=ft.Text(rotulo("ALTO CUSTO", item['alto_custo']), size=10, color="white", weight="bold"), bgcolor=WARNING_ORANGE, padding=5, border_radius=4))
                     if item['rename']['found']:
-                         tags.append(ft.Container(content=ft.Text("RENAME", size=10, color="white", weight="bold"), bgcolor=MEDICAL_BLUE, padding=5, border_radius=4))
+                         tags.append(ft.Container(content=ft.Text(rotulo("RENAME", item['rename']), size=10, color="white", weight="bold"), bgcolor=MEDICAL_BLUE, padding=5, border_radius=4))
                     
                     if not tags:
                         tags.append(ft.Container(content=ft.Text("NÃO CONSTA", size=10, color="white"), bgcolor="red", padding=5, border_radius=4))
 
+                    # Nome parecido (possível erro de digitação): à parte, não conta como disponível
+                    sugestoes = [f"{db.upper().replace('_', ' ')}: {item[db]['sugestao']['match']}"
+                                 for db in ['remume', 'alto_custo', 'rename'] if item[db].get('sugestao')]
+                    linhas = [ft.Text(name.title(), weight="bold", size=16), ft.Row(tags, wrap=True)]
+                    if sugestoes:
+                        linhas.append(ft.Text("Você quis dizer? " + " | ".join(sugestoes), size=11, italic=True, color=WARNING_ORANGE))
+
                     med_content.append(
                         ft.Container(
-                            content=ft.Column([
-                                ft.Text(name.title(), weight="bold", size=16),
-                                ft.Row(tags, wrap=True)
-                            ]),
+                            content=ft.Column(linhas),
                             padding=ft.padding.all(12),
                             border=ft.border.only(bottom=ft.border.BorderSide(1, "#EEEEEE"))
                         )
                     )
 
+                # --- ALTO CUSTO / LME (modo backend: índice CID do servidor, /catalogo/cid) ---
+                lme = data.get("lme") or {}
+                if lme.get("medicamentos"):
+                    cids_txt = ", ".join(lme.get("cids", [])) or "nenhum CID no diagnóstico"
+                    lme_linhas = [ft.Text(f"Alto Custo / LME — CIDs: {cids_txt}", weight="bold", size=13)]
+                    for m in lme["medicamentos"]:
+                        if m["autorizado"]:
+                            txt, cor = f"✅ {m['alto_custo']}: autorizado ({', '.join(m['cids'])})", SUCCESS_GREEN
+                        else:
+                            txt, cor = f"⚠️ {m['alto_custo']}: CID do diagnóstico não autoriza a LME", WARNING_ORANGE
+                        lme_linhas.append(ft.Text(txt, size=12, color=cor))
+                    med_content.append(ft.Container(content=ft.Column(lme_linhas), padding=ft.padding.all(12)))
+
                 # --- DEBUG PANEL ---
                 debug_info = []
                 debug_info.append(ft.Text(f"Total IA: {len(meds)} | REMUME({audit['meta']['count_remume']}) RENAME({audit['meta']['count_rename']})", size=11, color="grey"))
@@ -734,6 +918,11 @@ def main(page: ft.Page):
                     for db in ['remume', 'alto_custo', 'rename']:
                         status = "✅" if item[db]['found'] else "❌"
                         match_txt = f": {item[db]['match']}" if item[db]['match'] else ""
+                        if item[db].get('tipo'):
+                            match_txt += f" ({item[db]['tipo']} {item[db]['score']:.2f})"
+                        elif item[db].get('sugestao'):
+                            sug = item[db]['sugestao']
+                            match_txt += f" ≈ {sug['match']}? ({sug['tipo']} {sug['score']:.2f})"
                         color = "green" if item[db]['found'] else "red"
                         debug_info.append(ft.Text(f"{status} {db.upper()}{match_txt}", color=color, size=10))
 
@@ -781,6 +970,40 @@ def main(page: ft.Page):
             result_col.visible = True
             page.update()
 
+        # --- WORKER DA FILA OFFLINE ---
+        txt_queue = ft.Text("", size=12, color=WARNING_ORANGE)
+
+        def refresh_queue_status():
+            try:
+                counts = get_job_queue().counts()
+            except Exception as ex:
+                print(f"Erro lendo a fila: {ex}")
+                return
+            pending = counts.get(job_queue.PENDENTE, 0) + counts.get(job_queue.EXECUTANDO, 0)
+            txt_queue.value = f"{pending} consulta(s) aguardando conexão na fila." if pending else ""
+
+        def process_job(job):
+            api_key = api_key_ref.current.value or saved_key
+            return run_gemini_analysis(api_key, job["audio_path"])
+
+        def on_job_done(job, res):
+            # Fim do job (sucesso ou falha definitiva): a cópia do áudio em fila/ não serve mais
+            remove_queue_audio(job["audio_path"])
+            refresh_queue_status()
+            if "error" in res:
+                page.show_snack_bar(ft.SnackBar(ft.Text(f"Consulta #{job['id']} da fila falhou: {res['error'][:60]}"), bgcolor="red"))
+            else:
+                page.show_snack_bar(ft.SnackBar(
+                    ft.Text(f"Consulta #{job['id']} da fila concluída."), bgcolor=SUCCESS_GREEN,
+                    action="Ver", on_action=lambda e: show_results(res), duration=10000
+                ))
+            page.update()
+
+        clean_queue_audio()
+        queue_worker = job_queue.QueueWorker(get_job_queue(), process_job, concurrency=QUEUE_CONCURRENCY,
+                                             on_done=on_job_done).start()
+        refresh_queue_status()
+
         # Montagem Final
         page.add(
             header,
@@ -790,13 +1013,15 @@ def main(page: ft.Page):
                     txt_api_key,
                     ft.Container(height=20),
                     # Row de Ações (Seleção)
-                    ft.Row([btn_select], alignment="center", spacing=10, wrap=True),
+                    ft.Row([btn_select, btn_history, btn_export], alignment="center", spacing=10, wrap=True),
                     ft.Container(height=10),
                     
                     ft.Row([btn_process], alignment="center"), # Processar separado para destaque
                     
                     ft.Container(content=txt_status, alignment=ft.alignment.center),
+                    ft.Container(content=txt_queue, alignment=ft.alignment.center),
                     ft.Divider(color="transparent", height=10),
+                    history_col,
                     container_placeholder,
                     result_col,
                     ft.Container(height=50) # Bottom padding
@@ -804,6 +1029,8 @@ def main(page: ft.Page):
                 padding=20
             )
         )
+        startup_profile.mark("primeiro page.update")
+        startup_profile.finish(app_storage.data_path("startup_profile.txt"))
 
     except Exception as e:
         # TELA DE ERRO FATAL (Blue Screen of Life)
@@ -0,0 +1,249 @@
+from collections import deque
+
+# Motor de matching do catálogo (sem dependências externas, roda no Android).
+#
+# Antes: para cada medicamento, loop em TODA a lista testando
+#   `termo in item or item in termo` e devolvendo o primeiro que casasse.
+# Agora:
+#   - item dentro do termo  -> automato Aho-Corasick (todos os nomes do catálogo
+#     contidos no termo numa única passada pelo texto)
+#   - termo dentro do item  -> índice de trigramas (candidatos = interseção das
+#     postings, depois confirma com `in`)
+# e os candidatos são ranqueados (o melhor, não o primeiro).
+
+MIN_PATTERN_LEN = 3  # Ignora entradas muito curtas ("a", "b", "ou") -> falso positivo
+
+
+class AhoCorasick:
+    """Automato multi-padrão: acha todas as ocorrências de todos os padrões em O(len(texto) + ocorrências)."""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]  # ids de padrão que terminam neste estado
+        self.lengths = []
+
+        for pid, pattern in enumerate(patterns):
+            self.lengths.append(len(pattern))
+            state = 0
+            for ch in pattern:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                    self.goto[state][ch] = nxt
+                state = nxt
+            self.out[state].append(pid)
+
+        # BFS para os links de falha; herda as saídas do estado de falha
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def find_all(self, text):
+        """Gera (inicio, fim, pattern_id) para cada ocorrência."""
+        goto, fail, out, lengths = self.goto, self.fail, self.out, self.lengths
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for pid in out[state]:
+                yield i + 1 - lengths[pid], i + 1, pid
+
+
+class NgramIndex:
+    """Índice invertido trigrama -> ids, para achar itens que CONTÊM um termo."""
+
+    def __init__(self, texts, n=3):
+        self.n = n
+        self.texts = texts
+        self.postings = {}
+        for idx, text in enumerate(texts):
+            for gram in {text[i:i + n] for i in range(len(text) - n + 1)}:
+                self.postings.setdefault(gram, set()).add(idx)
+
+    def containing(self, term):
+        """Ids (ordenados) de todos os textos que contêm `term` como substring."""
+        n = self.n
+        if len(term) < n:
+            return [i for i, t in enumerate(self.texts) if term in t]
+
+        grams = sorted({term[i:i + n] for i in range(len(term) - n + 1)},
+                       key=lambda g: len(self.postings.get(g, ())))
+        candidates = None
+        for gram in grams:
+            posting = self.postings.get(gram)
+            if not posting:
+                return []
+            candidates = set(posting) if candidates is None else candidates & posting
+            if not candidates:
+                return []
+        return sorted(i for i in candidates if term in self.texts[i])
+
+
+def _word_bounded(text, start, end):
+    before = start == 0 or not text[start - 1].isalnum()
+    after = end == len(text) or not text[end].isalnum()
+    return before and after
+
+
+class Matcher:
+    """
+    Ranqueia itens de uma lista normalizada contra um termo normalizado.
+    Score em [0, 1]: 1.0 = exato; parcial = fração do texto maior coberta pelo menor,
+    com penalidade quando o casamento corta palavras no meio.
+    """
+
+    BOUNDARY_PENALTY = 0.7
+
+    def __init__(self, norms):
+        self.norms = norms
+        self.exact = {}
+        for idx, norm in enumerate(norms):
+            self.exact.setdefault(norm, idx)
+
+        # Padrões únicos (>= MIN_PATTERN_LEN) -> ids dos itens com esse nome
+        self.pattern_items = {}
+        for idx, norm in enumerate(norms):
+            if len(norm) >= MIN_PATTERN_LEN:
+                self.pattern_items.setdefault(norm, []).append(idx)
+        self.patterns = list(self.pattern_items)
+        self.automaton = AhoCorasick(self.patterns)
+        self.ngrams = NgramIndex(norms)
+
+    def rank(self, term_norm, top_n=5):
+        """Lista de (score, idx) em ordem decrescente (empate: ordem original da lista)."""
+        if not term_norm:
+            return []
+        if term_norm in self.exact:
+            return [(1.0, self.exact[term_norm])]
+
+        scores = {}
+
+        # 1. Itens do catálogo contidos no termo ("losartana" em "losartana potassica 50mg")
+        for start, end, pid in self.automaton.find_all(term_norm):
+            pattern = self.patterns[pid]
+            score = len(pattern) / len(term_norm)
+            if not _word_bounded(term_norm, start, end):
+                score *= self.BOUNDARY_PENALTY
+            for idx in self.pattern_items[pattern]:
+                if score > scores.get(idx, 0):
+                    scores[idx] = score
+
+        # 2. Termo contido em itens do catálogo ("dipirona" em "dipirona sodica 500mg comp")
+        if len(term_norm) >= MIN_PATTERN_LEN:
+            for idx in self.ngrams.containing(term_norm):
+                text = self.norms[idx]
+                pos = text.find(term_norm)
+                score = len(term_norm) / len(text)
+                if not _word_bounded(text, pos, pos + len(term_norm)):
+                    score *= self.BOUNDARY_PENALTY
+                if score > scores.get(idx, 0):
+                    scores[idx] = score
+
+        ranked = sorted(((s, i) for i, s in scores.items()), key=lambda x: (-x[0], x[1]))
+        return ranked[:top_n]
+
+    def best(self, term_norm):
+        ranked = self.rank(term_norm, top_n=1)
+        return ranked[0] if ranked else None
+
+
+# --- SIMILARIDADE POR TRIGRAMAS (nomes com erro de digitação / variações) ---
+try:
+    import numpy as np
+except ImportError:  # Android sem numpy: cai no caminho em Python puro
+    np = None
+
+
+def trigrams(text):
+    """Trigramas por palavra com padding (estilo pg_trgm): "dipirona" -> {"  d", " di", "dip", ..., "na "}."""
+    grams = set()
+    for word in text.split():
+        word = "".join(ch for ch in word if ch.isalnum())
+        if not word:
+            continue
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+class TrigramIndex:
+    """
+    Índice invertido trigrama -> ids com score de Dice: 2|A∩B| / (|A|+|B|).
+    `top_batch` pontua uma receita inteira (vários termos) numa passada vetorizada.
+    """
+
+    def __init__(self, norms):
+        self.size = len(norms)
+        self.gram_counts = []
+        postings = {}
+        for idx, norm in enumerate(norms):
+            grams = trigrams(norm)
+            self.gram_counts.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(idx)
+
+        if np is not None:
+            self.postings = {g: np.asarray(ids, dtype=np.int32) for g, ids in postings.items()}
+            self.gram_counts_arr = np.asarray(self.gram_counts, dtype=np.float32)
+        else:
+            self.postings = postings
+
+    def top_batch(self, terms_norm, top_n=3, threshold=0.45):
+        """Para cada termo: [(score, idx), ...] com score >= threshold, ordem decrescente."""
+        query_grams = [trigrams(t) for t in terms_norm]
+        if not self.size or not terms_norm:
+            return [[] for _ in terms_norm]
+        if np is None:
+            return [self._top_python(q, top_n, threshold) for q in query_grams]
+
+        # Uma única bincount para todos os termos: linha = termo, coluna = item do catálogo
+        rows, cols = [], []
+        for qi, grams in enumerate(query_grams):
+            for gram in grams:
+                ids = self.postings.get(gram)
+                if ids is not None:
+                    cols.append(ids)
+                    rows.append(np.full(len(ids), qi, dtype=np.int64))
+        if not cols:
+            return [[] for _ in terms_norm]
+
+        flat = np.concatenate(rows) * self.size + np.concatenate(cols)
+        inter = np.bincount(flat, minlength=len(terms_norm) * self.size)
+        inter = inter.reshape(len(terms_norm), self.size).astype(np.float32)
+
+        q_sizes = np.asarray([len(g) for g in query_grams], dtype=np.float32)[:, None]
+        dice = 2.0 * inter / np.maximum(q_sizes + self.gram_counts_arr[None, :], 1.0)
+
+        results = []
+        k = min(top_n, self.size)
+        for row in dice:
+            top = np.argpartition(-row, k - 1)[:k]
+            top = top[np.lexsort((top, -row[top]))]  # score desc, empate pela ordem da lista
+            results.append([(float(row[i]), int(i)) for i in top if row[i] >= threshold])
+        return results
+
+    def _top_python(self, grams, top_n, threshold):
+        inter = {}
+        for gram in grams:
+            for idx in self.postings.get(gram, ()):
+                inter[idx] = inter.get(idx, 0) + 1
+        scored = []
+        for idx, common in inter.items():
+            score = 2.0 * common / max(len(grams) + self.gram_counts[idx], 1)
+            if score >= threshold:
+                scored.append((score, idx))
+        scored.sort(key=lambda x: (-x[0], x[1]))
+        return scored[:top_n]
@@ -0,0 +1,113 @@
+import re
+from collections import namedtuple
+from unidecode import unidecode
+
+# Parser estruturado de apresentações de medicamentos.
+#   "Dipirona sódica 500mg/ml gotas 10 ml frasco"
+#       -> MedKey(ingrediente="dipirona", doses=((500.0, "mg/ml"),), forma="gotas", atc="")
+#   RENAME: nome "maleato de enalapril" + detalhes "10 mg comprimido Básico C09AA02"
+#       -> MedKey("enalapril", ((10.0, "mg"),), "comprimido", "C09AA02")
+# Com isso a maioria das checagens vira lookup em dicionário; fuzzy só como fallback.
+
+MedKey = namedtuple("MedKey", ["ingrediente", "doses", "forma", "atc"])
+
+_NUM = r'\d+(?:[.,]\d+)*'
+_UNIT = r'(?:mcg|µg|mg|g|ui|ml|meq|%)'
+_PER = r'(?:\s*/\s*(?:' + _NUM + r'\s*)?(?:ml|mg|g|l|dose|gota))?'
+# Gramática única de dose: o backend (parser_core) monta o STRENGTH_RE dele a partir daqui
+STRENGTH_PATTERN = r'(' + _NUM + r')\s*(' + _UNIT + _PER + r')(?![a-zà-ú])'
+STRENGTH_RE = re.compile(STRENGTH_PATTERN, re.IGNORECASE)
+ATC_RE = re.compile(r'\b([A-Z]\d{2}[A-Z]{2}\d{2})\b')
+COMPONENT_SPLIT_RE = re.compile(r'\+\s*(?=[a-z])')
+
+# Sais / qualificadores que não mudam o princípio ativo para fins de disponibilidade
+SALT_WORDS = {
+    "cloridrato", "dicloridrato", "bromidrato", "maleato", "besilato", "mesilato", "succinato",
+    "tartarato", "fumarato", "hemifumarato", "sodica", "sodico", "potassica", "potassico",
+    "calcica", "acetato", "sulfato", "fosfato", "nitrato", "carbonato", "estearato", "lactato",
+    "decanoato", "monoidratada", "monoidratado", "butilbrometo", "valerato", "cipionato", "enantato",
+    "citrato", "potassio",
+}
+STOP_WORDS = {"de", "do", "da", "e", "com", "p/", "a"}
+
+# Formas farmacêuticas (multi-palavra primeiro) -> nome canônico
+FORM_SYNONYMS = [
+    ("solucao injetavel", "injetavel"), ("po para solucao injetavel", "injetavel"),
+    ("suspensao injetavel", "injetavel"), ("frasco-ampola", "injetavel"),
+    ("solucao oral", "solucao oral"), ("sol. oral", "solucao oral"),
+    ("suspensao oral", "suspensao oral"), ("solucao nasal", "solucao nasal"),
+    ("comprimido", "comprimido"), ("comprimidos", "comprimido"), ("comp", "comprimido"),
+    ("cp", "comprimido"), ("capsula", "capsula"), ("caps", "capsula"), ("cap", "capsula"),
+    ("ampola", "injetavel"), ("injetavel", "injetavel"), ("gotas", "gotas"),
+    ("xarope", "xarope"), ("suspensao", "suspensao oral"), ("creme", "creme"),
+    ("pomada", "pomada"), ("gel", "gel"), ("locao", "locao"), ("adesivo", "adesivo"),
+    ("aerossol", "aerossol"), ("sache", "sache"), ("xampu", "xampu"), ("caneta", "injetavel"),
+]
+_FORM_RES = [(re.compile(r'(?<![a-z])' + re.escape(k) + r'(?![a-z])'), v) for k, v in FORM_SYNONYMS]
+FORM_WORDS = {w for k, _ in FORM_SYNONYMS for w in k.split()} | {"frasco", "bisnaga"}
+
+
+def _norm(text) -> str:
+    return " ".join(unidecode(str(text or "")).lower().split())
+
+
+def parse_number(raw: str) -> float:
+    """"1.200.000" -> 1200000.0 | "0,5" -> 0.5 | "27.9" -> 27.9"""
+    if re.fullmatch(r'\d{1,3}(?:\.\d{3})+', raw):
+        raw = raw.replace(".", "")
+    try:
+        return float(raw.replace(",", "."))
+    except ValueError:
+        return 0.0
+
+
+def parse_doses(text_norm: str) -> tuple:
+    doses = []
+    for m in STRENGTH_RE.finditer(text_norm):
+        unit = re.sub(r'\s+', '', m.group(2).lower()).replace("µg", "mcg")
+        doses.append((parse_number(m.group(1)), unit))
+    return tuple(doses)
+
+
+def parse_form(text_norm: str) -> str:
+    best = None
+    for rx, canon in _FORM_RES:
+        m = rx.search(text_norm)
+        if m and (best is None or m.start() < best[0]):
+            best = (m.start(), canon)
+    return best[1] if best else ""
+
+
+def _ingredient_component(part: str) -> str:
+    part = re.sub(r'\([^)]*\)', ' ', part)  # "(Vit. C)", "(FN)", "(lipossomal)"
+    m = re.search(r'\d', part)
+    if m:
+        part = part[:m.start()]  # nome vem antes da dose
+    words = []
+    for w in re.split(r'[\s,;]+', part):
+        w = w.strip(".-–")
+        if not w or w in STOP_WORDS or w in SALT_WORDS or w in FORM_WORDS:
+            continue
+        words.append(w)
+    return " ".join(words)
+
+
+def parse_ingredient(name_norm: str) -> str:
+    """Princípio ativo canônico: sem sal, sem dose/forma; combinações ordenadas ("a + b")."""
+    components = [_ingredient_component(p) for p in COMPONENT_SPLIT_RE.split(name_norm)]
+    components = sorted({c for c in components if c})
+    return " + ".join(components)
+
+
+def parse(text: str, detalhes: str = "") -> MedKey:
+    """Apresentação livre (REMUME/IA) ou nome + detalhes (RENAME) -> MedKey."""
+    raw = f"{text} {detalhes}".strip()
+    atc_m = ATC_RE.search(raw)
+    name_norm = _norm(text)
+    full_norm = _norm(raw)
+    return MedKey(
+        ingrediente=parse_ingredient(name_norm),
+        doses=parse_doses(full_norm),
+        forma=parse_form(full_norm),
+        atc=atc_m.group(1) if atc_m else ""
+    )
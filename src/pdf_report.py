@@ -0,0 +1,171 @@
+import os
+import zipfile
+import tempfile
+from datetime import datetime
+from fpdf import FPDF
+from unidecode import unidecode
+
+import catalog_index
+
+# Relatório PDF da consulta (carregado sob demanda pelo main.py: fpdf é pesado no startup)
+
+class PDFReport(FPDF):
+    def header(self):
+        self.set_font('Arial', 'B', 16)
+        self.set_text_color(0, 82, 204) # MEDICAL_BLUE
+        self.cell(0, 10, 'MEDUBS - Relatório Clínico', 0, 1, 'C')
+        self.ln(5)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('Arial', 'I', 8)
+        self.set_text_color(128)
+        self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'C')
+
+# Helper para texto seguro (FPDF Clássico não suporta UTF-8 nativo bem)
+def safe_txt(text):
+    if not text: return "-"
+    return unidecode(str(text))
+
+def _new_pdf():
+    pdf = PDFReport()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    return pdf
+
+def write_consultation(pdf, data, audit=None, titulo=None):
+    """Adiciona as páginas de uma consulta. `audit` = check_meds_debug já calculado na tela."""
+    pdf.add_page()
+
+    # Data/Hora
+    pdf.set_font("Arial", size=10)
+    pdf.set_text_color(100)
+    now = datetime.now().strftime("%d/%m/%Y %H:%M")
+    pdf.cell(0, 10, safe_txt(titulo or f"Gerado em: {now}"), ln=True, align='R')
+    pdf.ln(5)
+
+    # SOAP
+    soap = data.get("soap", {})
+    suggestions = data.get("sugestoes", {})
+    
+    sections = [
+        ("Subjetivo", soap.get('s'), "s"),
+        ("Objetivo", soap.get('o'), "o"),
+        ("Avaliacao", soap.get('a'), "a"), # Unidecoded title
+        ("Plano", soap.get('p'), "p")
+    ]
+
+    for title, content, key in sections:
+        # Título Seção
+        pdf.set_font("Arial", 'B', 12)
+        pdf.set_text_color(0, 0, 0)
+        pdf.set_fill_color(240, 240, 240)
+        pdf.cell(0, 8, safe_txt(f" {title}"), 1, 1, 'L', fill=True)
+        
+        # Conteúdo
+        pdf.set_font("Arial", size=11)
+        pdf.multi_cell(0, 6, safe_txt(content))
+        pdf.ln(2)
+        
+        # Sugestões
+        sugs = suggestions.get(key, [])
+        if sugs:
+            pdf.set_font("Arial", 'I', 10)
+            pdf.set_text_color(100, 100, 100)
+            pdf.cell(0, 6, safe_txt("Sugestões da IA:"), ln=True)
+            for s in sugs:
+                 pdf.multi_cell(0, 5, safe_txt(f" - {s}"))
+            pdf.ln(3)
+        
+        pdf.ln(3)
+
+    # Medicamentos
+    pdf.add_page()
+    pdf.set_font("Arial", 'B', 12)
+    pdf.set_text_color(0, 0, 0)
+    pdf.set_fill_color(227, 242, 253) # Light Blue
+    pdf.cell(0, 8, safe_txt(" Prescrição & Análise"), 1, 1, 'L', fill=True)
+    pdf.ln(5)
+
+    meds = data.get("medicamentos", [])
+    if not meds:
+        pdf.set_font("Arial", 'I', 11)
+        pdf.cell(0, 10, safe_txt("Nenhum medicamento identificado."), ln=True)
+        return
+
+    pdf.set_font("Arial", size=10)
+    items = audit["items"] if audit else [{"ia_term": m} for m in meds]
+
+    for item in items:
+        name = item['ia_term'].title()
+        # Tags em texto (sem auditoria: só o nome)
+        tags = []
+        if audit:
+            for db, label in (('remume', "REMUME"), ('alto_custo', "ALTO CUSTO"), ('rename', "RENAME")):
+                if item[db]['found']:
+                    ressalva = catalog_index.NAO_EXATO.get(item[db].get('tipo'))
+                    tags.append(f"[{label} - {ressalva}]" if ressalva else f"[{label}]")
+            if not tags: tags.append("[NAO CONSTA]")
+        
+        tag_str = " ".join(tags)
+        
+        pdf.set_font("Arial", 'B', 11)
+        pdf.cell(0, 6, safe_txt(f"{name}"), ln=True)
+        if tag_str:
+            pdf.set_font("Arial", size=9)
+            pdf.set_text_color(0, 82, 204)
+            pdf.cell(0, 5, safe_txt(f"{tag_str}"), ln=True)
+        
+            # Detalhes Match
+            pdf.set_text_color(80)
+            for db in ['remume', 'alto_custo', 'rename']:
+                if item[db]['found']:
+                     match = item[db]['match']
+                     pdf.cell(0, 4, safe_txt(f"  -> {db.upper()}: {match}"), ln=True)
+                elif item[db].get('sugestao'):
+                     match = item[db]['sugestao']['match']
+                     pdf.cell(0, 4, safe_txt(f"  ?? {db.upper()}: parecido com {match} (conferir)"), ln=True)
+        
+        pdf.set_text_color(0)
+        pdf.ln(3)
+
+def generate_pdf_report(data, path, audit=None):
+    """Gera o PDF de uma consulta e grava direto em `path` (sem devolver os bytes)."""
+    pdf = _new_pdf()
+    write_consultation(pdf, data, audit)
+    pdf.output(path, 'F')
+    return path
+
+def export_batch_pdf(consultas, path, check_meds=None, on_progress=None):
+    """
+    Várias consultas num PDF só. `consultas`: [{"data": {...}, "audit": ..., "titulo": ...}].
+    Sem audit salvo, usa `check_meds(meds)` (índice do catálogo já em memória).
+    """
+    pdf = _new_pdf()
+    total = len(consultas)
+    for i, c in enumerate(consultas):
+        write_consultation(pdf, c["data"], _audit_for(c, check_meds), c.get("titulo"))
+        if on_progress:
+            on_progress(i + 1, total)
+    pdf.output(path, 'F')
+    return path
+
+def export_batch_zip(consultas, path, check_meds=None, on_progress=None):
+    """Um PDF por consulta dentro de um .zip (cada PDF vai para o zip e sai da memória)."""
+    total = len(consultas)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf, tempfile.TemporaryDirectory() as tmp:
+        for i, c in enumerate(consultas):
+            pdf_path = os.path.join(tmp, f"consulta_{i + 1:03d}.pdf")
+            pdf = _new_pdf()
+            write_consultation(pdf, c["data"], _audit_for(c, check_meds), c.get("titulo"))
+            pdf.output(pdf_path, 'F')
+            zf.write(pdf_path, c.get("arquivo") or os.path.basename(pdf_path))
+            os.remove(pdf_path)
+            if on_progress:
+                on_progress(i + 1, total)
+    return path
+
+def _audit_for(consulta, check_meds):
+    if consulta.get("audit") is not None:
+        return consulta["audit"]
+    meds = consulta["data"].get("medicamentos", [])
+    return check_meds(meds) if (check_meds and meds) else None
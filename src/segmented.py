@@ -0,0 +1,149 @@
+import os
+import re
+import json
+import time
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import audio_prep
+import gemini_client
+
+# Consultas longas: uma requisição única com o áudio inteiro estoura o timeout /
+# limite de payload. Aqui o áudio é cortado em segmentos (nos silêncios, com
+# sobreposição), cada segmento é transcrito em paralelo (respeitando o limite de
+# requisições por minuto) e um passo final só de texto gera o JSON SOAP único.
+
+DEFAULT_MODEL = "gemini-2.5-flash"
+
+LONG_AUDIO_S = 300      # acima disso os clientes usam o modo segmentado
+SEGMENT_S = 120         # tamanho alvo do segmento...
+MAX_SEGMENT_S = 180     # ...corta no frame mais silencioso entre alvo e máximo
+OVERLAP_S = 2           # sobreposição para não perder palavra na emenda
+SEGMENT_TIMEOUT = 90
+
+TRANSCRIBE_PROMPT = """
+Transcreva fielmente este trecho ({idx}/{total}) de uma consulta médica em português.
+Identifique os falantes como "Médico:" e "Paciente:" quando possível.
+Responda apenas com a transcrição, sem comentários.
+"""
+
+MERGE_PROMPT = """
+A seguir estão as transcrições, em ordem, dos {total} trechos de uma mesma consulta médica.
+Trechos consecutivos se sobrepõem em ~{overlap}s: ignore falas repetidas na emenda.
+
+{transcripts}
+
+Com base na consulta COMPLETA:
+{instructions}
+"""
+
+
+class RateLimiter:
+    """Espaça o início das requisições: no máximo `rpm` por minuto (thread-safe)."""
+
+    def __init__(self, rpm):
+        self.interval = 60.0 / rpm if rpm else 0.0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def split_points(samples, rate, segment_s=SEGMENT_S, max_segment_s=MAX_SEGMENT_S, overlap_s=OVERLAP_S):
+    """[(inicio, fim), ...] em amostras; cada corte cai no frame de menor energia da janela [alvo, máximo]."""
+    total = len(samples)
+    if total <= max_segment_s * rate:
+        return [(0, total)]
+
+    db, frame = audio_prep.frame_energies(samples, rate)
+    overlap = int(overlap_s * rate)
+    segments = []
+    start = 0
+    while total - start > max_segment_s * rate:
+        lo = (start + int(segment_s * rate)) // frame
+        hi = (start + int(max_segment_s * rate)) // frame
+        cut = (lo + int(db[lo:hi].argmin())) * frame if hi > lo else hi * frame
+        segments.append((start, cut))
+        start = max(cut - overlap, start + 1)
+    segments.append((start, total))
+    return segments
+
+
+def write_segments(path, out_dir, **kwargs):
+    """Reamostra (16kHz mono), corta nos silêncios e grava seg_XX.wav. Retorna os caminhos."""
+    samples, rate = audio_prep.resample_wav(path)
+    paths = []
+    for i, (a, b) in enumerate(split_points(samples, rate, **kwargs)):
+        seg_path = os.path.join(out_dir, f"seg_{i:02d}.wav")
+        audio_prep.write_wav(seg_path, samples[a:b], rate)
+        paths.append(seg_path)
+    return paths
+
+
+def extract_json(raw_text):
+    match = re.search(r'\{.*\}', raw_text, re.DOTALL)
+    json_str = match.group(0) if match else raw_text
+    return json.loads(json_str.replace("```json", "").replace("```", "").strip())
+
+
+def transcribe_segments(api_key, paths, model=DEFAULT_MODEL, workers=3, rpm=10,
+                        on_progress=None, base_url=None):
+    """Transcreve os segmentos em paralelo. on_progress(feitos, total, msg) roda na thread chamadora."""
+    limiter = RateLimiter(rpm)
+    total = len(paths)
+
+    def work(idx, path):
+        limiter.wait()
+        result = gemini_client.generate_content(
+            api_key, TRANSCRIBE_PROMPT.format(idx=idx + 1, total=total), audio_path=path,
+            mime_type="audio/wav", model=model, timeout=SEGMENT_TIMEOUT, base_url=base_url
+        )
+        return gemini_client.response_text(result)
+
+    transcripts = [None] * total
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, total))) as pool:
+        futures = {pool.submit(work, i, p): i for i, p in enumerate(paths)}
+        done = 0
+        for future in as_completed(futures):
+            idx = futures[future]
+            transcripts[idx] = future.result()
+            done += 1
+            if on_progress:
+                on_progress(done, total, f"Trecho {idx + 1}/{total} transcrito")
+    return transcripts
+
+
+def analyze_long(api_key, path, instructions, model=DEFAULT_MODEL, workers=3, rpm=10,
+                 on_progress=None, base_url=None, **split_kwargs) -> dict:
+    """
+    Pipeline completo: segmentos -> transcrições paralelas -> merge num JSON só.
+    `instructions`: o prompt de saída do cliente (estrutura do JSON esperado).
+    Retorna o JSON do merge ou {"error": ..., "retryable": bool}.
+    """
+    tmp_dir = tempfile.mkdtemp(prefix="segmentos_")
+    try:
+        paths = write_segments(path, tmp_dir, **split_kwargs)
+        if on_progress:
+            on_progress(0, len(paths), f"Áudio dividido em {len(paths)} trechos")
+
+        transcripts = transcribe_segments(api_key, paths, model, workers, rpm, on_progress, base_url)
+        joined = "\n\n".join(f"[Trecho {i + 1}]\n{t.strip()}" for i, t in enumerate(transcripts))
+        prompt = MERGE_PROMPT.format(total=len(paths), overlap=split_kwargs.get("overlap_s", OVERLAP_S),
+                                     transcripts=joined, instructions=instructions)
+        if on_progress:
+            on_progress(len(paths), len(paths), "Consolidando consulta...")
+        result = gemini_client.generate_content(api_key, prompt, model=model, json_output=True,
+                                                timeout=120, base_url=base_url)
+        return extract_json(gemini_client.response_text(result))
+    except Exception as e:
+        return {"error": f"Erro no modo segmentado: {e}", "retryable": gemini_client.is_transient(e)}
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+import builtins
+import threading
+
+# Perfil de inicialização do app (cold start). Liga com MEDUBS_PROFILE_STARTUP=1:
+#   - tempo de cada import de primeiro nível feito durante o startup (inclui os
+#     imports aninhados dele, como o -X importtime faz com "cumulative")
+#   - marcos (ex.: "primeiro page.update") em ms desde o início do processo
+# Desligado, não instala nada (custo zero).
+
+ENV_VAR = "MEDUBS_PROFILE_STARTUP"
+ENABLED = os.environ.get(ENV_VAR, "") not in ("", "0")
+
+_t0 = time.perf_counter()
+_imports = []   # (modulo, ms)
+_marks = []     # (rotulo, ms desde _t0)
+_local = threading.local()
+_original_import = None
+
+
+def _profiled_import(name, globals=None, locals=None, fromlist=(), level=0):
+    depth = getattr(_local, "depth", 0)
+    top = name.partition(".")[0]
+    # Só mede imports de primeiro nível e que ainda não estão carregados
+    if depth or level or top in sys.modules:
+        _local.depth = depth + 1
+        try:
+            return _original_import(name, globals, locals, fromlist, level)
+        finally:
+            _local.depth = depth
+
+    _local.depth = 1
+    start = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        _local.depth = 0
+        _imports.append((name, (time.perf_counter() - start) * 1000))
+
+
+def install():
+    """Começa a medir os imports seguintes (chamar antes dos imports do app)."""
+    global _original_import
+    if ENABLED and _original_import is None:
+        _original_import = builtins.__import__
+        builtins.__import__ = _profiled_import
+
+
+def uninstall():
+    global _original_import
+    if _original_import is not None:
+        builtins.__import__ = _original_import
+        _original_import = None
+
+
+def mark(label):
+    if ENABLED:
+        _marks.append((label, (time.perf_counter() - _t0) * 1000))
+
+
+def report(top=15) -> str:
+    lines = ["=== Startup profile ==="]
+    for label, ms in _marks:
+        lines.append(f"{ms:8.1f} ms  {label}")
+    if _imports:
+        lines.append("--- imports (ms, cumulativo) ---")
+        for name, ms in sorted(_imports, key=lambda x: -x[1])[:top]:
+            lines.append(f"{ms:8.1f} ms  {name}")
+        lines.append(f"{sum(ms for _, ms in _imports):8.1f} ms  TOTAL imports medidos")
+    return "\n".join(lines)
+
+
+def finish(path=None):
+    """Para de medir, imprime e (opcional) grava o relatório. Retorna o texto ou None se desligado."""
+    if not ENABLED:
+        return None
+    uninstall()
+    text = report()
+    print(text)
+    if path:
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+        except OSError as e:
+            print(f"Erro gravando perfil de startup: {e}")
+    return text
@@ -0,0 +1,24 @@
+import analysis_cache
+
+
+def test_cache_hit_and_lru_eviction(tmp_path):
+    cache = analysis_cache.AnalysisCache(str(tmp_path / "cache.db"), max_entries=2)
+    audio = tmp_path / "a.wav"
+    audio.write_bytes(b"RIFF" + b"\x00" * 5000)
+    key = analysis_cache.make_key(analysis_cache.file_sha256(str(audio)), "v1", "gemini-2.5-flash")
+    assert key != analysis_cache.make_key(analysis_cache.file_sha256(str(audio)), "v2", "gemini-2.5-flash")
+
+    assert cache.get(key) is None
+    cache.put(key, {"soap": {"s": "cefaleia"}})
+    cache.put("b", {"x": 1})
+    assert cache.get(key) == {"soap": {"s": "cefaleia"}}  # key vira a mais recente
+    cache.put("c", {"x": 2})
+    assert len(cache) == 2
+    assert cache.get("b") is None and cache.get(key) is not None
+
+
+def test_cache_bounded_by_bytes(tmp_path):
+    cache = analysis_cache.AnalysisCache(str(tmp_path / "cache.db"), max_bytes=100)
+    cache.put("a", {"t": "x" * 60})
+    cache.put("b", {"t": "y" * 60})
+    assert cache.get("a") is None and cache.get("b") == {"t": "y" * 60}
@@ -0,0 +1,66 @@
+import os
+import wave
+import pytest
+
+np = pytest.importorskip("numpy")
+import audio_prep
+
+
+def _write_stereo_44k(path, seconds_pattern):
+    """Tom de 440Hz intercalado com silêncio: [(segundos, com_voz), ...]."""
+    rate = 44100
+    parts = []
+    for seconds, voiced in seconds_pattern:
+        t = np.arange(int(rate * seconds)) / rate
+        parts.append(0.5 * np.sin(2 * np.pi * 440 * t) if voiced else 0.0005 * np.random.randn(len(t)))
+    mono = np.concatenate(parts)
+    stereo = (np.repeat(mono[:, None], 2, axis=1) * 32767).astype("<i2")
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(stereo.tobytes())
+
+
+def test_preprocess_downmixes_resamples_and_trims(tmp_path):
+    src = tmp_path / "consulta.wav"
+    _write_stereo_44k(src, [(2, True), (5, False), (2, True)])
+
+    report = audio_prep.preprocess(str(src))
+    assert report["skipped"] is None
+    with wave.open(report["path"], "rb") as wav:
+        assert (wav.getnchannels(), wav.getframerate()) == (1, 16000)
+        seconds = wav.getnframes() / 16000
+    # 9s -> ~4.3s (pausa de 5s vira 0.3s)
+    assert 4.0 < seconds < 5.0
+    assert report["ratio"] > 5
+    # Saída temporária, nunca ao lado do original; cleanup apaga
+    assert report["temp"] and os.path.dirname(report["path"]) != str(tmp_path)
+    assert report["mime_type"] == "audio/wav"
+    audio_prep.cleanup(report)
+    assert not os.path.exists(report["path"]) and src.exists()
+
+
+def test_resample_keeps_duration_and_tone(tmp_path):
+    src = tmp_path / "tom.wav"
+    _write_stereo_44k(src, [(3, True)])
+    samples, rate = audio_prep.resample_wav(str(src))
+    assert abs(len(samples) - 3 * rate) <= 2
+    spectrum = np.abs(np.fft.rfft(samples))
+    assert abs(np.argmax(spectrum) * rate / len(samples) - 440) < 2
+
+
+def test_non_wav_is_passed_through(tmp_path):
+    src = tmp_path / "audio.mp3"
+    src.write_bytes(b"ID3" + b"\x00" * 100)
+    report = audio_prep.preprocess(str(src))
+    assert report["path"] == str(src) and report["skipped"] and report["mime_type"] == "audio/mp3"
+    audio_prep.cleanup(report)
+    assert src.exists()
+
+
+def test_unwritable_output_falls_back_to_original(tmp_path):
+    src = tmp_path / "consulta.wav"
+    _write_stereo_44k(src, [(1, True)])
+    report = audio_prep.preprocess(str(src), out_path=str(tmp_path / "nao_existe" / "saida.wav"))
+    assert report["path"] == str(src) and report["skipped"] and report["mime_type"] == "audio/wav"
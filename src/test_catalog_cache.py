@@ -0,0 +1,34 @@
+import os
+import json
+import catalog_cache
+
+
+def _write(path, data, mtime_ns=None):
+    path.write_text(json.dumps(data), encoding="utf-8")
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_cache_reloads_only_on_content_change(tmp_path):
+    remume = tmp_path / "remume.json"
+    _write(remume, ["Dipirona 500mg"], 1_000_000_000)
+    parsed = []
+
+    def parse(data):
+        parsed.append(1)
+        return data
+
+    cache = catalog_cache.CatalogCache({"remume": str(remume)}, {"remume": parse})
+    first = cache.get()
+    assert first.names["remume"] == ["Dipirona 500mg"]
+    assert first.index.search("remume", "dipirona")["found"]
+    assert cache.get() is first
+
+    # mtime novo, mesmo conteúdo: nada é reparseado
+    os.utime(remume, ns=(2_000_000_000, 2_000_000_000))
+    assert cache.get() is first and len(parsed) == 1
+
+    _write(remume, ["Dipirona 500mg", "Paracetamol 500mg"], 3_000_000_000)
+    second = cache.get()
+    assert second.version == first.version + 1
+    assert second.names["remume"] == ["Dipirona 500mg", "Paracetamol 500mg"]
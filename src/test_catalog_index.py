@@ -0,0 +1,121 @@
+import catalog_index
+
+SOURCES = {
+    "remume": ["Dipirona sódica 500mg comp", "Paracetamol 500mg comp", "Ácido fólico 5 mg comp"],
+    "rename": ["dipirona", "losartana potássica"],
+    "alto_custo": ["Abatacepte"],
+}
+
+
+def test_exact_and_partial_search():
+    index = catalog_index.CatalogIndex(SOURCES)
+    assert index.search("rename", "Dipirona") == {"found": True, "match": "dipirona", "score": 1.0, "tipo": "exato"}
+    # termo dentro do item do banco
+    assert index.search("remume", "acido folico")["match"] == "Ácido fólico 5 mg comp"
+    # item do banco dentro do termo
+    assert index.search("rename", "Losartana Potássica 50mg")["match"] == "losartana potássica"
+    assert index.search("alto_custo", "Dipirona") == {"found": False, "match": None}
+
+
+def test_ranked_best_match_instead_of_first():
+    index = catalog_index.CatalogIndex({
+        "remume": ["Paracetamol gotas 200 mg/ml 10 ml", "Paracetamol 500mg comp", "Metamizol"],
+    })
+    ranked = index.lists["remume"].rank("paracetamol")
+    assert [r["match"] for r in ranked] == ["Paracetamol 500mg comp", "Paracetamol gotas 200 mg/ml 10 ml"]
+    # Nome do catálogo contido no termo da IA
+    assert index.search("remume", "metamizol sodico")["match"] == "Metamizol"
+
+
+def test_trigram_similarity_handles_typos_in_batch():
+    index = catalog_index.CatalogIndex({
+        "rename": ["amoxicilina", "vitamina B2", "sinvastatina"],
+        "alto_custo": ["Atorvastatina"],
+    })
+    results = index.check_batch(["Amoxicilna", "Vitamina D", "Sinvastatina"])
+    # Erro de digitação não marca "found": vira sugestão para o médico conferir
+    assert not results[0]["rename"]["found"]
+    assert results[0]["rename"]["sugestao"]["match"] == "amoxicilina"
+    assert results[0]["rename"]["sugestao"]["tipo"] == "similar"
+    assert not results[1]["rename"]["found"]  # letra da vitamina precisa bater
+    assert not results[2]["alto_custo"]["found"]  # estatinas diferentes
+
+
+def test_similar_or_tiny_substring_is_not_found():
+    index = catalog_index.CatalogIndex({
+        "rename": ["ácido folínico", "salbutamol", "carbonato de cálcio + colecalciferol (vitamina D)"],
+        "alto_custo": ["Prednisona", "Desferroxamina"],
+    })
+    results = index.check_batch(["Prednisolona", "Ácido Fólico", "Sal", "Ferro", "Vitamina D"])
+    # Outro fármaco com nome parecido: nem encontrado nem sugerido
+    assert results[0]["alto_custo"] == {"found": False, "match": None}
+    assert results[1]["rename"] == {"found": False, "match": None}
+    # Substring curta ou no meio da palavra não conta
+    assert not results[2]["rename"]["found"]
+    assert not results[3]["alto_custo"]["found"]
+    assert not results[4]["rename"]["found"]
+    assert catalog_index.edit_distance("amoxicilna", "amoxicilina") == 1
+    assert catalog_index.edit_distance("prednisolona", "prednisona") == 2
+
+
+def test_trigram_numpy_and_python_paths_agree(monkeypatch):
+    import med_matcher
+    norms = ["amoxicilina", "amoxicilina potassio", "losartana", "captopril"]
+    terms = ["amoxicilna", "losartanna", "xyz"]
+    expected = med_matcher.TrigramIndex(norms).top_batch(terms, top_n=2, threshold=0.3)
+    monkeypatch.setattr(med_matcher, "np", None)
+    fallback = med_matcher.TrigramIndex(norms).top_batch(terms, top_n=2, threshold=0.3)
+    assert [[(round(s, 4), i) for s, i in row] for row in expected] == \
+           [[(round(s, 4), i) for s, i in row] for row in fallback]
+
+
+def test_aho_corasick_finds_all_patterns():
+    from med_matcher import AhoCorasick
+    ac = AhoCorasick(["he", "she", "hers"])
+    found = sorted((start, end) for start, end, _ in ac.find_all("ushers"))
+    assert found == [(1, 4), (2, 4), (2, 6)]
+
+
+def test_singleton_loads_once():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return SOURCES
+
+    catalog_index.reset()
+    catalog_index.warm_up(loader).join()
+    first = catalog_index.get_index(loader)
+    assert catalog_index.get_index(loader) is first
+    assert len(calls) == 1
+    catalog_index.reset()
+
+
+def test_structured_key_lookup():
+    import med_parser
+    key = med_parser.parse("maleato de enalapril", "10 mg comprimido Básico C09AA02")
+    assert key == med_parser.MedKey("enalapril", ((10.0, "mg"),), "comprimido", "C09AA02")
+
+    index = catalog_index.CatalogIndex({
+        "remume": ["Enalapril, maleato 10mg comp", "Enalapril, maleato 20mg comp"],
+        "rename": [{"nome": "losartana potássica", "detalhes": "50 mg comprimido Básico C09CA01"}],
+    })
+    # sal/ordem diferentes, mesma chave (princípio ativo + dose)
+    hit = index.search("remume", "Maleato de Enalapril 20 mg comprimido")
+    assert hit == {"found": True, "match": "Enalapril, maleato 20mg comp", "score": 1.0, "tipo": "chave"}
+    # dose diferente: ainda disponível, score menor e marcado como não exato
+    hit = index.search("rename", "Losartana 100mg")
+    assert (hit["found"], hit["score"], hit["tipo"]) == (True, 0.9, "dose_diferente")
+
+
+def test_structured_key_checks_form_and_every_dose():
+    index = catalog_index.CatalogIndex({
+        "remume": ["Clonazepam 2 mg comp", "Metformina 500mg, 850mg comp"],
+    })
+    # sem dose: forma ainda precisa bater, e nunca é 1.0
+    gotas = index.search("remume", "Clonazepam gotas")
+    assert (gotas["score"], gotas["tipo"]) == (0.85, "forma_diferente")
+    comp = index.search("remume", "Clonazepam comprimido")
+    assert (comp["score"], comp["tipo"]) == (0.95, "chave")
+    # segunda dose da entrada também é indexada
+    assert index.search("remume", "Metformina 850mg comprimido")["score"] == 1.0
@@ -0,0 +1,30 @@
+import base64
+
+import gemini_client
+
+
+def test_inline_body_streams_valid_json(tmp_path, mock_gemini):
+    mock = mock_gemini(record=True)
+    audio = tmp_path / "a.wav"
+    audio.write_bytes(bytes(range(256)) * 1000 + b"xy")  # tamanho não múltiplo de 3
+    result = gemini_client.generate_content("k", "transcreva", str(audio), json_output=True, base_url=mock.base_url)
+    assert gemini_client.response_text(result)
+    sent = mock.state.requests[0]
+    assert base64.b64decode(sent["contents"][0]["parts"][1]["inline_data"]["data"]) == audio.read_bytes()
+    assert sent["generationConfig"] == {"responseMimeType": "application/json"}
+
+
+def test_resumable_upload_resumes_after_failure(tmp_path, mock_gemini, monkeypatch):
+    monkeypatch.setattr(gemini_client, "INLINE_MAX_BYTES", 1024)
+    monkeypatch.setattr(gemini_client, "UPLOAD_CHUNK", 256 * 1024)
+    monkeypatch.setattr(gemini_client.time, "sleep", lambda s: None)
+    audio = tmp_path / "longa.wav"
+    audio.write_bytes(bytes(range(256)) * 4096)  # 1 MiB
+    mock = mock_gemini(record=True, upload_faults={256 * 1024: 503})  # segundo chunk falha no meio
+
+    gemini_client.generate_content("k", "transcreva", str(audio), base_url=mock.base_url)
+    assert not mock.state.upload_faults  # a falha aconteceu e foi retomada via "query"
+    (file_id, uploaded), = mock.state.files.items()
+    assert bytes(uploaded["data"]) == audio.read_bytes()
+    file_part = mock.state.requests[0]["contents"][0]["parts"][1]
+    assert file_part == {"file_data": {"mime_type": "audio/wav", "file_uri": f"{mock.base_url}/v1beta/files/{file_id}"}}
@@ -0,0 +1,57 @@
+import history_store
+
+
+def _result(i, avaliacao, meds):
+    return {"soap": {"s": f"Paciente {i}", "o": "", "a": avaliacao, "p": "Retorno"}, "medicamentos": meds}
+
+
+def _fill(store):
+    for i in range(45):
+        store.add(_result(i, "Cefaleia tensional", ["Dipirona"]), audio_hash=f"h{i}")
+    store.add(_result(99, "Hipertensão arterial sistêmica", ["Losartana 50mg"]), audio_hash="hx")
+
+
+def test_fts_search_and_keyset_paging(tmp_path):
+    store = history_store.HistoryStore(str(tmp_path / "hist.db"))
+    assert store.fts
+    _fill(store)
+
+    # sem acento e por prefixo
+    hits = store.search("hipertensao")
+    assert len(hits) == 1 and "[" in hits[0]["trecho"]
+    assert store.search("losart")[0]["medicamentos"] == "Losartana 50mg"
+
+    first = store.search("cefaleia")
+    second = store.search("cefaleia", before_id=first[-1]["id"])
+    third = store.search("cefaleia", before_id=second[-1]["id"])
+    assert [len(first), len(second), len(third)] == [20, 20, 5]
+    assert first[0]["id"] > second[0]["id"]
+
+    # remoção tira do índice; caracteres especiais não quebram a busca
+    store.delete(hits[0]["id"])
+    assert store.search("hipertensao") == []
+    assert store.search('dor "aspas" (x') == []
+
+
+def test_get_audit_and_like_fallback(tmp_path, monkeypatch):
+    store = history_store.HistoryStore(str(tmp_path / "hist.db"))
+    _fill(store)
+    cid = store.find_by_audio("hx")  # gravado sem modelo/prompt
+    store.set_audit(cid, {"items": []})
+    item = store.get(cid)
+    assert item["data"]["medicamentos"] == ["Losartana 50mg"] and item["audit"] == {"items": []}
+
+    store.fts = False  # SQLite sem FTS5
+    assert [h["id"] for h in store.search("Losartana")] == [cid]
+    assert len(store.search("")) == 20
+
+
+def test_find_by_audio_matches_model_and_prompt(tmp_path):
+    store = history_store.HistoryStore(str(tmp_path / "hist.db"))
+    old = store.add(_result(1, "Cefaleia", []), audio_hash="h", modelo="m1", prompt_version="v1")
+    assert store.find_by_audio("h", "m1", "v1") == old
+    # Prompt novo: o mesmo áudio não reaproveita o resultado antigo
+    assert store.find_by_audio("h", "m1", "v2") is None
+    new = store.add(_result(1, "Enxaqueca", []), audio_hash="h", modelo="m1", prompt_version="v2")
+    assert store.find_by_audio("h", "m1", "v2") == new != old
+    assert store.get(new)["data"]["soap"]["a"] == "Enxaqueca"
@@ -0,0 +1,42 @@
+import http_client
+
+
+def _backend(get_failures=0):
+    """Backend falso: /consultar-ia (POST) e /releases/latest (GET, 503 nas `get_failures` primeiras)."""
+    failures = [get_failures]
+
+    def respond(req):
+        if req.command == "GET":
+            if failures[0]:
+                failures[0] -= 1
+                return 503, {"erro": "fora"}
+            return 200, {"tag_name": "v1.0.1"}
+        if req.json["transcricao"] == "cota":
+            # Card de erro do backend (HTTP 200)
+            return 200, {"soap": {"s": "Erro ao processar", "a": "⚠️ Limite de cota atingido (Erro 429)."},
+                         "debug_rag": "ERRO", "retryable": True}
+        return 200, {"soap": {"s": req.json["transcricao"]}, "medicamentos": [], "model": req.json.get("model")}
+    return respond
+
+
+def test_backend_mode_reuses_pooled_connection(stub_server):
+    backend = stub_server(_backend())
+    assert not http_client.backend_enabled() and http_client.backend_enabled(backend.base_url)
+    for i in range(3):
+        res = http_client.consultar_ia(f"dor {i}", "k", model="m", base_url=backend.base_url + "/")
+        assert res["soap"]["s"] == f"dor {i}" and res["model"] == "m"
+    # uma conexão TCP só para as 3 chamadas
+    assert len({req.client_address for req in backend.requests}) == 1
+
+
+def test_get_retries_unavailable(stub_server):
+    backend = stub_server(_backend(get_failures=2))
+    resp = http_client.get(backend.base_url + "/releases/latest", timeout=5)
+    assert resp.status_code == 200 and resp.json()["tag_name"] == "v1.0.1"
+    assert len(backend.requests) == 3
+
+
+def test_backend_error_card_becomes_error(stub_server):
+    backend = stub_server(_backend())
+    res = http_client.consultar_ia("cota", "k", base_url=backend.base_url)
+    assert res == {"error": "Backend: ⚠️ Limite de cota atingido (Erro 429).", "retryable": True}
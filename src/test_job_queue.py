@@ -0,0 +1,85 @@
+import json
+import time
+import threading
+
+import gemini_client
+import job_queue
+
+
+def _analyze(base_url):
+    def process(job):
+        try:
+            result = gemini_client.generate_content("k", "analise", base_url=base_url, retries=0, timeout=5)
+            return json.loads(gemini_client.response_text(result))
+        except Exception as e:
+            return {"error": str(e), "retryable": gemini_client.is_transient(e)}
+    return process
+
+
+def test_worker_retries_dropped_connections(tmp_path, mock_gemini):
+    drops = 4
+    mock = mock_gemini(faults={n: "drop" for n in range(1, drops + 1)})  # derruba a conexão, sem resposta
+    queue = job_queue.JobQueue(str(tmp_path / "fila.db"), backoff_base=0.05, backoff_max=0.2)
+    ids = [queue.enqueue(f"consulta_{i}.wav") for i in range(3)]
+
+    done = []
+    finished = threading.Event()
+
+    def on_done(job, result):
+        done.append((job["id"], result))
+        if len(done) == len(ids):
+            finished.set()
+
+    worker = job_queue.QueueWorker(queue, _analyze(mock.base_url), concurrency=2, on_done=on_done, idle_wait=0.2)
+    worker.start()
+    try:
+        assert finished.wait(15)
+    finally:
+        worker.stop()
+
+    assert sorted(i for i, _ in done) == ids
+    assert all("soap" in r and "error" not in r for _, r in done)
+    assert queue.counts() == {job_queue.CONCLUIDO: 3}
+    assert sum(queue.get(i)["tentativas"] for i in ids) == 3 + drops
+
+
+def test_concurrency_limit_and_permanent_failure(tmp_path):
+    queue = job_queue.JobQueue(str(tmp_path / "fila.db"), max_attempts=2, backoff_base=0.01, backoff_max=0.02)
+    for i in range(6):
+        queue.enqueue(f"a{i}.wav")
+    bad = queue.enqueue("sem_rede.wav")
+
+    running, peak, lock = [0], [0], threading.Lock()
+
+    def process(job):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        if job["audio_path"] == "sem_rede.wav":
+            return {"error": "sem conexão", "retryable": True}
+        return {"ok": job["id"]}
+
+    worker = job_queue.QueueWorker(queue, process, concurrency=3, idle_wait=0.05).start()
+    deadline = time.time() + 10
+    while queue.counts().get(job_queue.PENDENTE) or queue.counts().get(job_queue.EXECUTANDO):
+        assert time.time() < deadline
+        time.sleep(0.05)
+    worker.stop()
+
+    assert peak[0] <= 3
+    assert queue.counts() == {job_queue.CONCLUIDO: 6, job_queue.FALHOU: 1}
+    assert queue.get(bad)["tentativas"] == 2 and queue.get(bad)["erro"] == "sem conexão"
+    assert queue.active_audio_paths() == set()
+
+
+def test_interrupted_job_is_requeued(tmp_path):
+    path = str(tmp_path / "fila.db")
+    queue = job_queue.JobQueue(path)
+    job_id = queue.enqueue("x.wav")
+    assert queue.claim()["id"] == job_id
+    # app fechado no meio do processamento
+    assert job_queue.JobQueue(path).claim()["id"] == job_id
+    assert queue.active_audio_paths() == {"x.wav"}
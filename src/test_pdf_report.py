@@ -0,0 +1,41 @@
+import zipfile
+import pytest
+
+pytest.importorskip("fpdf")
+import pdf_report
+
+DATA = {
+    "soap": {"s": "Cefaleia há 3 dias", "o": "PA 120x80", "a": "Cefaleia tensional", "p": "Analgesia"},
+    "medicamentos": ["Dipirona"],
+}
+AUDIT = {"items": [{
+    "ia_term": "Dipirona",
+    "remume": {"found": True, "match": "Dipirona 500mg comp"},
+    "alto_custo": {"found": False, "match": None},
+    "rename": {"found": True, "match": "dipirona"},
+}]}
+
+
+def test_report_written_to_path(tmp_path):
+    path = tmp_path / "consulta.pdf"
+    pdf_report.generate_pdf_report(DATA, str(path), AUDIT)
+    assert path.read_bytes().startswith(b"%PDF")
+
+
+def test_batch_zip_and_pdf(tmp_path):
+    calls = []
+
+    def check_meds(meds):
+        calls.append(meds)
+        return AUDIT
+
+    consultas = [{"data": DATA, "audit": AUDIT}, {"data": DATA, "arquivo": "segunda.pdf"}]
+    progress = []
+    pdf_report.export_batch_zip(consultas, str(tmp_path / "lote.zip"), check_meds,
+                                on_progress=lambda d, t: progress.append(d))
+    assert zipfile.ZipFile(tmp_path / "lote.zip").namelist() == ["consulta_001.pdf", "segunda.pdf"]
+    assert calls == [["Dipirona"]]  # só a consulta sem auditoria salva recalcula
+    assert progress == [1, 2]
+
+    pdf_report.export_batch_pdf(consultas, str(tmp_path / "lote.pdf"), check_meds)
+    assert (tmp_path / "lote.pdf").read_bytes().startswith(b"%PDF")
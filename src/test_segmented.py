@@ -0,0 +1,49 @@
+import wave
+
+import pytest
+
+np = pytest.importorskip("numpy")
+import segmented
+
+
+def _write_speech_like(path, seconds, rate=16000):
+    t = np.arange(int(rate * seconds)) / rate
+    envelope = (np.sin(2 * np.pi * 0.4 * t) > -0.2).astype(float)  # falas com pausas
+    pcm = (0.3 * np.sin(2 * np.pi * 220 * t) * envelope * 32767).astype("<i2")
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(pcm.tobytes())
+
+
+def test_split_points_cut_in_silence_with_overlap():
+    rate = 16000
+    t = np.arange(rate * 10) / rate
+    samples = np.sin(2 * np.pi * 220 * t).astype(np.float32)
+    samples[int(3.5 * rate):int(3.8 * rate)] = 0  # pausa dentro da janela [3s, 4s]
+    segments = segmented.split_points(samples, rate, segment_s=3, max_segment_s=4, overlap_s=0.5)
+    assert 3.5 * rate <= segments[0][1] <= 3.8 * rate
+    assert segments[1][0] == segments[0][1] - rate // 2
+    assert segments[-1][1] == len(samples)
+
+
+def test_analyze_long_against_mock_server(tmp_path, mock_gemini):
+    audio = tmp_path / "consulta.wav"
+    _write_speech_like(audio, 10)
+    progress = []
+    mock = mock_gemini(faults={2: 429}, record=True)  # um 429 no meio: precisa retentar
+
+    result = segmented.analyze_long(
+        "fake-key", str(audio), "Gere o JSON.", workers=3, rpm=0, base_url=mock.base_url,
+        on_progress=lambda done, total, msg: progress.append((done, total)),
+        segment_s=3, max_segment_s=4, overlap_s=0.5,
+    )
+    assert set(result) >= {"soap", "cids", "medicamentos"} and result["soap"]["a"]
+    total = progress[0][1]
+    assert total >= 3
+    assert [d for d, _ in progress[1:total + 1]] == list(range(1, total + 1))
+    # segmentos + 1 retentativa (429) + merge
+    assert mock.state.stats["requests"] == total + 2
+    assert (mock.state.stats["throttled"], mock.state.stats["ok"]) == (1, total + 1)
+    assert "[Trecho 1]" in mock.state.requests[-1]["contents"][0]["parts"][0]["text"]
@@ -0,0 +1,31 @@
+import sys
+import startup_profile
+
+
+def test_profile_records_imports_and_marks(tmp_path, monkeypatch):
+    (tmp_path / "modulo_lento.py").write_text("import time\ntime.sleep(0.02)\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(startup_profile, "ENABLED", True)
+    monkeypatch.setattr(startup_profile, "_imports", [])
+    monkeypatch.setattr(startup_profile, "_marks", [])
+
+    startup_profile.install()
+    try:
+        import modulo_lento  # noqa: F401
+    finally:
+        sys.modules.pop("modulo_lento", None)
+    startup_profile.mark("primeiro page.update")
+    text = startup_profile.finish(str(tmp_path / "perfil.txt"))
+
+    assert startup_profile._original_import is None  # desinstalou
+    (name, ms), = startup_profile._imports
+    assert name == "modulo_lento" and ms >= 20
+    assert "primeiro page.update" in text
+    assert (tmp_path / "perfil.txt").read_text().startswith("=== Startup profile ===")
+
+
+def test_disabled_is_noop(monkeypatch):
+    monkeypatch.setattr(startup_profile, "ENABLED", False)
+    startup_profile.install()
+    assert startup_profile._original_import is None
+    assert startup_profile.finish() is None
@@ -0,0 +1,16 @@
+import wave
+from wav_writer import StreamingWavWriter
+
+
+def test_streaming_writer_produces_valid_wav(tmp_path):
+    path = str(tmp_path / "out.wav")
+    chunk = b"\x01\x00" * 1024  # 1024 frames mono 16-bit
+    with StreamingWavWriter(path, channels=1, sampwidth=2, rate=44100, max_queue=4) as writer:
+        for _ in range(50):  # mais chunks que o tamanho da fila
+            writer.write(chunk)
+    assert writer.frames_written == 50 * 1024
+
+    with wave.open(path, "rb") as wav:
+        assert wav.getnframes() == 50 * 1024
+        assert wav.getframerate() == 44100
+        assert wav.readframes(1) == b"\x01\x00"
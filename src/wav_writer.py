@@ -0,0 +1,59 @@
+import queue
+import wave
+import threading
+
+# Gravação em streaming: os chunks do microfone vão para uma fila limitada e uma
+# thread escreve direto no .wav. Memória constante para qualquer duração
+# (antes: todos os frames numa lista + cópia inteira no b''.join final).
+
+_STOP = object()
+
+
+class StreamingWavWriter:
+    def __init__(self, path, channels, sampwidth, rate, max_queue=256):
+        # max_queue=256 chunks de 1024 frames ~ 6s de folga a 44.1kHz se o disco engasgar
+        self.path = path
+        self.frames_written = 0
+        self.error = None
+        self._sampwidth = sampwidth
+        self._channels = channels
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._wav = wave.open(path, 'wb')
+        self._wav.setnchannels(channels)
+        self._wav.setsampwidth(sampwidth)
+        self._wav.setframerate(rate)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                chunk = self._queue.get()
+                if chunk is _STOP:
+                    break
+                self._wav.writeframes(chunk)
+                self.frames_written += len(chunk) // (self._sampwidth * self._channels)
+        except Exception as e:
+            self.error = e
+            # Drena a fila para o produtor não travar num put() bloqueado
+            while self._queue.get() is not _STOP:
+                pass
+        finally:
+            self._wav.close()
+
+    def write(self, chunk: bytes):
+        """Enfileira um chunk (bloqueia se a fila estiver cheia: backpressure em vez de RAM)."""
+        self._queue.put(chunk)
+
+    def close(self, timeout=None):
+        """Finaliza o arquivo (cabeçalho com o tamanho correto). Propaga erro da thread."""
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self.error:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()